@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""Per-query overhead of pooled WAL connections vs a connection per call
+
+Usage: uv run python benchmarks/bench_connections.py [--rows N] [--iterations N]
+"""
+import argparse
+import ipaddress
+import random
+import shutil
+import sqlite3
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from docker_public_ip.database import Database
+
+SERVICES = [
+    "https://icanhazip.com",
+    "https://checkip.amazonaws.com",
+    "https://ipinfo.io/ip",
+    "https://api.ipify.org",
+]
+
+
+class PerCallDatabase(Database):
+    """Previous behaviour: a fresh rollback-journal connection for every call"""
+
+    def _connect(self, read_only: bool = False) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    @contextmanager
+    def writer(self):
+        conn = self._connect()
+        try:
+            yield conn
+            conn.commit()
+        finally:
+            conn.close()
+
+    @contextmanager
+    def reader(self):
+        conn = self._connect(read_only=True)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+
+def populate(db_path: Path, rows: int):
+    Database(db_path).close()
+    now = datetime.now()
+    ip = "203.0.113.1"
+    records = []
+    for index in range(rows):
+        if random.random() < 0.002:
+            ip = f"203.0.113.{random.randint(1, 254)}"
+        success = random.random() < 0.95
+        records.append(
+            (
+                round((now - timedelta(minutes=rows - index)).timestamp() * 1000),
+                random.randrange(len(SERVICES)) + 1,
+                int(ipaddress.IPv4Address(ip)) if success else None,
+                random.uniform(100, 700) if success else None,
+                success,
+                None if success else "HTTP 503",
+            )
+        )
+    with sqlite3.connect(db_path) as conn:
+        conn.executemany(
+            "INSERT OR IGNORE INTO services (id, url) VALUES (?, ?)",
+            list(enumerate(SERVICES, start=1)),
+        )
+        conn.executemany(
+            """
+            INSERT INTO ip_checks
+            (timestamp_ms, service_id, ip, response_time_ms, success, error_message)
+            VALUES (?, ?, ?, ?, ?, ?)
+            """,
+            records,
+        )
+        # Rerun the migrations so they backfill the derived tables
+        conn.execute("PRAGMA user_version = 0")
+    Database(db_path).close()
+
+
+def measure(db: Database, iterations: int):
+    operations = {
+        "get_recent_checks": lambda: db.get_recent_checks(limit=100),
+        "get_ip_changes": lambda: db.get_ip_changes(limit=20),
+        "get_ip_change_count": db.get_ip_change_count,
+        "get_service_stats": db.get_service_stats,
+        "get_ip_change_stats": db.get_ip_change_stats,
+        "get_ip_stability_stats": db.get_ip_stability_stats,
+        "record_check": lambda: db.record_check(
+            random.choice(SERVICES), "203.0.113.1", 120.0
+        ),
+    }
+    results = {}
+    for name, operation in operations.items():
+        operation()
+        start = time.perf_counter()
+        for _ in range(iterations):
+            operation()
+        results[name] = (time.perf_counter() - start) / iterations * 1000
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        source = Path(tmp) / "source.db"
+        populate(source, args.rows)
+
+        before_path = Path(tmp) / "before.db"
+        after_path = Path(tmp) / "after.db"
+        shutil.copy(source, before_path)
+        shutil.copy(source, after_path)
+        with sqlite3.connect(before_path) as conn:
+            conn.execute("PRAGMA journal_mode = DELETE")
+
+        before = measure(PerCallDatabase(before_path), args.iterations)
+        db = Database(after_path)
+        after = measure(db, args.iterations)
+        db.close()
+
+    print(f"{args.rows} rows, {args.iterations} iterations, ms per call")
+    print(f"{'operation':<26}{'per call':>10}{'pooled':>10}{'speedup':>10}")
+    for name in before:
+        print(
+            f"{name:<26}{before[name]:>10.3f}{after[name]:>10.3f}"
+            f"{before[name] / after[name]:>9.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""Memory and throughput of streaming check history exports
+
+Fills a database with --rows checks, then exports it in every format from a
+fresh process, sampling its anonymous resident memory after each chunk.
+Pages of the database file mapped by SQLite (DB_MMAP_SIZE_MB) are left out,
+they are shared with the page cache and reclaimable. Flat anonymous memory
+means the export depends on the chunk size, not on the history size.
+
+Usage: uv run python benchmarks/bench_export.py [--rows N] [--formats csv,parquet]
+       [--db PATH]
+"""
+import argparse
+import multiprocessing
+import os
+import sqlite3
+import tempfile
+import time
+from pathlib import Path
+
+from docker_public_ip.database import Database
+from docker_public_ip.export import EXPORT_FORMATS, export_checks
+
+
+def anonymous_mb() -> float:
+    with open("/proc/self/status") as status:
+        for line in status:
+            if line.startswith("RssAnon:"):
+                return int(line.split()[1]) / 1024
+    return 0
+
+
+def populate(db_path: Path, rows: int):
+    """Insert rows checks, one every 5 seconds over 3 targets and 5 services"""
+    Database(db_path).close()
+    with sqlite3.connect(db_path) as conn:
+        conn.executemany(
+            "INSERT OR IGNORE INTO services (id, url) VALUES (?, ?)",
+            [(i + 1, f"https://service{i}.example.com") for i in range(5)],
+        )
+        conn.execute(
+            """
+            WITH RECURSIVE n(i) AS (SELECT 0 UNION ALL SELECT i + 1 FROM n WHERE i < ?)
+            INSERT INTO ip_checks
+            (timestamp_ms, service_id, ip, response_time_ms, success, error_message,
+             target)
+            SELECT
+                (1600000000 + i * 5) * 1000,
+                i % 5 + 1,
+                -- 203.0.113.x packed into an integer
+                CASE WHEN i % 20 THEN 3405803776 + (i / 20000 % 250) END,
+                100 + (i * 7919 % 600),
+                i % 20 != 0,
+                CASE WHEN i % 20 = 0 THEN 'HTTP 503' END,
+                'target' || (i % 3)
+            FROM n
+            """,
+            (rows - 1,),
+        )
+
+
+def export(db_path: Path, export_format: str, results):
+    db = Database(db_path)
+    samples, written = [anonymous_mb()], 0
+    start = time.perf_counter()
+    with open(os.devnull, "wb") as sink:
+        for chunk in export_checks(db, export_format):
+            sink.write(chunk)
+            written += len(chunk)
+            samples.append(anonymous_mb())
+    elapsed = time.perf_counter() - start
+    db.close()
+    results.put((export_format, elapsed, written, samples))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=10_000_000)
+    parser.add_argument("--formats", default=",".join(EXPORT_FORMATS))
+    parser.add_argument("--db", type=Path, help="Reuse or create this fixture")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = args.db or Path(tmp) / "export.db"
+        if not db_path.exists():
+            start = time.perf_counter()
+            populate(db_path, args.rows)
+            print(f"Created {args.rows} rows in {time.perf_counter() - start:.0f}s")
+        with sqlite3.connect(db_path) as conn:
+            rows = conn.execute("SELECT COUNT(*) FROM ip_checks").fetchone()[0]
+
+        # Every export runs in a fresh process so its memory is its own
+        context = multiprocessing.get_context("spawn")
+        results = context.Queue()
+        print(f"{rows} rows")
+        print(
+            f"{'format':<9}{'seconds':>9}{'rows/s':>10}{'MB out':>9}"
+            f"{'MB start':>10}{'MB 10%':>8}{'MB 50%':>8}{'MB end':>8}{'MB max':>8}"
+        )
+        for export_format in args.formats.split(","):
+            process = context.Process(
+                target=export, args=(db_path, export_format, results)
+            )
+            process.start()
+            name, elapsed, written, samples = results.get()
+            process.join()
+            print(
+                f"{name:<9}{elapsed:>9.1f}{rows / elapsed:>10.0f}"
+                f"{written / 2**20:>9.1f}{samples[0]:>10.0f}"
+                f"{samples[len(samples) // 10]:>8.0f}{samples[len(samples) // 2]:>8.0f}"
+                f"{samples[-1]:>8.0f}{max(samples):>8.0f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""Cold vs warm IP checks against a local stub HTTPS provider
+
+Cold checks use a new session for every request, like the previous
+module-level requests.get. Warm checks reuse the pooled keep-alive session
+with its DNS cache, as IPChecker does.
+
+Usage: uv run python benchmarks/bench_http_client.py [--checks N] [--latency-ms N]
+"""
+import argparse
+import statistics
+
+from docker_public_ip.http_client import PHASES, create_session, dns_cache, timed_get
+from stubs import StubServer
+
+
+def stub_session(server):
+    session = create_session()
+    # Trust the stub's certificate even if a CA bundle is set in the environment
+    session.trust_env = False
+    session.verify = server.ca_file
+    return session
+
+
+def run(server, checks, warm):
+    session = stub_session(server)
+    results = []
+    for _ in range(checks):
+        if not warm:
+            session.close()
+            session = stub_session(server)
+            dns_cache.clear()
+        response, elapsed_ms, phases = timed_get(session, server.url, timeout=10)
+        response.raise_for_status()
+        results.append({"total_ms": elapsed_ms, **phases})
+    session.close()
+    return results
+
+
+def summarize(results):
+    return {
+        column: statistics.fmean(result[column] for result in results)
+        for column in ("total_ms", *PHASES)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--checks", type=int, default=200)
+    parser.add_argument("--latency-ms", type=float, default=0)
+    args = parser.parse_args()
+
+    with StubServer(latency_ms=args.latency_ms, tls=True) as server:
+        cold = summarize(run(server, args.checks, warm=False))
+        warm = summarize(run(server, args.checks, warm=True))
+
+    print(f"{args.checks} checks against {server.url}, mean ms per check")
+    print(f"{'phase':<14}{'cold':>10}{'warm':>10}")
+    for column in cold:
+        print(f"{column:<14}{cold[column]:>10.3f}{warm[column]:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""HTTPS vs DNS IP providers against local stub servers
+
+Each provider fetches the IP through the same interface IPChecker uses,
+with a warm keep-alive session for HTTPS. Reports the mean wall-clock and
+CPU time per check, the CPU time includes the stub servers running in the
+same process.
+
+Usage: uv run python benchmarks/bench_providers.py [--checks N] [--latency-ms N]
+"""
+import argparse
+import time
+
+from docker_public_ip.ip_checker import provider_for
+from docker_public_ip.targets import Target
+from stubs import StubDNSServer, StubServer
+from bench_http_client import stub_session
+
+
+def run(service, session, checks):
+    provider = provider_for(service)
+    target = Target("bench")
+    # Warm up connections and the resolver address cache
+    provider.fetch(session, target, timeout=10)
+    wall, cpu = time.perf_counter(), time.process_time()
+    for _ in range(checks):
+        answer, _, _ = provider.fetch(session, target, timeout=10)
+        assert answer.strip()
+    wall = (time.perf_counter() - wall) * 1000 / checks
+    cpu = (time.process_time() - cpu) * 1000 / checks
+    return wall, cpu
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--checks", type=int, default=1000)
+    parser.add_argument("--latency-ms", type=float, default=0)
+    args = parser.parse_args()
+
+    with StubServer(latency_ms=args.latency_ms, tls=True) as https, StubDNSServer(
+        latency_ms=args.latency_ms
+    ) as dns:
+        session = stub_session(https)
+        results = {
+            "https": run(https.url, session, args.checks),
+            "dns A": run(dns.service(), session, args.checks),
+            "dns TXT": run(dns.service(qtype="TXT"), session, args.checks),
+        }
+        session.close()
+
+    print(f"{args.checks} checks per provider, mean ms per check")
+    print(f"{'provider':<12}{'wall':>10}{'cpu':>10}")
+    for name, (wall, cpu) in results.items():
+        print(f"{name:<12}{wall:>10.3f}{cpu:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
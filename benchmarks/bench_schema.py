@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+"""Size and query time of the text timestamp and compact check layouts
+
+Fills a database laid out like earlier versions (text timestamps and service
+URLs) with --rows checks, then measures it, moves it to the compact layout
+with Database.compact_legacy_checks while checks keep being recorded, and
+measures again. Both files are vacuumed before they are measured.
+
+Usage: uv run python benchmarks/bench_schema.py [--rows N] [--iterations N]
+       [--keep DIR]
+"""
+import argparse
+import shutil
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from docker_public_ip.config import DB_CACHE_SIZE_KB, DB_MMAP_SIZE_MB
+from docker_public_ip.database import Database
+
+# ip_checks as created by earlier versions, with their indexes
+LEGACY_SCHEMA = """
+    CREATE TABLE ip_checks (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+        service TEXT NOT NULL,
+        ip_address TEXT,
+        response_time_ms REAL,
+        success BOOLEAN DEFAULT 1,
+        error_message TEXT,
+        dns_ms REAL,
+        connect_ms REAL,
+        tls_ms REAL,
+        transfer_ms REAL,
+        target TEXT NOT NULL DEFAULT 'default'
+    );
+    CREATE INDEX idx_timestamp ON ip_checks (timestamp DESC);
+    CREATE INDEX idx_ip_address ON ip_checks (ip_address);
+    CREATE INDEX idx_service_timestamp ON ip_checks (service, timestamp DESC);
+    CREATE INDEX idx_target_timestamp ON ip_checks (target, timestamp DESC);
+    -- Migrations of earlier versions are done
+    PRAGMA user_version = 5;
+"""
+
+SERVICE = "https://service1.example.com"
+
+# The same questions asked of each layout, the compact one through Database
+LEGACY_QUERIES = {
+    "recent checks": (
+        "SELECT * FROM ip_checks WHERE target = ? ORDER BY timestamp DESC LIMIT 100",
+        ("target0",),
+    ),
+    "service checks": (
+        """
+        SELECT timestamp, success, response_time_ms FROM ip_checks
+        WHERE service = ? ORDER BY timestamp DESC LIMIT 50
+        """,
+        (SERVICE,),
+    ),
+    "middle page": (
+        """
+        SELECT * FROM ip_checks WHERE target = ? AND (timestamp, id) < (?, ?)
+        ORDER BY timestamp DESC, id DESC LIMIT 100
+        """,
+        None,
+    ),
+    "last day of a target": (
+        """
+        SELECT COUNT(*), AVG(response_time_ms) FROM ip_checks
+        WHERE target = ? AND timestamp >= ?
+        """,
+        None,
+    ),
+    "daily totals": (
+        """
+        SELECT target, DATE(timestamp) AS day, COUNT(*), SUM(success = 0)
+        FROM ip_checks GROUP BY target, day
+        """,
+        (),
+    ),
+}
+COMPACT_QUERIES = {
+    "last day of a target": (
+        """
+        SELECT COUNT(*), AVG(response_time_ms) FROM ip_checks
+        WHERE target = ? AND timestamp_ms >= ?
+        """,
+        None,
+    ),
+    "daily totals": (
+        """
+        SELECT target, DATE(day * 86400, 'unixepoch'), checks, failures
+        FROM (
+            SELECT target, timestamp_ms / 86400000 AS day, COUNT(*) AS checks,
+                   SUM(success = 0) AS failures
+            FROM ip_checks GROUP BY target, day
+        )
+        """,
+        (),
+    ),
+}
+
+
+def populate_legacy(db_path: Path, rows: int):
+    """Same checks as bench_export.populate, in the text timestamp layout"""
+    with sqlite3.connect(db_path) as conn:
+        conn.executescript(LEGACY_SCHEMA)
+        conn.execute(
+            """
+            WITH RECURSIVE n(i) AS (SELECT 0 UNION ALL SELECT i + 1 FROM n WHERE i < ?)
+            INSERT INTO ip_checks
+            (timestamp, service, ip_address, response_time_ms, success, error_message,
+             target)
+            SELECT
+                datetime(1600000000 + i * 5, 'unixepoch'),
+                'https://service' || (i % 5) || '.example.com',
+                CASE WHEN i % 20 THEN '203.0.113.' || (i / 20000 % 250) END,
+                100 + (i * 7919 % 600),
+                i % 20 != 0,
+                CASE WHEN i % 20 = 0 THEN 'HTTP 503' END,
+                'target' || (i % 3)
+            FROM n
+            """,
+            (rows - 1,),
+        )
+
+
+def vacuum(db_path: Path):
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("VACUUM")
+
+
+def sizes(db_path: Path):
+    """File size and the bytes of ip_checks and its indexes, in MB"""
+    with sqlite3.connect(db_path) as conn:
+        objects = dict(
+            conn.execute(
+                """
+                SELECT name, SUM(pgsize) FROM dbstat
+                WHERE name IN (
+                    SELECT name FROM sqlite_master WHERE tbl_name = 'ip_checks'
+                )
+                GROUP BY name
+                """
+            ).fetchall()
+        )
+    table = objects.pop("ip_checks")
+    return db_path.stat().st_size / 2**20, table / 2**20, sum(objects.values()) / 2**20
+
+
+def timed(operation, iterations: int) -> float:
+    """Median milliseconds of one call"""
+    operation()
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        operation()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples) * 1000
+
+
+def runs(name: str, iterations: int) -> int:
+    return iterations if name not in ("daily totals", "export scan") else 3
+
+
+def measure_legacy(db_path: Path, iterations: int):
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    conn.execute(f"PRAGMA cache_size = -{DB_CACHE_SIZE_KB}")
+    conn.execute(f"PRAGMA mmap_size = {DB_MMAP_SIZE_MB * 1024 * 1024}")
+    middle = conn.execute(
+        """
+        SELECT timestamp, id FROM ip_checks WHERE target = 'target0'
+        ORDER BY timestamp DESC, id DESC
+        LIMIT 1 OFFSET (SELECT COUNT(*) / 6 FROM ip_checks)
+        """
+    ).fetchone()
+    last_day = conn.execute(
+        "SELECT datetime(MAX(timestamp), '-1 day') FROM ip_checks WHERE target = ?",
+        ("target0",),
+    ).fetchone()[0]
+    bounds = {
+        "middle page": ("target0", *middle),
+        "last day of a target": ("target0", last_day),
+    }
+
+    def export_scan():
+        after = ("", 0)
+        while True:
+            rows = conn.execute(
+                """
+                SELECT * FROM ip_checks WHERE (timestamp, id) > (?, ?)
+                ORDER BY timestamp, id LIMIT 50000
+                """,
+                after,
+            ).fetchall()
+            if len(rows) < 50000:
+                return
+            after = (rows[-1]["timestamp"], rows[-1]["id"])
+
+    results = {}
+    for name, (sql, params) in LEGACY_QUERIES.items():
+        params = bounds.get(name, params)
+        # Rows become dicts, as Database returns them
+        results[name] = timed(
+            lambda: [dict(row) for row in conn.execute(sql, params)],
+            runs(name, iterations),
+        )
+    results["export scan"] = timed(export_scan, runs("export scan", iterations))
+    conn.close()
+    return results
+
+
+def measure_compact(db_path: Path, iterations: int):
+    db = Database(db_path)
+    with db.reader() as conn:
+        middle = conn.execute(
+            """
+            SELECT timestamp_ms, id FROM ip_checks WHERE target = 'target0'
+            ORDER BY timestamp_ms DESC, id DESC
+            LIMIT 1 OFFSET (SELECT COUNT(*) / 6 FROM ip_checks)
+            """
+        ).fetchone()
+        last_day = conn.execute(
+            "SELECT MAX(timestamp_ms) - 86400000 FROM ip_checks WHERE target = ?",
+            ("target0",),
+        ).fetchone()[0]
+
+    def query(sql, params):
+        with db.reader() as conn:
+            return [dict(row) for row in conn.execute(sql, params)]
+
+    operations = {
+        "recent checks": lambda: db.get_recent_checks(100, "target0"),
+        "service checks": lambda: db.get_service_checks(SERVICE, 50),
+        "middle page": lambda: db.get_checks_page(
+            target="target0", before=tuple(middle), limit=100
+        ),
+        **{
+            name: (lambda sql=sql: query(sql, ("target0", last_day)))
+            if name == "last day of a target"
+            else (lambda sql=sql, params=params: query(sql, params))
+            for name, (sql, params) in COMPACT_QUERIES.items()
+        },
+        "export scan": lambda: sum(1 for _ in db.iter_checks(chunk_size=50000)),
+    }
+    results = {
+        name: timed(operation, runs(name, iterations))
+        for name, operation in operations.items()
+    }
+    db.close()
+    return results
+
+
+def migrate(db_path: Path):
+    """Move the checks while recording one check every 20 ms"""
+    start = time.perf_counter()
+    db = Database(db_path)
+    switched = time.perf_counter() - start
+
+    latencies, done = [], threading.Event()
+
+    def record():
+        while not done.is_set():
+            started = time.perf_counter()
+            db.record_check(SERVICE, "203.0.113.7", 120.0, target="migration")
+            latencies.append(time.perf_counter() - started)
+            time.sleep(0.02)
+
+    recorder = threading.Thread(target=record)
+    recorder.start()
+    start = time.perf_counter()
+    db.compact_legacy_checks()
+    elapsed = time.perf_counter() - start
+    done.set()
+    recorder.join()
+    db.close()
+    latencies.sort()
+    return switched, elapsed, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=2_000_000)
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--keep", type=Path, help="Keep both databases here")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        directory = args.keep or Path(tmp)
+        directory.mkdir(parents=True, exist_ok=True)
+        legacy, compact = directory / "legacy.db", directory / "compact.db"
+        for path in (legacy, compact):
+            path.unlink(missing_ok=True)
+
+        start = time.perf_counter()
+        populate_legacy(legacy, args.rows)
+        vacuum(legacy)
+        print(f"Created {args.rows} rows in {time.perf_counter() - start:.0f}s")
+        shutil.copy(legacy, compact)
+
+        switched, elapsed, latencies = migrate(compact)
+        print(
+            f"Moved in {elapsed:.1f}s ({args.rows / elapsed:.0f} rows/s) after "
+            f"{switched * 1000:.0f} ms at startup; {len(latencies)} checks recorded "
+            f"meanwhile, p50 {latencies[len(latencies) // 2] * 1000:.1f} ms, "
+            f"p99 {latencies[int(len(latencies) * 0.99)] * 1000:.1f} ms, "
+            f"max {latencies[-1] * 1000:.1f} ms"
+        )
+        vacuum(compact)
+
+        print(f"\n{'MB':<22}{'legacy':>10}{'compact':>10}{'ratio':>8}")
+        for label, before, after in zip(
+            ("file", "ip_checks", "ip_checks indexes"), sizes(legacy), sizes(compact)
+        ):
+            print(f"{label:<22}{before:>10.1f}{after:>10.1f}{before / after:>7.1f}x")
+
+        before = measure_legacy(legacy, args.iterations)
+        after = measure_compact(compact, args.iterations)
+        print(f"\n{'ms':<22}{'legacy':>10}{'compact':>10}{'speedup':>8}")
+        for name in before:
+            print(
+                f"{name:<22}{before[name]:>10.2f}{after[name]:>10.2f}"
+                f"{before[name] / after[name]:>7.1f}x"
+            )
+
+
+if __name__ == "__main__":
+    main()
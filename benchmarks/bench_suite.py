@@ -0,0 +1,340 @@
+#!/usr/bin/env python3
+"""Benchmark suite of the database reads, the dashboard and the checker, as JSON
+
+Runs every Database read method and the dashboard page (web.index through
+the Flask test client, with the page cache disabled so every request
+renders) against fixture databases of each of --sizes checks. Fixtures are
+made by create_fixtures.py and kept in --fixtures for later runs. Then runs
+IPChecker.check_ip in every check mode against local stub providers with
+--latency-ms and --failure-rate injected.
+
+Results go to --output as JSON, median, p95 and fastest run in milliseconds
+per benchmark. --compare BASELINE prints the change of every benchmark
+against an earlier output, given a second file it compares the two without
+running anything.
+
+Usage: uv run python benchmarks/bench_suite.py [--sizes 10000,1000000,10000000]
+       [--fixtures DIR] [--output FILE] [--compare BASELINE [RESULTS]]
+       [--only db,web,checker] [--latency-ms N] [--failure-rate P] [--checks N]
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+from loguru import logger
+
+ROOT = Path(__file__).resolve().parent.parent
+# Fixtures have 3 targets checked every minute
+FIXTURE_TARGETS = 3
+FIXTURE_INTERVAL = 60
+TARGET = "target1"
+CHECK_MODES = ("sequential", "hedged", "consensus")
+STUB_SERVICES = 3
+
+
+def summary(samples):
+    samples = sorted(samples)
+    return {
+        "median_ms": round(statistics.median(samples) * 1000, 4),
+        "p95_ms": round(samples[min(int(len(samples) * 0.95), len(samples) - 1)] * 1000, 4),
+        "min_ms": round(samples[0] * 1000, 4),
+        "runs": len(samples),
+    }
+
+
+def measure(operation, iterations, max_seconds):
+    """Timings of up to iterations calls after a warm-up, within max_seconds"""
+    operation()
+    samples, deadline = [], time.perf_counter() + max_seconds
+    while len(samples) < iterations and (not samples or time.perf_counter() < deadline):
+        start = time.perf_counter()
+        operation()
+        samples.append(time.perf_counter() - start)
+    return summary(samples)
+
+
+def quiet():
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+
+
+def fixture(directory: Path, size: int) -> Path:
+    """Database of size checks, created by create_fixtures.py unless kept"""
+    db_path = directory / f"checks-{size}.db"
+    if db_path.exists():
+        return db_path
+    directory.mkdir(parents=True, exist_ok=True)
+    days = size / FIXTURE_TARGETS * FIXTURE_INTERVAL / 86400
+    print(f"Creating a fixture of {size} checks in {db_path}", file=sys.stderr)
+    subprocess.run(
+        [
+            sys.executable,
+            str(ROOT / "create_fixtures.py"),
+            "--db", str(db_path),
+            "--days", str(days),
+            "--interval", str(FIXTURE_INTERVAL),
+            "--targets", str(FIXTURE_TARGETS),
+            "--seed", "1",
+        ],
+        check=True,
+        stdout=subprocess.DEVNULL,
+    )
+    return db_path
+
+
+def bench_database(db_path: Path, iterations: int, max_seconds: float):
+    """Every read method of Database, on one fixture"""
+    from docker_public_ip.config import DEFAULT_IP_SERVICES
+    from docker_public_ip.database import DISAGREEMENT_EVENT, Database
+
+    quiet()
+    db = Database(db_path)
+    with db.reader() as conn:
+        newest, count = conn.execute(
+            "SELECT MAX(timestamp_ms), COUNT(*) FROM ip_checks WHERE target = ?",
+            (TARGET,),
+        ).fetchone()
+        middle = tuple(
+            conn.execute(
+                """
+                SELECT timestamp_ms, id FROM ip_checks WHERE target = ?
+                ORDER BY timestamp_ms DESC, id DESC LIMIT 1 OFFSET ?
+                """,
+                (TARGET, count // 2),
+            ).fetchone()
+        )
+    # Windows end at the newest check, fixtures are reused later
+    day_ago = (
+        datetime.fromtimestamp(newest / 1000, timezone.utc) - timedelta(days=1)
+    ).strftime("%Y-%m-%dT%H:%M:%S")
+    service = DEFAULT_IP_SERVICES[0]
+
+    operations = {
+        "get_last_ip": lambda: db.get_last_ip(TARGET),
+        "get_targets": db.get_targets,
+        "get_recent_checks": lambda: db.get_recent_checks(100, TARGET),
+        "get_service_checks": lambda: db.get_service_checks(service, 50),
+        "get_checks_page": lambda: db.get_checks_page(target=TARGET, limit=100),
+        "get_checks_page middle": lambda: db.get_checks_page(
+            target=TARGET, before=middle, limit=100
+        ),
+        "iter_checks last day": lambda: sum(
+            len(chunk) for chunk in db.iter_checks(target=TARGET, since=day_ago)
+        ),
+        "get_events": lambda: db.get_events(DISAGREEMENT_EVENT, target=TARGET),
+        "get_change_times": lambda: db.get_change_times(TARGET),
+        "get_ip_changes": lambda: db.get_ip_changes(50, TARGET),
+        "get_ip_changes_page": lambda: db.get_ip_changes_page(target=TARGET),
+        "get_ip_change_count": lambda: db.get_ip_change_count(TARGET),
+        "get_service_stats": db.get_service_stats,
+        "get_service_stats 24h": lambda: db.get_service_stats(window="24h"),
+        "get_ip_change_stats": lambda: db.get_ip_change_stats(TARGET),
+        "get_ip_stability_stats": lambda: db.get_ip_stability_stats(TARGET),
+        "get_breakers": db.get_breakers,
+    }
+    results = {
+        name: measure(operation, iterations, max_seconds)
+        for name, operation in operations.items()
+    }
+    db.close()
+    return results
+
+
+def bench_web(iterations: int, max_seconds: float):
+    """The dashboard page end to end, rendered on every request"""
+    from docker_public_ip.web import create_app
+
+    quiet()
+    client = create_app().test_client()
+
+    def index():
+        response = client.get(f"/?target={TARGET}", headers={"Accept-Encoding": "gzip"})
+        assert response.status_code == 200, response.status_code
+
+    return {"index": measure(index, iterations, max_seconds)}
+
+
+def bench_checker(checks: int):
+    """check_ip of one target, CHECK_MODE and the stub services from the environment"""
+    from docker_public_ip.ip_checker import IPChecker
+    from docker_public_ip.targets import Target
+
+    quiet()
+    target = Target("bench")
+    checker = IPChecker([target])
+    for session in checker.sessions.values():
+        # Ignore proxies from the environment, the stubs run locally
+        session.trust_env = False
+    samples = []
+    for _ in range(checks):
+        start = time.perf_counter()
+        checker.check_ip(target)
+        samples.append(time.perf_counter() - start)
+    checker.executor.shutdown(wait=True)
+    checker.db.close()
+    return {"check_ip": summary(samples)}
+
+
+def isolated(function, env, *args):
+    """Run function in a fresh process, configuration is read at import time"""
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    saved = dict(os.environ)
+    os.environ.update(env)
+    try:
+        process = context.Process(target=_run, args=(results, function, args))
+        process.start()
+    finally:
+        os.environ.clear()
+        os.environ.update(saved)
+    result = results.get()
+    process.join()
+    if isinstance(result, BaseException):
+        raise result
+    return result
+
+
+def _run(results, function, args):
+    try:
+        results.put(function(*args))
+    except Exception as error:
+        results.put(error)
+
+
+def run(args):
+    from stubs import StubServer
+
+    results = {}
+    only = set(args.only.split(","))
+    work = Path(tempfile.mkdtemp(prefix="bench-suite-"))
+
+    for size in [int(size) for size in args.sizes.split(",")]:
+        if not only & {"db", "web"}:
+            break
+        db_path = fixture(args.fixtures, size)
+        env = {"DB_PATH": str(db_path), "DASHBOARD_CACHE_TTL": "0"}
+        if "db" in only:
+            print(f"Database reads on {size} checks", file=sys.stderr)
+            for name, result in isolated(
+                bench_database, env, db_path, args.iterations, args.max_seconds
+            ).items():
+                results[f"db/{size}/{name}"] = result
+        if "web" in only:
+            print(f"Dashboard on {size} checks", file=sys.stderr)
+            for name, result in isolated(
+                bench_web, env, args.iterations, args.max_seconds
+            ).items():
+                results[f"web/{size}/{name}"] = result
+
+    if "checker" in only:
+        with StubServer(latency_ms=args.latency_ms, failure_rate=args.failure_rate) as server:
+            services = work / "services.txt"
+            services.write_text(
+                "".join(f"{server.url}?service={i}\n" for i in range(STUB_SERVICES))
+            )
+            for mode in CHECK_MODES:
+                print(f"Checker in {mode} mode", file=sys.stderr)
+                env = {
+                    "CHECK_MODE": mode,
+                    "SERVICES_FILE": str(services),
+                    "DB_PATH": str(work / f"checker-{mode}.db"),
+                }
+                for name, result in isolated(bench_checker, env, args.checks).items():
+                    results[f"checker/{mode}/{name}"] = result
+
+    return {
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "settings": {
+            "latency_ms": args.latency_ms,
+            "failure_rate": args.failure_rate,
+            "checks": args.checks,
+        },
+        "results": results,
+    }
+
+
+def compare(baseline, current, threshold):
+    """Print the median of every benchmark in both runs and the change"""
+    names = list(baseline["results"]) + [
+        name for name in current["results"] if name not in baseline["results"]
+    ]
+    width = max(len(name) for name in names) + 2
+    print(f"{'benchmark':<{width}}{'baseline ms':>13}{'current ms':>13}{'change':>9}")
+    for name in names:
+        before = baseline["results"].get(name, {}).get("median_ms")
+        after = current["results"].get(name, {}).get("median_ms")
+        if before is None or after is None:
+            print(f"{name:<{width}}{before or '-':>13}{after or '-':>13}")
+            continue
+        change = (after - before) / before if before else 0
+        verdict = ""
+        if change > threshold:
+            verdict = "  slower"
+        elif change < -threshold:
+            verdict = "  faster"
+        print(
+            f"{name:<{width}}{before:>13.3f}{after:>13.3f}{change:>+9.1%}{verdict}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="10000,1000000,10000000")
+    parser.add_argument(
+        "--fixtures",
+        type=Path,
+        default=Path(tempfile.gettempdir()) / "docker-public-ip-fixtures",
+        help="Fixture databases, created when missing",
+    )
+    parser.add_argument("--only", default="db,web,checker")
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument(
+        "--max-seconds", type=float, default=5, help="Time budget per benchmark"
+    )
+    parser.add_argument("--checks", type=int, default=200, help="check_ip runs per mode")
+    parser.add_argument("--latency-ms", type=float, default=20)
+    parser.add_argument("--failure-rate", type=float, default=0.1)
+    parser.add_argument("--output", default="-", help="JSON file, - for stdout")
+    parser.add_argument(
+        "--compare",
+        nargs="+",
+        metavar="FILE",
+        help="Baseline results, and results to compare instead of running",
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.1,
+        help="Relative change reported as slower or faster",
+    )
+    args = parser.parse_args()
+
+    if args.compare and len(args.compare) > 1:
+        baseline, current = (json.loads(Path(path).read_text()) for path in args.compare[:2])
+        compare(baseline, current, args.threshold)
+        return
+
+    current = run(args)
+    text = json.dumps(current, indent=2)
+    if args.output == "-":
+        print(text)
+    else:
+        Path(args.output).write_text(text + "\n")
+    if args.compare:
+        compare(json.loads(Path(args.compare[0]).read_text()), current, args.threshold)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""Load test of the check engine with many targets against a local stub provider
+
+Every target checks the same stub HTTP server, so the figures show the cost
+of scheduling, requests and recording rather than of real providers.
+
+Usage: uv run python benchmarks/load_targets.py [--targets N] [--interval S]
+       [--duration S] [--latency-ms N] [--max-concurrent N]
+"""
+import argparse
+import math
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from loguru import logger
+
+from stubs import StubServer
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--targets", type=int, default=300)
+    parser.add_argument("--interval", type=float, default=5)
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--latency-ms", type=float, default=50)
+    parser.add_argument("--max-concurrent", type=int, default=50)
+    args = parser.parse_args()
+
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+
+    with StubServer(latency_ms=args.latency_ms) as server:
+        directory = Path(tempfile.mkdtemp(prefix="load-targets-"))
+        (directory / "services.txt").write_text(server.url + "\n")
+        # Configuration is read at import time
+        os.environ["SERVICES_FILE"] = str(directory / "services.txt")
+        os.environ["DB_PATH"] = str(directory / "ip_history.db")
+        os.environ["MAX_CONCURRENT_CHECKS"] = str(args.max_concurrent)
+
+        from docker_public_ip.engine import CheckEngine
+        from docker_public_ip.ip_checker import IPChecker
+        from docker_public_ip.targets import Target
+
+        lock = threading.Lock()
+        scheduled, lags, durations = {}, [], []
+
+        class MeasuredEngine(CheckEngine):
+            async def run_check(self, target, due):
+                scheduled[target.name] = due
+                await super().run_check(target, due)
+
+        targets = [
+            Target(f"target-{index}", interval=args.interval)
+            for index in range(args.targets)
+        ]
+        checker = IPChecker(targets)
+        checker.engine = MeasuredEngine(checker, targets)
+        for session in checker.sessions.values():
+            # Ignore proxies from the environment, the stub runs locally
+            session.trust_env = False
+
+        check_ip = checker.check_ip
+
+        def measured_check_ip(target):
+            start = time.monotonic()
+            check_ip(target)
+            with lock:
+                lags.append((start - scheduled[target.name]) * 1000)
+                durations.append((time.monotonic() - start) * 1000)
+
+        checker.check_ip = measured_check_ip
+
+        start = time.monotonic()
+        checker.start()
+        time.sleep(args.duration)
+        checker.stop()
+        elapsed = time.monotonic() - start
+
+    expected = args.targets * math.ceil(args.duration / args.interval)
+    print(
+        f"{args.targets} targets every {args.interval:g}s for {args.duration:g}s, "
+        f"stub latency {args.latency_ms:g} ms, {args.max_concurrent} concurrent checks"
+    )
+    print(f"checks           {len(durations)} (expected ~{expected:.0f})")
+    print(f"stub requests    {server.requests}")
+    print(f"checks/s         {len(durations) / elapsed:.1f}")
+    print(
+        f"check ms         p50 {percentile(durations, 0.5):.1f}  "
+        f"p99 {percentile(durations, 0.99):.1f}  mean {statistics.fmean(durations):.1f}"
+    )
+    print(
+        f"schedule lag ms  p50 {percentile(lags, 0.5):.1f}  "
+        f"p99 {percentile(lags, 0.99):.1f}  max {max(lags):.1f}"
+    )
+
+
+if __name__ == "__main__":
+    main()
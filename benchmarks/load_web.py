@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""Load test of the web interface: requests per second and latency per server
+
+Starts the web interface on a fixture database with each --servers mode
+(WEB_SERVER) and hits --path from N concurrent clients, each one sending its
+next request as soon as the previous one is answered. Clients accept
+compressed responses like browsers do. With --url an already running
+server is tested instead.
+
+Usage: uv run python benchmarks/load_web.py [--servers flask,waitress]
+       [--clients 1,8,32] [--duration S] [--path PATH] [--rows N] [--url URL]
+"""
+import argparse
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import requests
+
+from bench_export import populate
+
+PORT = 8765
+SERVER = "from docker_public_ip.web import create_app, serve; serve(create_app())"
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+def prepare(db_path: Path, rows: int):
+    populate(db_path, rows)
+    with sqlite3.connect(db_path) as conn:
+        # Rerun the migrations so they backfill the derived tables
+        conn.execute("PRAGMA user_version = 0")
+
+
+def start_server(db_path: Path, server: str, threads: int) -> subprocess.Popen:
+    env = dict(
+        os.environ,
+        DB_PATH=str(db_path),
+        WEB_SERVER=server,
+        WEB_THREADS=str(threads),
+        WEB_HOST="127.0.0.1",
+        WEB_PORT=str(PORT),
+    )
+    process = subprocess.Popen(
+        [sys.executable, "-c", SERVER],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        try:
+            requests.get(f"http://127.0.0.1:{PORT}/health", timeout=1)
+            return process
+        except requests.ConnectionError:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError(f"{server} server did not start")
+
+
+def load(url: str, clients: int, duration: float):
+    latencies, errors = [], []
+    deadline = time.monotonic() + duration
+
+    def client():
+        session = requests.Session()
+        while time.monotonic() < deadline:
+            start = time.perf_counter()
+            try:
+                response = session.get(url, timeout=30)
+                response.content
+                ok = response.status_code == 200
+            except requests.RequestException:
+                ok = False
+            (latencies if ok else errors).append(time.perf_counter() - start)
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    start = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, len(errors), time.monotonic() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--servers", default="flask,waitress")
+    parser.add_argument("--clients", default="1,8,32")
+    parser.add_argument("--threads", type=int, default=8, help="WEB_THREADS")
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--path", default="/?target=target0")
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--url", help="Test this server instead of starting one")
+    args = parser.parse_args()
+
+    clients = [int(value) for value in args.clients.split(",")]
+    print(f"{'server':<10}{'clients':>8}{'req/s':>9}{'p50 ms':>9}{'p99 ms':>9}{'errors':>8}")
+
+    def report(name, url):
+        # Warm up the page cache and the compressed variants
+        requests.get(url, timeout=30)
+        for count in clients:
+            latencies, errors, elapsed = load(url, count, args.duration)
+            print(
+                f"{name:<10}{count:>8}{len(latencies) / elapsed:>9.0f}"
+                f"{percentile(latencies, 0.5) * 1000:>9.1f}"
+                f"{percentile(latencies, 0.99) * 1000:>9.1f}{errors:>8}"
+            )
+
+    if args.url:
+        report("external", args.url)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / "web.db"
+        prepare(db_path, args.rows)
+        for server in args.servers.split(","):
+            process = start_server(db_path, server, args.threads)
+            try:
+                report(server, f"http://127.0.0.1:{PORT}{args.path}")
+            finally:
+                process.terminate()
+                process.wait()
+
+
+if __name__ == "__main__":
+    main()
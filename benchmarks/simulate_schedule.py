@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""Simulate fixed and adaptive check scheduling against a synthetic IP history
+
+The ISP forces a new IP every --lease-hours (with some jitter) and also
+changes it at random moments, --random-changes per week on average, which
+restart the lease. The first --history-days seed the adaptive schedule like
+the recorded history does at startup. --max-interval adds an adaptive
+schedule that backs off past CHECK_INTERVAL between expected lease ends, the
+opt-in MAX_CHECK_INTERVAL. Every check is one provider request
+and one ip_checks row, every detected change one more ip_changes row.
+
+Usage: uv run python benchmarks/simulate_schedule.py [--days N] [--lease-hours H]
+       [--jitter-minutes M] [--random-changes N] [--max-interval S] [--seed N]
+"""
+import argparse
+import bisect
+import random
+import statistics
+
+from docker_public_ip.config import CHECK_INTERVAL
+from docker_public_ip.schedule import AdaptiveSchedule, FixedSchedule
+
+DAY = 86400
+
+
+def change_times(days, lease_hours, jitter_minutes, random_per_week, rng):
+    """Times of the IP changes, in seconds from the start of the history"""
+    times, now = [], 0.0
+    while now < days * DAY:
+        forced = now + lease_hours * 3600 + rng.uniform(-1, 1) * jitter_minutes * 60
+        if not lease_hours:
+            forced = float("inf")
+        if random_per_week:
+            surprise = now + rng.expovariate(random_per_week / (7 * DAY))
+        else:
+            surprise = float("inf")
+        now = min(forced, surprise)
+        times.append(now)
+    return times
+
+
+def simulate(schedule, changes, start, end):
+    checks, detected, missed, latencies = 0, 0, 0, []
+    seen = bisect.bisect_right(changes, start)
+    now = start
+    while now < end:
+        checks += 1
+        current = bisect.bisect_right(changes, now)
+        if current != seen:
+            # Only the latest change is noticed, earlier ones were missed
+            missed += current - seen - 1
+            detected += 1
+            latencies.append(now - changes[current - 1])
+            schedule.changed(now)
+            seen = current
+        else:
+            schedule.stable(now)
+        now += schedule.next_interval(now)
+
+    return {
+        "checks": checks,
+        "writes": checks + detected,
+        "detected": detected,
+        "missed": missed,
+        "mean_s": statistics.fmean(latencies) if latencies else 0,
+        "p95_s": sorted(latencies)[int(len(latencies) * 0.95)] if latencies else 0,
+        "max_s": max(latencies, default=0),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--history-days", type=int, default=14)
+    parser.add_argument("--lease-hours", type=float, default=24)
+    parser.add_argument("--jitter-minutes", type=float, default=2)
+    parser.add_argument("--random-changes", type=float, default=0.5)
+    parser.add_argument("--max-interval", type=float, default=1800)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    start = args.history_days * DAY
+    end = start + args.days * DAY
+    changes = change_times(
+        args.history_days + args.days,
+        args.lease_hours,
+        args.jitter_minutes,
+        args.random_changes,
+        rng,
+    )
+    history = [change for change in changes if change <= start]
+
+    fixed = f"fixed {CHECK_INTERVAL}s"
+    schedules = {
+        "fixed 30s": FixedSchedule(30),
+        fixed: FixedSchedule(CHECK_INTERVAL),
+        "adaptive": AdaptiveSchedule(history, max_interval=CHECK_INTERVAL),
+    }
+    if args.max_interval > CHECK_INTERVAL:
+        schedules[f"adaptive {args.max_interval:g}s"] = AdaptiveSchedule(
+            history, max_interval=args.max_interval
+        )
+
+    print(
+        f"{args.days} days, lease {args.lease_hours:g}h ±{args.jitter_minutes:g}min, "
+        f"{args.random_changes:g} random changes/week, "
+        f"{sum(1 for change in changes if start < change <= end)} changes"
+    )
+    print(
+        f"{'schedule':<16}{'checks':>9}{'writes':>9}{'detected':>10}{'missed':>8}"
+        f"{'mean s':>9}{'p95 s':>9}{'max s':>9}"
+    )
+    results = {}
+    for name, schedule in schedules.items():
+        result = results[name] = simulate(schedule, changes, start, end)
+        print(
+            f"{name:<16}{result['checks']:>9}{result['writes']:>9}"
+            f"{result['detected']:>10}{result['missed']:>8}"
+            f"{result['mean_s']:>9.0f}{result['p95_s']:>9.0f}{result['max_s']:>9.0f}"
+        )
+
+    # Detection delay of each adaptive schedule next to fixed polling
+    print()
+    for name, result in results.items():
+        if name.startswith("adaptive"):
+            print(
+                f"{name} vs {fixed}: "
+                f"{result['checks'] / results[fixed]['checks']:.0%} of the checks, "
+                f"p95 {result['p95_s']:.0f}s vs {results[fixed]['p95_s']:.0f}s, "
+                f"max {result['max_s']:.0f}s vs {results[fixed]['max_s']:.0f}s"
+            )
+
+
+if __name__ == "__main__":
+    main()
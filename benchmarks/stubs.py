@@ -0,0 +1,157 @@
+"""Local stub IP providers for benchmarks
+
+The stub HTTP(S) server answers every GET with a fixed IP address. Latency
+and failures are injected per request from the query string, for example
+``/?latency_ms=50&failure_rate=0.1``.
+
+The stub DNS server answers every A or TXT query with the IP address, and
+fails with SERVFAIL at the configured failure rate.
+"""
+import random
+import socket
+import socketserver
+import ssl
+import struct
+import subprocess
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+
+STUB_IP = "203.0.113.10"
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes, avoid delayed-ACK stalls
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        query = parse_qs(urlparse(self.path).query)
+        latency_ms = float(query.get("latency_ms", [self.server.latency_ms])[0])
+        failure_rate = float(query.get("failure_rate", [self.server.failure_rate])[0])
+
+        if latency_ms:
+            time.sleep(latency_ms / 1000)
+
+        if random.random() < failure_rate:
+            status, body = 503, b"unavailable\n"
+        else:
+            status, body = 200, self.server.ip_address.encode() + b"\n"
+
+        self.server.requests += 1
+        self.send_response(status)
+        self.send_header("Content-Type", "text/plain")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, latency_ms=0, failure_rate=0.0, ip_address=STUB_IP, tls=False):
+        super().__init__(("127.0.0.1", 0), StubHandler)
+        self.latency_ms = latency_ms
+        self.failure_rate = failure_rate
+        self.ip_address = ip_address
+        self.requests = 0
+        self.ca_file = None
+        if tls:
+            self.ca_file = self._wrap_tls()
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+
+    def _wrap_tls(self):
+        """Serve TLS with a throwaway self-signed certificate for localhost"""
+        directory = Path(tempfile.mkdtemp(prefix="stub-tls-"))
+        cert, key = directory / "cert.pem", directory / "key.pem"
+        subprocess.run(
+            [
+                "openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes",
+                "-keyout", str(key), "-out", str(cert), "-days", "1",
+                "-subj", "/CN=localhost", "-addext", "subjectAltName=DNS:localhost",
+            ],
+            check=True,
+            capture_output=True,
+        )
+        context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+        context.load_cert_chain(cert, key)
+        self.socket = context.wrap_socket(self.socket, server_side=True)
+        return str(cert)
+
+    @property
+    def url(self):
+        scheme = "https" if self.ca_file else "http"
+        return f"{scheme}://localhost:{self.server_address[1]}/"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+        self.server_close()
+
+
+class StubDNSHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        data, sock = self.request
+        server = self.server
+        query_id, _, questions = struct.unpack_from("!HHH", data)
+        # Names in queries are never compressed
+        end = data.index(b"\0", 12) + 1
+        (qtype,) = struct.unpack_from("!H", data, end)
+        question = data[12 : end + 4]
+
+        if server.latency_ms:
+            time.sleep(server.latency_ms / 1000)
+
+        answer, rcode = b"", 0
+        if random.random() < server.failure_rate:
+            rcode = 2  # SERVFAIL
+        elif qtype == 1:
+            answer = socket.inet_aton(server.ip_address)
+        elif qtype == 16:
+            text = server.ip_address.encode()
+            answer = bytes([len(text)]) + text
+
+        records = b""
+        if answer:
+            # Pointer to the question name, class IN, TTL 0
+            records = struct.pack("!HHHIH", 0xC00C, qtype, 1, 0, len(answer)) + answer
+
+        server.requests += 1
+        header = struct.pack(
+            "!HHHHHH", query_id, 0x8180 | rcode, questions, 1 if records else 0, 0, 0
+        )
+        sock.sendto(header + question + records, self.client_address)
+
+
+class StubDNSServer(socketserver.ThreadingUDPServer):
+    daemon_threads = True
+
+    def __init__(self, latency_ms=0, failure_rate=0.0, ip_address=STUB_IP):
+        super().__init__(("127.0.0.1", 0), StubDNSHandler)
+        self.latency_ms = latency_ms
+        self.failure_rate = failure_rate
+        self.ip_address = ip_address
+        self.requests = 0
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+
+    def service(self, name="myip.stub", qtype="A"):
+        """services.txt entry querying this server"""
+        suffix = "" if qtype == "A" else f"?type={qtype}"
+        return f"dns://127.0.0.1:{self.server_address[1]}/{name}{suffix}"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+        self.server_close()
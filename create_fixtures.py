@@ -1,158 +1,264 @@
 #!/usr/bin/env python3
-import random
+"""Fill a database with synthetic check history for development and load tests
+
+Checks of every target are generated with NumPy, a chunk of time at a time,
+and bulk inserted into the schema created by Database. The derived tables
+(IP changes and statistics, rollups, service statistics) are then rebuilt
+from them by the database migrations. An existing database at --db is
+replaced.
+
+Usage: uv run python create_fixtures.py [--db PATH] [--days N] [--interval S]
+       [--targets N] [--services N] [--service-skew X] [--failure-rate P]
+       [--latency-sigma X] [--ip-changes-per-day N] [--seed N]
+"""
+import argparse
+import ipaddress
 import sqlite3
-from datetime import datetime, timedelta
+import time
+from datetime import datetime, timezone
 from pathlib import Path
 
-# IP services list
-services = [
-    "https://icanhazip.com",
-    "https://checkip.amazonaws.com",
-    "https://ipinfo.io/ip",
-    "https://wtfismyip.com/text",
-    "https://api.ipify.org",
-    "https://ifconfig.io/ip",
-    "https://www.moanmyip.com/simple",
-    "https://ifconfig.co/ip",
-    "https://ifconfig.me/ip",
-    "https://ipecho.net/plain",
-]
-
-# Sample IPs to simulate changes
-sample_ips = [
-    "192.168.1.100",
-    "10.0.0.50",
-    "172.16.0.25",
-    "192.168.1.100",  # Repeat to simulate stable periods
-    "203.0.113.45",
-    "198.51.100.78",
-    "203.0.113.45",  # Repeat
-]
-
-
-def create_fixtures(db_path="data/ip_history.db"):
-    # Create directory if it doesn't exist
-    Path(db_path).parent.mkdir(parents=True, exist_ok=True)
-    
-    # Connect to database
+import numpy as np
+
+from docker_public_ip.config import DEFAULT_IP_SERVICES, DEFAULT_TARGET
+from docker_public_ip.database import CHECK_INDEXES, Database
+
+# Median response time in ms of the default services, others get 300 ms
+BASE_LATENCY_MS = {
+    "https://icanhazip.com": 150,
+    "https://checkip.amazonaws.com": 350,
+    "https://ipinfo.io/ip": 270,
+    "https://wtfismyip.com/text": 350,
+    "https://api.ipify.org": 330,
+    "https://ifconfig.io/ip": 370,
+    "https://www.moanmyip.com/simple": 680,
+    "https://ifconfig.co/ip": 220,
+    "https://ifconfig.me/ip": 310,
+    "https://ipecho.net/plain": 310,
+}
+ERRORS = np.array(
+    ["Connection timeout", "HTTP 503", "HTTP 500", "Connection refused"], dtype=object
+)
+# Typical share of a response spent resolving, connecting, in TLS and transferring
+PHASE_SHARES = np.array([0.05, 0.2, 0.3, 0.45])
+# A target's IPs are drawn from its own block of this many addresses from
+# 203.0.113.1 on, so earlier IPs come back now and then
+IP_POOL_SIZE = 16
+FIRST_IP = int(ipaddress.IPv4Address("203.0.113.1"))
+
+COLUMNS = (
+    "timestamp_ms",
+    "target",
+    "service_id",
+    "ip",
+    "response_time_ms",
+    "success",
+    "error_message",
+    "dns_ms",
+    "connect_ms",
+    "tls_ms",
+    "transfer_ms",
+)
+
+
+class Target:
+    """Generates the checks of one target, keeping its IP between chunks"""
+
+    def __init__(self, name, index, args, services, rng):
+        self.name = name
+        self.args = args
+        self.rng = rng
+        self.services = services
+        # Targets are checked at staggered times within the interval
+        self.offset_ms = index * args.interval * 1000 // max(1, args.targets)
+        self.ip_pool = FIRST_IP + IP_POOL_SIZE * index + np.arange(IP_POOL_SIZE)
+        self.ip_index = 0
+        self.change_probability = args.ip_changes_per_day * args.interval / 86400
+
+    def checks(self, start_ms, first, count):
+        """Columns of checks number first to first + count - 1"""
+        rng, args, services = self.rng, self.args, self.services
+        number = np.arange(first, first + count, dtype=np.int64)
+        timestamp_ms = (
+            start_ms
+            + self.offset_ms
+            + number * args.interval * 1000
+            + rng.integers(0, args.jitter * 1000 + 1, count)
+        )
+
+        service = rng.choice(len(services["url"]), size=count, p=services["weight"])
+        success = rng.random(count) >= services["failure_rate"][service]
+
+        # Each change moves to another address of the pool
+        changes = rng.random(count) < self.change_probability
+        steps = np.where(changes, rng.integers(1, IP_POOL_SIZE, count), 0)
+        ip_index = (self.ip_index + np.cumsum(steps)) % IP_POOL_SIZE
+        self.ip_index = int(ip_index[-1])
+        ip = self.ip_pool[ip_index]
+
+        response_time = np.round(
+            services["latency"][service]
+            * np.exp(rng.normal(0, args.latency_sigma, count)),
+            1,
+        )
+        shares = PHASE_SHARES * rng.uniform(0.5, 1.5, (count, len(PHASE_SHARES)))
+        phases = np.round(
+            shares / shares.sum(axis=1, keepdims=True) * response_time[:, None], 1
+        )
+
+        def when_successful(values):
+            return np.where(success, values.astype(object), None)
+
+        return {
+            "timestamp_ms": timestamp_ms,
+            "target": np.full(count, self.name, dtype=object),
+            "service_id": service + 1,
+            "ip": when_successful(ip),
+            "response_time_ms": when_successful(response_time),
+            "success": success.astype(np.int64),
+            "error_message": np.where(
+                success, None, ERRORS[rng.integers(0, len(ERRORS), count)]
+            ),
+            "dns_ms": when_successful(phases[:, 0]),
+            "connect_ms": when_successful(phases[:, 1]),
+            "tls_ms": when_successful(phases[:, 2]),
+            "transfer_ms": when_successful(phases[:, 3]),
+        }
+
+
+def service_mix(args, rng):
+    """URL, selection weight, failure rate and median latency per service"""
+    urls = DEFAULT_IP_SERVICES[: args.services]
+    urls += [
+        f"https://service{i}.example.com" for i in range(len(urls), args.services)
+    ]
+    # The best ranked services are picked most, as by the ranking
+    weight = 1 / np.arange(1, len(urls) + 1) ** args.service_skew
+    return {
+        "url": urls,
+        "weight": weight / weight.sum(),
+        "failure_rate": np.clip(
+            args.failure_rate * rng.uniform(0.5, 1.5, len(urls)), 0, 1
+        ),
+        "latency": np.array([BASE_LATENCY_MS.get(url, 300) for url in urls]),
+    }
+
+
+def create_fixtures(args):
+    db_path = Path(args.db)
+    for path in (db_path, Path(f"{db_path}-wal"), Path(f"{db_path}-shm")):
+        if path.exists():
+            print(f"Replacing {path}")
+            path.unlink()
+    Database(db_path).close()
+
+    rng = np.random.default_rng(args.seed)
+    services = service_mix(args, rng)
+    names = (
+        [DEFAULT_TARGET]
+        if args.targets == 1
+        else [f"target{i}" for i in range(1, args.targets + 1)]
+    )
+    targets = [
+        Target(name, index, args, services, rng) for index, name in enumerate(names)
+    ]
+    per_target = int(args.days * 86400 // args.interval)
+    end_ms = int(datetime.now(timezone.utc).timestamp()) * 1000
+    start_ms = end_ms - per_target * args.interval * 1000
+    # Checks per target and chunk, about args.chunk_rows per transaction
+    chunk = max(1, args.chunk_rows // len(targets))
+
+    start = time.perf_counter()
     conn = sqlite3.connect(db_path)
-    
-    # Create table
-    conn.execute("""
-        CREATE TABLE IF NOT EXISTS ip_checks (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-            service TEXT NOT NULL,
-            ip_address TEXT,
-            response_time_ms REAL,
-            success BOOLEAN DEFAULT 1,
-            error_message TEXT
+    conn.execute("PRAGMA journal_mode = OFF")
+    conn.execute("PRAGMA synchronous = OFF")
+    conn.execute("PRAGMA cache_size = -262144")
+    conn.executemany(
+        "INSERT INTO services (id, url) VALUES (?, ?)",
+        [(i + 1, url) for i, url in enumerate(services["url"])],
+    )
+    # Indexes are built once the rows are in
+    for name in CHECK_INDEXES:
+        conn.execute(f"DROP INDEX {name}")
+
+    inserted = 0
+    for first in range(0, per_target, chunk):
+        count = min(chunk, per_target - first)
+        parts = [target.checks(start_ms, first, count) for target in targets]
+        columns = {
+            column: np.concatenate([part[column] for part in parts])
+            for column in COLUMNS
+        }
+        order = np.argsort(columns["timestamp_ms"], kind="stable")
+        rows = zip(*(columns[column][order].tolist() for column in COLUMNS))
+        conn.executemany(
+            f"INSERT INTO ip_checks ({', '.join(COLUMNS)}) "
+            f"VALUES ({', '.join('?' * len(COLUMNS))})",
+            rows,
         )
-    """)
-    
-    # Create indexes
-    conn.execute("""
-        CREATE INDEX IF NOT EXISTS idx_timestamp 
-        ON ip_checks (timestamp DESC)
-    """)
-    
-    conn.execute("""
-        CREATE INDEX IF NOT EXISTS idx_ip_address 
-        ON ip_checks (ip_address)
-    """)
-    
-    # Clear existing data
-    conn.execute("DELETE FROM ip_checks")
-    
-    # Generate data for the last 7 days
-    current_time = datetime.now()
-    start_time = current_time - timedelta(days=7)
-    
-    # Current IP for continuity
-    current_ip_index = 0
-    current_ip = sample_ips[current_ip_index]
-    
-    # Generate checks
-    check_time = start_time
-    check_count = 0
-    
-    while check_time < current_time:
-        # Randomly change IP occasionally (about every 12-48 hours)
-        if random.random() < 0.002:  # ~0.2% chance per check
-            current_ip_index = (current_ip_index + 1) % len(sample_ips)
-            current_ip = sample_ips[current_ip_index]
-            print(f"IP changed to {current_ip} at {check_time}")
-        
-        # Select random service
-        service = random.choice(services)
-        
-        # Simulate success/failure (95% success rate)
-        success = random.random() < 0.95
-        
-        if success:
-            # Generate realistic response times
-            base_time = {
-                "https://icanhazip.com": 150,
-                "https://checkip.amazonaws.com": 350,
-                "https://ipinfo.io/ip": 270,
-                "https://wtfismyip.com/text": 350,
-                "https://api.ipify.org": 330,
-                "https://ifconfig.io/ip": 370,
-                "https://www.moanmyip.com/simple": 680,
-                "https://ifconfig.co/ip": 220,
-                "https://ifconfig.me/ip": 310,
-                "https://ipecho.net/plain": 310,
-            }
-            
-            # Add some variance
-            response_time = base_time.get(service, 300) + random.randint(-50, 100)
-            
-            conn.execute(
-                """
-                INSERT INTO ip_checks 
-                (timestamp, service, ip_address, response_time_ms, success, error_message)
-                VALUES (?, ?, ?, ?, ?, ?)
-                """,
-                (check_time, service, current_ip, response_time, 1, None),
-            )
-        else:
-            # Simulate various errors
-            errors = [
-                "Connection timeout",
-                "HTTP 503",
-                "HTTP 500",
-                "Connection refused",
-            ]
-            error = random.choice(errors)
-            
-            conn.execute(
-                """
-                INSERT INTO ip_checks 
-                (timestamp, service, ip_address, response_time_ms, success, error_message)
-                VALUES (?, ?, ?, ?, ?, ?)
-                """,
-                (check_time, service, None, None, 0, error),
-            )
-        
-        check_count += 1
-        
-        # Progress indicator
-        if check_count % 1000 == 0:
-            print(f"Generated {check_count} checks...")
-        
-        # Advance time by 300 seconds (default check interval)
-        check_time += timedelta(seconds=300)
-    
-    # Commit changes
+        conn.commit()
+        inserted += len(order)
+        print(f"Inserted {inserted} of {per_target * len(targets)} checks...")
+
+    for name, columns in CHECK_INDEXES.items():
+        conn.execute(f"CREATE INDEX {name} ON ip_checks ({columns})")
+    # Rerun the migrations so they backfill the derived tables
+    conn.execute("PRAGMA user_version = 0")
     conn.commit()
     conn.close()
-    
-    print(f"\nCreated {check_count} fixture records in {db_path}")
-    print(f"Time range: {start_time} to {current_time}")
-    print(f"Current IP: {current_ip}")
+    elapsed = time.perf_counter() - start
+    print(
+        f"Created {inserted} checks in {elapsed:.1f}s "
+        f"({inserted / elapsed:.0f} rows/s)"
+    )
+
+    start = time.perf_counter()
+    Database(db_path).close()
+    print(f"Rebuilt the derived tables in {time.perf_counter() - start:.1f}s")
+    print(
+        f"Time range: {datetime.fromtimestamp(start_ms / 1000, timezone.utc)} to "
+        f"{datetime.fromtimestamp(end_ms / 1000, timezone.utc)}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db", default="data/ip_history.db")
+    parser.add_argument("--days", type=float, default=7, help="History length")
+    parser.add_argument(
+        "--interval", type=int, default=300, help="Seconds between checks of a target"
+    )
+    parser.add_argument(
+        "--jitter", type=int, default=2, help="Random seconds added to each check"
+    )
+    parser.add_argument("--targets", type=int, default=1)
+    parser.add_argument(
+        "--services", type=int, default=len(DEFAULT_IP_SERVICES), help="Services used"
+    )
+    parser.add_argument(
+        "--service-skew",
+        type=float,
+        default=0,
+        help="0 picks services evenly, higher values favor the first ones",
+    )
+    parser.add_argument(
+        "--failure-rate",
+        type=float,
+        default=0.05,
+        help="Average share of failed checks, varies per service",
+    )
+    parser.add_argument(
+        "--latency-sigma",
+        type=float,
+        default=0.3,
+        help="Spread of the log-normal response times",
+    )
+    parser.add_argument("--ip-changes-per-day", type=float, default=0.5)
+    parser.add_argument("--chunk-rows", type=int, default=500_000)
+    parser.add_argument("--seed", type=int, help="Random seed, for repeatable data")
+    args = parser.parse_args()
+    create_fixtures(args)
 
 
 if __name__ == "__main__":
-    create_fixtures()
-    print("\nFixtures created successfully!")
-    print("You can now run the service and access http://localhost:8080 to see the data.")
\ No newline at end of file
+    main()
@@ -1,3 +1,4 @@
+import argparse
 import signal
 import sys
 import threading
@@ -5,8 +6,10 @@ import time
 
 from loguru import logger
 
+from .database import Database
+from .export import EXPORT_FORMATS, ExportError, export_checks
 from .ip_checker import IPChecker
-from .web import run_web_server
+from .web import parse_time, run_web_server
 
 
 def signal_handler(signum, frame):
@@ -14,7 +17,7 @@ def signal_handler(signum, frame):
     sys.exit(0)
 
 
-def main():
+def run(args=None):
     logger.info("Starting Docker Public IP Monitor")
 
     # Set up signal handlers
@@ -33,11 +36,92 @@ def main():
     try:
         while True:
             time.sleep(1)
-    except KeyboardInterrupt:
+    except (KeyboardInterrupt, SystemExit):
+        # The signal handlers exit, stop the checker so buffered checks are saved
         logger.info("Shutting down...")
         checker.stop()
         sys.exit(0)
 
 
+def rebuild_rollups(args=None):
+    Database().rebuild_rollups()
+
+
+def vacuum(args=None):
+    db = Database()
+    try:
+        db.vacuum()
+    finally:
+        db.close()
+
+
+def export(args):
+    db = Database()
+    try:
+        chunks = export_checks(
+            db,
+            args.format,
+            target=args.target,
+            service=args.service,
+            since=parse_time(args.since) if args.since else None,
+            until=parse_time(args.until) if args.until else None,
+        )
+        if args.output == "-":
+            output = sys.stdout.buffer
+        else:
+            output = open(args.output, "wb")
+        written = 0
+        with output:
+            for chunk in chunks:
+                output.write(chunk)
+                written += len(chunk)
+    except (ExportError, ValueError, OSError) as error:
+        logger.error(f"Export failed: {error}")
+        sys.exit(1)
+    finally:
+        db.close()
+    logger.info(f"Exported {written} bytes of {args.format} to {args.output}")
+
+
+COMMANDS = {
+    "run": run,
+    "rebuild-rollups": rebuild_rollups,
+    "export": export,
+    "vacuum": vacuum,
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="docker_public_ip", description="Docker service to monitor public IP changes"
+    )
+    subparsers = parser.add_subparsers(dest="command")
+    subparsers.add_parser("run", help="Run the IP monitor and web interface (default)")
+    subparsers.add_parser(
+        "rebuild-rollups", help="Recompute the rollup tables from the raw check history"
+    )
+    export_parser = subparsers.add_parser(
+        "export", help="Stream the check history to a file, oldest first"
+    )
+    export_parser.add_argument(
+        "--format", choices=list(EXPORT_FORMATS), default="csv", help="default: csv"
+    )
+    export_parser.add_argument(
+        "--output", default="-", help="File to write, - for stdout (default)"
+    )
+    export_parser.add_argument("--target", help="Only checks of this target")
+    export_parser.add_argument("--service", help="Only checks of this service")
+    export_parser.add_argument("--since", help="ISO 8601 time, inclusive")
+    export_parser.add_argument("--until", help="ISO 8601 time, exclusive")
+    subparsers.add_parser(
+        "vacuum",
+        help="Shrink the database file and enable incremental vacuum, "
+        "best with the monitor stopped",
+    )
+
+    args = parser.parse_args(argv)
+    COMMANDS[args.command or "run"](args)
+
+
 if __name__ == "__main__":
     main()
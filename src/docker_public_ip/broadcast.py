@@ -0,0 +1,74 @@
+import json
+import queue
+import threading
+from typing import Any, Dict, Optional
+
+from .config import MAX_EVENT_STREAMS
+
+# Events a subscriber may fall behind by before it is dropped
+SUBSCRIBER_QUEUE_SIZE = 256
+
+
+class Broadcaster:
+    """Fans out live events, such as new checks, to server-sent event streams
+
+    Events are formatted once and queued for every subscriber. A subscriber
+    that falls SUBSCRIBER_QUEUE_SIZE events behind is closed instead of
+    holding up the checker, its client reconnects and starts over. At most
+    max_subscribers streams are served at once.
+    """
+
+    def __init__(
+        self,
+        queue_size: int = SUBSCRIBER_QUEUE_SIZE,
+        max_subscribers: int = MAX_EVENT_STREAMS,
+    ):
+        self.queue_size = queue_size
+        self.max_subscribers = max_subscribers
+        self.lock = threading.Lock()
+        self.subscribers = set()
+
+    @property
+    def active(self) -> bool:
+        return bool(self.subscribers)
+
+    def subscribe(self) -> Optional[queue.Queue]:
+        """Queue of (target, message) pairs, ending with None once closed
+
+        Returns None when max_subscribers streams are already open.
+        """
+        subscriber = queue.Queue(self.queue_size)
+        with self.lock:
+            if len(self.subscribers) >= self.max_subscribers:
+                return None
+            self.subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: queue.Queue):
+        with self.lock:
+            self.subscribers.discard(subscriber)
+
+    def publish(self, event: str, target: str, data: Dict[str, Any]):
+        message = f"event: {event}\ndata: {json.dumps(data)}\n\n"
+        with self.lock:
+            for subscriber in list(self.subscribers):
+                try:
+                    subscriber.put_nowait((target, message))
+                except queue.Full:
+                    self._close(subscriber)
+
+    def close(self):
+        """End every stream, on shutdown"""
+        with self.lock:
+            for subscriber in list(self.subscribers):
+                self._close(subscriber)
+
+    def _close(self, subscriber: queue.Queue):
+        self.subscribers.discard(subscriber)
+        # Make room for the end marker, the stream is dropped anyway
+        while True:
+            try:
+                subscriber.get_nowait()
+            except queue.Empty:
+                break
+        subscriber.put_nowait(None)
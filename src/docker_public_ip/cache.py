@@ -0,0 +1,42 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable
+
+
+class GenerationCache:
+    """LRU cache of values computed from the database
+
+    Every entry remembers the data generation it was computed at, and is
+    dropped once the database has moved past it, after ttl seconds, or when
+    max_entries is exceeded, least recently used first.
+    """
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.entries: OrderedDict = OrderedDict()
+
+    def get(self, key: Hashable, generation: int) -> Any:
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            value, entry_generation, expires = entry
+            if entry_generation != generation or expires <= time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def put(self, key: Hashable, generation: int, value: Any):
+        with self.lock:
+            self.entries[key] = (value, generation, time.monotonic() + self.ttl)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
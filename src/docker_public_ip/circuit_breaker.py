@@ -0,0 +1,165 @@
+import threading
+import time
+from typing import Dict, List
+
+from loguru import logger
+
+from .config import (
+    BREAKER_COOLDOWN_SECONDS,
+    BREAKER_FAILURE_THRESHOLD,
+    BREAKER_MAX_COOLDOWN_SECONDS,
+)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half-open"
+
+
+class CircuitBreaker:
+    """Per-service breaker that stops querying providers that keep failing
+
+    After BREAKER_FAILURE_THRESHOLD consecutive failures the breaker opens
+    and the service is skipped for a cooldown. Then a single trial request is
+    allowed (half-open): success closes the breaker, failure opens it again
+    with twice the cooldown, up to BREAKER_MAX_COOLDOWN_SECONDS. Other
+    requests are turned away while the trial runs.
+    """
+
+    def __init__(
+        self,
+        service: str,
+        state: str = CLOSED,
+        consecutive_failures: int = 0,
+        cooldown_seconds: float = BREAKER_COOLDOWN_SECONDS,
+        opened_until: float = 0,
+    ):
+        self.service = service
+        self.state = state
+        self.consecutive_failures = consecutive_failures
+        self.cooldown_seconds = cooldown_seconds
+        self.opened_until = opened_until
+        self.trial_in_flight = False
+
+    def available(self, now: float) -> bool:
+        """Whether a request would be let through, without changing state"""
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN and now < self.opened_until:
+            return False
+        return not self.trial_in_flight
+
+    def acquire(self, now: float) -> bool:
+        """Let a request through, it is the trial once the cooldown is over
+
+        A breaker still open lets requests through too, they are only sent
+        when every breaker is open.
+        """
+        if self.state == CLOSED or (self.state == OPEN and now < self.opened_until):
+            return True
+        if self.trial_in_flight:
+            return False
+        if self.state == OPEN:
+            self.state = HALF_OPEN
+            logger.info(f"Circuit for {self.service} half-open, sending a trial request")
+        self.trial_in_flight = True
+        return True
+
+    def record_success(self):
+        if self.state != CLOSED:
+            logger.info(f"Circuit for {self.service} closed")
+        self.trial_in_flight = False
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.cooldown_seconds = BREAKER_COOLDOWN_SECONDS
+
+    def record_failure(self, now: float):
+        self.trial_in_flight = False
+        self.consecutive_failures += 1
+        if self.state == HALF_OPEN:
+            self.cooldown_seconds = min(
+                self.cooldown_seconds * 2, BREAKER_MAX_COOLDOWN_SECONDS
+            )
+            self.open(now)
+        elif (
+            self.state == CLOSED
+            and self.consecutive_failures >= BREAKER_FAILURE_THRESHOLD
+        ):
+            self.open(now)
+
+    def open(self, now: float):
+        self.state = OPEN
+        self.opened_until = now + self.cooldown_seconds
+        logger.warning(
+            f"Circuit for {self.service} opened for {self.cooldown_seconds:.0f}s "
+            f"after {self.consecutive_failures} consecutive failures"
+        )
+
+    def as_dict(self):
+        return {
+            "service": self.service,
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "cooldown_seconds": self.cooldown_seconds,
+            "opened_until": self.opened_until,
+        }
+
+
+class CircuitBreakers:
+    """Breakers of all services, persisted in the database"""
+
+    def __init__(self, db):
+        self.db = db
+        self.lock = threading.Lock()
+        self.breakers: Dict[str, CircuitBreaker] = {
+            state["service"]: CircuitBreaker(**state) for state in db.get_breakers()
+        }
+
+    def _get(self, service: str) -> CircuitBreaker:
+        if service not in self.breakers:
+            self.breakers[service] = CircuitBreaker(service)
+        return self.breakers[service]
+
+    def available(self, services: List[str]) -> List[str]:
+        """Services whose breaker lets a request through, in the same order
+
+        When every breaker is open the service that reopens first is returned
+        so checks never stop completely. Breakers change state only once a
+        request is sent, see acquire.
+        """
+        now = time.time()
+        with self.lock:
+            allowed = [
+                service for service in services if self._get(service).available(now)
+            ]
+            if not allowed and services:
+                allowed = [min(services, key=lambda s: self._get(s).opened_until)]
+            return allowed
+
+    def acquire(self, service: str) -> bool:
+        """Whether a request to service may be sent now
+
+        Call right before sending it, every acquired request must be recorded
+        or released.
+        """
+        with self.lock:
+            return self._get(service).acquire(time.time())
+
+    def release(self, service: str):
+        """Give back a request that was acquired but never sent"""
+        with self.lock:
+            self._get(service).trial_in_flight = False
+
+    def record(self, service: str, success: bool):
+        with self.lock:
+            breaker = self._get(service)
+            before = (breaker.state, breaker.consecutive_failures)
+            if success:
+                breaker.record_success()
+            else:
+                breaker.record_failure(time.time())
+            if (breaker.state, breaker.consecutive_failures) != before:
+                self.db.save_breaker(**breaker.as_dict())
+
+    def states(self) -> Dict[str, Dict]:
+        with self.lock:
+            return {service: b.as_dict() for service, b in self.breakers.items()}
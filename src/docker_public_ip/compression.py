@@ -0,0 +1,71 @@
+import gzip
+from typing import Optional
+
+from flask import Response, request
+
+from .config import COMPRESS_MIN_SIZE
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Content codings in order of preference, brotli needs the brotli extra
+ENCODINGS = ["br", "gzip"] if brotli else ["gzip"]
+COMPRESSIBLE_TYPES = {
+    "application/javascript",
+    "application/json",
+    "image/svg+xml",
+    "text/css",
+    "text/html",
+    "text/javascript",
+    "text/plain",
+}
+# Levels for responses compressed on every request, and for static files
+# compressed once
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+STATIC_GZIP_LEVEL = 9
+STATIC_BROTLI_QUALITY = 9
+
+
+def accepted_encoding() -> Optional[str]:
+    """Best content coding the client accepts, None for identity"""
+    return request.accept_encodings.best_match(ENCODINGS)
+
+
+def compress(data: bytes, encoding: str, static: bool = False) -> bytes:
+    if encoding == "br":
+        return brotli.compress(
+            data, quality=STATIC_BROTLI_QUALITY if static else BROTLI_QUALITY
+        )
+    return gzip.compress(data, STATIC_GZIP_LEVEL if static else GZIP_LEVEL, mtime=0)
+
+
+def compress_response(response: Response) -> Response:
+    """Compress buffered text responses the client accepts compressed
+
+    Streams, such as exports and server-sent events, and files are sent as
+    they are. The ETag of a compressed response becomes weak, so it still
+    matches the tag of the uncompressed page in conditional requests.
+    """
+    if (
+        response.direct_passthrough
+        or response.is_streamed
+        or response.status_code in (204, 304)
+        or "Content-Encoding" in response.headers
+        or response.mimetype not in COMPRESSIBLE_TYPES
+    ):
+        return response
+
+    response.vary.add("Accept-Encoding")
+    encoding = accepted_encoding()
+    if encoding is None or (response.content_length or 0) < COMPRESS_MIN_SIZE:
+        return response
+
+    response.set_data(compress(response.get_data(), encoding))
+    response.headers["Content-Encoding"] = encoding
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
@@ -8,6 +8,83 @@ WEB_PORT = int(os.getenv("WEB_PORT", "8080"))
 WEB_HOST = os.getenv("WEB_HOST", "0.0.0.0")
 SERVICES_FILE = Path(os.getenv("SERVICES_FILE", "/config/services.txt"))
 
+# "waitress" serves the web interface with WEB_THREADS worker threads,
+# "flask" runs the development server
+WEB_SERVER = os.getenv("WEB_SERVER", "waitress")
+WEB_THREADS = int(os.getenv("WEB_THREADS", "8"))
+# Dashboard event streams open at once, each one keeps a worker thread busy
+MAX_EVENT_STREAMS = int(os.getenv("MAX_EVENT_STREAMS", str(max(1, WEB_THREADS // 2))))
+# Responses smaller than this many bytes are sent uncompressed
+COMPRESS_MIN_SIZE = int(os.getenv("COMPRESS_MIN_SIZE", "500"))
+
+# "fixed" checks every CHECK_INTERVAL, "adaptive" polls fast around changes and
+# backs off while the IP is stable, between these bounds in seconds. Backing
+# off past CHECK_INTERVAL between expected lease ends delays the detection of
+# other changes, so it is opt-in.
+SCHEDULE_MODE = os.getenv("SCHEDULE_MODE", "fixed")
+MIN_CHECK_INTERVAL = int(os.getenv("MIN_CHECK_INTERVAL", "30"))
+MAX_CHECK_INTERVAL = int(os.getenv("MAX_CHECK_INTERVAL", str(CHECK_INTERVAL)))
+
+# Egress paths to monitor, a single default target if the file doesn't exist
+TARGETS_FILE = Path(os.getenv("TARGETS_FILE", "/config/targets.txt"))
+DEFAULT_TARGET = "default"
+# Rendered dashboard pages kept in memory, refreshed after new checks or TTL seconds
+DASHBOARD_CACHE_SIZE = int(os.getenv("DASHBOARD_CACHE_SIZE", "64"))
+DASHBOARD_CACHE_TTL = float(os.getenv("DASHBOARD_CACHE_TTL", "60"))
+# Number of latest checks per target kept in memory for the dashboard
+RECENT_CHECKS_SIZE = int(os.getenv("RECENT_CHECKS_SIZE", "100"))
+# Maximum number of targets being checked at the same time
+MAX_CONCURRENT_CHECKS = int(os.getenv("MAX_CONCURRENT_CHECKS", "50"))
+
+# How services are queried on each check: "sequential", "hedged" or "consensus"
+CHECK_MODE = os.getenv("CHECK_MODE", "sequential")
+MAX_ATTEMPTS = int(os.getenv("MAX_ATTEMPTS", "5"))
+# Per-service timeouts are the recent p99 latency times TIMEOUT_MULTIPLIER,
+# kept between MIN_REQUEST_TIMEOUT and REQUEST_TIMEOUT seconds
+REQUEST_TIMEOUT = float(os.getenv("REQUEST_TIMEOUT", "10"))
+MIN_REQUEST_TIMEOUT = float(os.getenv("MIN_REQUEST_TIMEOUT", "2"))
+TIMEOUT_MULTIPLIER = float(os.getenv("TIMEOUT_MULTIPLIER", "3"))
+# Hedged mode: extra request after this delay, 0 derives it from recorded latency
+HEDGE_DELAY_MS = float(os.getenv("HEDGE_DELAY_MS", "0"))
+MAX_CONCURRENT_REQUESTS = int(os.getenv("MAX_CONCURRENT_REQUESTS", "2"))
+# Consensus mode: query CONSENSUS_PROVIDERS services at once and accept an IP
+# once CONSENSUS_QUORUM of them agree
+CONSENSUS_PROVIDERS = int(os.getenv("CONSENSUS_PROVIDERS", "3"))
+CONSENSUS_QUORUM = int(os.getenv("CONSENSUS_QUORUM", "2"))
+
+# Seconds a resolved provider address is reused by the pooled HTTP session
+DNS_CACHE_TTL = float(os.getenv("DNS_CACHE_TTL", "300"))
+
+# Circuit breaker: skip a service after consecutive failures, with a cooldown
+# that doubles every time the trial request after it fails
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "3"))
+BREAKER_COOLDOWN_SECONDS = float(os.getenv("BREAKER_COOLDOWN_SECONDS", "300"))
+BREAKER_MAX_COOLDOWN_SECONDS = float(os.getenv("BREAKER_MAX_COOLDOWN_SECONDS", "21600"))
+
+# Service ranking: EWMA smoothing factor and share of checks that explore
+RANKING_ALPHA = float(os.getenv("RANKING_ALPHA", "0.2"))
+EXPLORE_RATE = float(os.getenv("EXPLORE_RATE", "0.1"))
+
+# SQLite tuning
+DB_SYNCHRONOUS = os.getenv("DB_SYNCHRONOUS", "NORMAL")
+DB_CACHE_SIZE_KB = int(os.getenv("DB_CACHE_SIZE_KB", "16384"))
+DB_MMAP_SIZE_MB = int(os.getenv("DB_MMAP_SIZE_MB", "128"))
+DB_READ_POOL_SIZE = int(os.getenv("DB_READ_POOL_SIZE", "4"))
+
+# Group commit of check records, a buffer size of 1 writes every check at once
+WRITE_BUFFER_SIZE = max(1, int(os.getenv("WRITE_BUFFER_SIZE", "1")))
+WRITE_BUFFER_SECONDS = int(os.getenv("WRITE_BUFFER_SECONDS", "60"))
+
+# Raw checks older than this many days are pruned, once summarized, 0 keeps
+# them all. Pruning and returning free pages run every MAINTENANCE_INTERVAL
+RAW_RETENTION_DAYS = int(os.getenv("RAW_RETENTION_DAYS", "0"))
+if RAW_RETENTION_DAYS:
+    RAW_RETENTION_DAYS = max(1, RAW_RETENTION_DAYS)
+MAINTENANCE_INTERVAL = int(os.getenv("MAINTENANCE_INTERVAL", "3600"))
+# "monthly" moves checks of past months into one file per month next to
+# DB_PATH, "none" keeps them all in DB_PATH
+DB_PARTITIONS = os.getenv("DB_PARTITIONS", "none")
+
 # Default IP services (fallback if file doesn't exist)
 DEFAULT_IP_SERVICES = [
     "https://icanhazip.com",
@@ -33,8 +110,8 @@ def load_ip_services():
                     line = line.strip()
                     # Skip empty lines and comments
                     if line and not line.startswith("#"):
-                        # Ensure URL has protocol
-                        if not line.startswith(("http://", "https://")):
+                        # Ensure URL has protocol, dns:// entries query a resolver
+                        if not line.startswith(("http://", "https://", "dns://")):
                             line = "https://" + line
                         services.append(line)
 
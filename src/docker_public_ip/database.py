@@ -1,53 +1,1026 @@
+import ipaddress
+import itertools
+import json
+import queue
 import sqlite3
-from datetime import datetime
+import statistics
+import threading
+import time
+from contextlib import closing, contextmanager
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterator, Tuple
 
 from loguru import logger
 
-from .config import DB_PATH
+from .config import (
+    DB_CACHE_SIZE_KB,
+    DB_MMAP_SIZE_MB,
+    DB_PATH,
+    DB_READ_POOL_SIZE,
+    DB_SYNCHRONOUS,
+    DEFAULT_TARGET,
+    WRITE_BUFFER_SECONDS,
+    WRITE_BUFFER_SIZE,
+)
+from .sketch import LatencySketch
+
+# Sliding windows available for service statistics, kept as hourly buckets
+SERVICE_STATS_WINDOWS = {
+    "24h": timedelta(hours=24),
+    "7d": timedelta(days=7),
+}
+SERVICE_STATS_RETENTION = max(SERVICE_STATS_WINDOWS.values())
+
+# Time spent resolving, connecting, negotiating TLS and transferring
+PHASE_COLUMNS = ("dns_ms", "connect_ms", "tls_ms", "transfer_ms")
+
+# Columns of exported checks, id and timestamp first
+CHECK_EXPORT_COLUMNS = (
+    "id",
+    "timestamp",
+    "timestamp_ms",
+    "target",
+    "service",
+    "ip_address",
+    "response_time_ms",
+    "success",
+    "error_message",
+    *PHASE_COLUMNS,
+)
+
+# Event types stored in the events table
+DISAGREEMENT_EVENT = "disagreement"
+
+SERVICES_TABLE = """
+    CREATE TABLE IF NOT EXISTS {schema}.services (
+        id INTEGER PRIMARY KEY,
+        url TEXT NOT NULL UNIQUE
+    )
+"""
+
+# Checks with epoch millisecond timestamps, service ids from the services
+# dictionary and IPv4 addresses packed into integers, see _pack_ip. Both
+# tables are created in the main database and in monthly partitions.
+CHECKS_TABLE = f"""
+    CREATE TABLE IF NOT EXISTS {{schema}}.ip_checks (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        timestamp_ms INTEGER NOT NULL,
+        target TEXT NOT NULL DEFAULT '{DEFAULT_TARGET}',
+        service_id INTEGER NOT NULL REFERENCES services (id),
+        ip,
+        response_time_ms REAL,
+        success INTEGER NOT NULL DEFAULT 1,
+        error_message TEXT,
+        dns_ms REAL,
+        connect_ms REAL,
+        tls_ms REAL,
+        transfer_ms REAL
+    )
+"""
+
+CHECK_INDEXES = {
+    "idx_checks_timestamp": "timestamp_ms",
+    "idx_checks_target": "target, timestamp_ms",
+    # Covers the latest checks of a service read to seed the ranking
+    "idx_checks_service": "service_id, timestamp_ms, id, success, response_time_ms",
+}
+
+# With DB_PARTITIONS=monthly, checks of past months move out of ip_checks
+# into one file per month next to the database, ip_history-2026-09.db for
+# ip_history.db. Reads attach the months their time range overlaps under
+# this schema name.
+PARTITION_SCHEMA = "archive"
+
+# Checks stored with text timestamps and service URLs by earlier versions,
+# moved into ip_checks by Database.compact_legacy_checks
+LEGACY_CHECKS_TABLE = "ip_checks_legacy"
+LEGACY_CHECKS_INDEXES = (
+    "idx_timestamp",
+    "idx_ip_address",
+    "idx_service_timestamp",
+    "idx_target_timestamp",
+)
+# Legacy checks moved per transaction
+LEGACY_BATCH_ROWS = 5000
+
+# Raw checks deleted per transaction when pruning, and free pages returned to
+# the file system per incremental vacuum step
+RETENTION_BATCH_ROWS = 5000
+VACUUM_STEP_PAGES = 256
+# Pause between the transactions of background maintenance, it lets checks
+# and readers through
+MAINTENANCE_PAUSE = 0.05
+
+HOUR_MS = 3600 * 1000
+DAY_MS = 24 * HOUR_MS
+
+# Aggregates keyed by target, created by init_db and by _add_target_columns.
+# Without a rowid the rows are stored in primary key order, so the dashboard
+# reads a target's buckets from a single b-tree.
+IP_STATS_TABLE = f"""
+    CREATE TABLE IF NOT EXISTS ip_stats (
+        target TEXT NOT NULL DEFAULT '{DEFAULT_TARGET}',
+        ip_address TEXT NOT NULL,
+        frequency INTEGER NOT NULL DEFAULT 0,
+        first_seen DATETIME,
+        last_seen DATETIME,
+        PRIMARY KEY (target, ip_address)
+    ) WITHOUT ROWID
+"""
+
+CHECK_ROLLUPS_TABLE = f"""
+    CREATE TABLE IF NOT EXISTS check_rollups (
+        target TEXT NOT NULL DEFAULT '{DEFAULT_TARGET}',
+        period TEXT NOT NULL,
+        bucket TEXT NOT NULL,
+        checks INTEGER NOT NULL DEFAULT 0,
+        failures INTEGER NOT NULL DEFAULT 0,
+        changes INTEGER NOT NULL DEFAULT 0,
+        latency_sum REAL NOT NULL DEFAULT 0,
+        latency_count INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (target, period, bucket)
+    ) WITHOUT ROWID
+"""
+
+
+def _timestamp_sql(column: str) -> str:
+    """SQL formatting epoch milliseconds like the text timestamps"""
+    return f"datetime({column} / 1000, 'unixepoch')"
+
+
+def _legacy_ms_sql(column: str) -> str:
+    """SQL converting a text timestamp to epoch milliseconds"""
+    return f"CAST(ROUND((julianday({column}) - 2440587.5) * {DAY_MS}) AS INTEGER)"
+
+
+def _legacy_checks_ms_sql(alias: str) -> str:
+    """SQL of the epoch milliseconds of a legacy check
+
+    Checks stored without a timestamp get the one of the closest earlier
+    check, or 0 when there is none.
+    """
+    return f"""COALESCE(
+        {_legacy_ms_sql(f"{alias}.timestamp")},
+        (
+            SELECT {_legacy_ms_sql("p.timestamp")} FROM {LEGACY_CHECKS_TABLE} p
+            WHERE p.id < {alias}.id AND p.timestamp IS NOT NULL
+            ORDER BY p.id DESC LIMIT 1
+        ),
+        0
+    )"""
+
+
+def _ip_address_sql(column: str) -> str:
+    """SQL turning an address stored by _pack_ip back into text"""
+    return (
+        f"CASE WHEN typeof({column}) = 'integer' THEN printf('%d.%d.%d.%d', "
+        f"{column} >> 24, ({column} >> 16) & 255, ({column} >> 8) & 255, {column} & 255) "
+        f"ELSE {column} END"
+    )
+
+
+def _pack_ip(ip_address: str):
+    """IPv4 addresses are stored as integers, anything else as it is"""
+    if ip_address is None:
+        return None
+    try:
+        return int(ipaddress.IPv4Address(ip_address))
+    except ValueError:
+        return ip_address
+
+
+def _from_epoch_ms(epoch_ms: int) -> datetime:
+    return datetime.fromtimestamp(epoch_ms / 1000, timezone.utc)
+
+
+def _epoch_ms(timestamp: str) -> int:
+    moment = datetime.fromisoformat(timestamp)
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return round(moment.timestamp() * 1000)
+
+
+# Check columns as returned by the read methods, from ip_checks c joined
+# with services s
+CHECK_COLUMN_SQL = {
+    "timestamp": _timestamp_sql("c.timestamp_ms"),
+    "service": "s.url",
+    "ip_address": _ip_address_sql("c.ip"),
+}
+CHECK_COLUMNS = ", ".join(
+    f"{CHECK_COLUMN_SQL.get(column, f'c.{column}')} AS {column}"
+    for column in CHECK_EXPORT_COLUMNS
+)
+
+# Legacy checks not moved yet, in the columns of ip_checks
+LEGACY_CHECKS_SOURCE = f"""(
+    SELECT
+        l.id,
+        {_legacy_checks_ms_sql("l")} AS timestamp_ms,
+        l.target,
+        s.id AS service_id,
+        l.ip_address AS ip,
+        {", ".join(f"l.{column}" for column in (
+            "response_time_ms", "success", "error_message", *PHASE_COLUMNS
+        ))}
+    FROM {LEGACY_CHECKS_TABLE} l JOIN services s ON s.url = l.service
+)"""
+
+
+def _table_columns(conn, table: str) -> List[str]:
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+
+
+def _has_table(conn, table: str) -> bool:
+    row = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)
+    ).fetchone()
+    return row is not None
+
+
+def _metadata(conn, key: str, default=None):
+    row = conn.execute("SELECT value FROM metadata WHERE key = ?", (key,)).fetchone()
+    return row[0] if row else default
+
+
+def _set_metadata(conn, key: str, value):
+    conn.execute("INSERT OR REPLACE INTO metadata (key, value) VALUES (?, ?)", (key, value))
+
+
+def _raw_since(conn) -> int:
+    """Epoch milliseconds before which raw checks were pruned, 0 if never
+
+    Always the start of a day. Pruned checks live on in check_rollups and
+    service_stats_daily.
+    """
+    return _metadata(conn, "raw_since_ms", 0)
+
+
+def _archived_before(conn) -> int:
+    """Epoch milliseconds before which checks are read from monthly partitions
+
+    Always the start of a month, 0 while nothing was archived. Checks before
+    it that are still in ip_checks are on their way out and ignored.
+    """
+    return _metadata(conn, "archived_before_ms", 0)
+
+
+def _month_bounds(month: str) -> Tuple[int, int]:
+    """Epoch milliseconds of the start of a YYYY-MM month and of the next one"""
+    start = datetime.strptime(month, "%Y-%m").replace(tzinfo=timezone.utc)
+    end = (start + timedelta(days=32)).replace(day=1)
+    return round(start.timestamp() * 1000), round(end.timestamp() * 1000)
+
+
+@contextmanager
+def _attached(conn, path: Path, read_only: bool = True):
+    """Attach a monthly partition as PARTITION_SCHEMA while the block runs"""
+    uri = path.absolute().as_uri() + ("?mode=ro" if read_only else "")
+    conn.execute(f"ATTACH DATABASE ? AS {PARTITION_SCHEMA}", (uri,))
+    conn.execute(f"PRAGMA {PARTITION_SCHEMA}.cache_size = -{DB_CACHE_SIZE_KB}")
+    conn.execute(f"PRAGMA {PARTITION_SCHEMA}.mmap_size = {DB_MMAP_SIZE_MB * 1024 * 1024}")
+    try:
+        yield conn
+    finally:
+        conn.execute(f"DETACH DATABASE {PARTITION_SCHEMA}")
+
+
+def _check_history(conn) -> str:
+    """Subquery over all stored checks, legacy ones not moved yet included
+
+    Columns are id, timestamp_ms, target, service, ip_address,
+    response_time_ms and success.
+    """
+    history = f"""
+        SELECT
+            c.id, c.timestamp_ms, c.target, s.url AS service,
+            {_ip_address_sql("c.ip")} AS ip_address, c.response_time_ms, c.success
+        FROM ip_checks c JOIN services s ON s.id = c.service_id
+    """
+    if _has_table(conn, LEGACY_CHECKS_TABLE):
+        history += f"""
+            UNION ALL
+            SELECT
+                l.id, {_legacy_checks_ms_sql("l")}, l.target, l.service,
+                l.ip_address, l.response_time_ms, l.success
+            FROM {LEGACY_CHECKS_TABLE} l
+        """
+    return f"({history})"
+
+
+def _backfill_ip_changes(conn):
+    """Populate ip_changes from the existing ip_checks history"""
+    conn.execute("DELETE FROM ip_changes")
+    conn.execute(
+        f"""
+        INSERT INTO ip_changes (timestamp, ip_address, previous_ip, target)
+        SELECT {_timestamp_sql("timestamp_ms")}, ip_address, previous_ip, target
+        FROM (
+            SELECT
+                id,
+                timestamp_ms,
+                ip_address,
+                target,
+                LAG(ip_address) OVER (
+                    PARTITION BY target ORDER BY timestamp_ms, id
+                ) as previous_ip
+            FROM {_check_history(conn)}
+            WHERE success = 1 AND ip_address IS NOT NULL
+        )
+        WHERE ip_address != previous_ip OR previous_ip IS NULL
+        ORDER BY timestamp_ms, id
+        """
+    )
+
+
+def _backfill_ip_stats(conn):
+    """Populate ip_stats from the existing ip_checks history"""
+    conn.execute("DELETE FROM ip_stats")
+    conn.execute(
+        f"""
+        INSERT INTO ip_stats (target, ip_address, frequency, first_seen, last_seen)
+        SELECT
+            target,
+            ip_address,
+            COUNT(*),
+            {_timestamp_sql("MIN(timestamp_ms)")},
+            {_timestamp_sql("MAX(timestamp_ms)")}
+        FROM {_check_history(conn)}
+        WHERE success = 1 AND ip_address IS NOT NULL
+        GROUP BY target, ip_address
+        """
+    )
+
+
+def _rollup_buckets(moment: datetime) -> Dict[str, str]:
+    """Rollup bucket keys (day, ISO week, month) for a point in time"""
+    year, week, _ = moment.isocalendar()
+    return {
+        "day": moment.strftime("%Y-%m-%d"),
+        "week": f"{year}-W{week:02d}",
+        "month": moment.strftime("%Y-%m"),
+    }
+
+
+def _rebuild_rollups(conn):
+    """Recompute check_rollups from ip_checks and ip_changes
+
+    Raw rows are aggregated per day in SQL, weeks and months are then
+    folded from the daily totals. The stored totals of days that were
+    pruned from ip_checks are kept.
+    """
+    raw_since = _raw_since(conn)
+    days = {}
+    cursor = conn.execute(
+        """
+        SELECT target, bucket, checks, failures, changes, latency_sum, latency_count
+        FROM check_rollups
+        WHERE period = 'day' AND bucket < ?
+        """,
+        (_rollup_buckets(_from_epoch_ms(raw_since))["day"],),
+    )
+    for target, day, *totals in cursor:
+        days[target, day] = totals
+
+    cursor = conn.execute(
+        f"""
+        SELECT target, DATE(day * 86400, 'unixepoch'), checks, failures,
+               latency_sum, latency_count
+        FROM (
+            SELECT
+                target,
+                timestamp_ms / {DAY_MS} as day,
+                COUNT(*) as checks,
+                SUM(CASE WHEN success = 1 THEN 0 ELSE 1 END) as failures,
+                SUM(CASE WHEN success = 1 THEN response_time_ms END) as latency_sum,
+                COUNT(CASE WHEN success = 1 THEN response_time_ms END) as latency_count
+            FROM {_check_history(conn)}
+            WHERE timestamp_ms >= ?
+            GROUP BY target, day
+        )
+        """,
+        (raw_since,),
+    )
+    for target, day, checks, failures, latency_sum, latency_count in cursor:
+        days[target, day] = [checks, failures, 0, latency_sum or 0, latency_count]
+
+    cursor = conn.execute(
+        """
+        SELECT target, DATE(timestamp) as day, COUNT(*)
+        FROM ip_changes
+        WHERE previous_ip IS NOT NULL
+        GROUP BY target, day
+        """
+    )
+    for target, day, changes in cursor:
+        days.setdefault((target, day), [0, 0, 0, 0, 0])[2] = changes
+
+    rollups = {}
+    for (target, day), totals in days.items():
+        for period, bucket in _rollup_buckets(datetime.fromisoformat(day)).items():
+            current = rollups.setdefault((target, period, bucket), [0, 0, 0, 0, 0])
+            for index, value in enumerate(totals):
+                current[index] += value
+
+    conn.execute("DELETE FROM check_rollups")
+    conn.executemany(
+        """
+        INSERT INTO check_rollups
+        (target, period, bucket, checks, failures, changes, latency_sum, latency_count)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """,
+        [(*key, *totals) for key, totals in rollups.items()],
+    )
+
+
+def _service_hour(moment: datetime) -> str:
+    return moment.strftime("%Y-%m-%d %H")
+
+
+def _combine(current, value, pick):
+    if current is None:
+        return value
+    if value is None:
+        return current
+    return pick(current, value)
+
+
+class ServiceAggregate:
+    """Success counters and latency sketch for one service"""
+
+    def __init__(
+        self,
+        total_checks: int = 0,
+        successful_checks: int = 0,
+        latency_sum: float = 0,
+        min_response_time: float = None,
+        max_response_time: float = None,
+        sketch: str = None,
+    ):
+        self.total_checks = total_checks
+        self.successful_checks = successful_checks
+        self.latency_sum = latency_sum
+        self.min_response_time = min_response_time
+        self.max_response_time = max_response_time
+        self.sketch = LatencySketch.from_json(sketch)
+
+    def add(self, success: bool, response_time_ms: float):
+        self.total_checks += 1
+        if not success:
+            return
+        self.successful_checks += 1
+        if response_time_ms is not None:
+            self.latency_sum += response_time_ms
+            self.sketch.add(response_time_ms)
+            self.min_response_time = _combine(self.min_response_time, response_time_ms, min)
+            self.max_response_time = _combine(self.max_response_time, response_time_ms, max)
+
+    def merge(self, other: "ServiceAggregate"):
+        self.total_checks += other.total_checks
+        self.successful_checks += other.successful_checks
+        self.latency_sum += other.latency_sum
+        self.sketch.merge(other.sketch)
+        self.min_response_time = _combine(
+            self.min_response_time, other.min_response_time, min
+        )
+        self.max_response_time = _combine(
+            self.max_response_time, other.max_response_time, max
+        )
+
+    def row(self):
+        return (
+            self.total_checks,
+            self.successful_checks,
+            self.latency_sum,
+            self.min_response_time,
+            self.max_response_time,
+            self.sketch.to_json(),
+        )
+
+    def stats(self, service: str) -> Dict[str, Any]:
+        count = self.sketch.count
+        return {
+            "service": service,
+            "total_checks": self.total_checks,
+            "successful_checks": self.successful_checks,
+            "avg_response_time": self.latency_sum / count if count else None,
+            "min_response_time": self.min_response_time,
+            "max_response_time": self.max_response_time,
+            "p50_response_time": self.sketch.quantile(0.50),
+            "p95_response_time": self.sketch.quantile(0.95),
+            "p99_response_time": self.sketch.quantile(0.99),
+        }
+
+
+SERVICE_AGGREGATE_COLUMNS = """
+    total_checks, successful_checks, latency_sum,
+    min_response_time, max_response_time, sketch
+"""
+
+
+def _rebuild_service_stats(conn):
+    """Recompute service_stats and service_stats_hourly from ip_checks
+
+    Days pruned from ip_checks are taken from service_stats_daily, and their
+    hourly buckets, if still within SERVICE_STATS_RETENTION, are kept.
+    """
+    raw_since = _raw_since(conn)
+    totals, hourly = {}, {}
+    cursor = conn.execute(
+        f"SELECT service, {SERVICE_AGGREGATE_COLUMNS} FROM service_stats_daily"
+    )
+    for row in cursor:
+        totals.setdefault(row[0], ServiceAggregate()).merge(ServiceAggregate(*row[1:]))
+
+    # Hours are counted since the epoch until the buckets are written
+    cutoff = (datetime.now(timezone.utc) - SERVICE_STATS_RETENTION).timestamp() // 3600
+    cursor = conn.execute(
+        f"""
+        SELECT service, timestamp_ms / {HOUR_MS}, success, response_time_ms
+        FROM {_check_history(conn)}
+        WHERE timestamp_ms >= ?
+        """,
+        (raw_since,),
+    )
+    for service, hour, success, response_time_ms in cursor:
+        totals.setdefault(service, ServiceAggregate()).add(success, response_time_ms)
+        if hour >= cutoff:
+            hourly.setdefault((service, hour), ServiceAggregate()).add(
+                success, response_time_ms
+            )
+
+    conn.execute("DELETE FROM service_stats")
+    conn.execute(
+        "DELETE FROM service_stats_hourly WHERE hour >= ?",
+        (_service_hour(_from_epoch_ms(raw_since)),),
+    )
+    conn.executemany(
+        f"INSERT INTO service_stats (service, {SERVICE_AGGREGATE_COLUMNS}) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+        [(service, *aggregate.row()) for service, aggregate in totals.items()],
+    )
+    conn.executemany(
+        f"INSERT INTO service_stats_hourly (service, hour, {SERVICE_AGGREGATE_COLUMNS}) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        [
+            (service, _service_hour(_from_epoch_ms(hour * HOUR_MS)), *aggregate.row())
+            for (service, hour), aggregate in hourly.items()
+        ],
+    )
+
+
+def _page_conditions(
+    since=None,
+    until=None,
+    before: Tuple[Any, int] = None,
+    after: Tuple[Any, int] = None,
+    column: str = "timestamp",
+    id_column: str = "id",
+) -> Tuple[List[str], List[Any]]:
+    """WHERE conditions selecting one page of rows
+
+    before and after are the (timestamp, id) of the last row of the previous
+    page, newest or oldest first. The row value comparison keeps the scan on
+    the timestamp indexes, and replaces the range bound it implies so SQLite
+    seeks to the cursor rather than to the start of the range.
+    """
+    conditions, params = [], []
+    if since is not None and after is None:
+        conditions.append(f"{column} >= ?")
+        params.append(since)
+    if until is not None and before is None:
+        conditions.append(f"{column} < ?")
+        params.append(until)
+    if before is not None:
+        conditions.append(f"({column}, {id_column}) < (?, ?)")
+        params.extend(before)
+    if after is not None:
+        conditions.append(f"({column}, {id_column}) > (?, ?)")
+        params.extend(after)
+    return conditions, params
+
+
+def _check_page_conditions(
+    target: str = None,
+    service: str = None,
+    since: str = None,
+    until: str = None,
+    before: Tuple[int, int] = None,
+    after: Tuple[int, int] = None,
+) -> Tuple[List[str], List[Any]]:
+    """WHERE conditions of a page of ip_checks, cursors in epoch milliseconds"""
+    conditions, params = _page_conditions(
+        _epoch_ms(since) if since is not None else None,
+        _epoch_ms(until) if until is not None else None,
+        before,
+        after,
+        column="c.timestamp_ms",
+        id_column="c.id",
+    )
+    if target is not None:
+        conditions.append("c.target = ?")
+        params.append(target)
+    if service is not None:
+        conditions.append("c.service_id = (SELECT id FROM services WHERE url = ?)")
+        params.append(service)
+    return conditions, params
+
+
+def _where(conditions: List[str]) -> str:
+    return f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+
+def _parse_timestamp(value: str) -> datetime:
+    return datetime.fromisoformat(value)
+
+
+def _minutes_between(start: str, end: str) -> float:
+    return (_parse_timestamp(end) - _parse_timestamp(start)).total_seconds() / 60
+
+
+def _add_phase_columns(conn, table: str = "ip_checks"):
+    """Add the request phase timing columns to ip_checks"""
+    columns = _table_columns(conn, table)
+    for column in PHASE_COLUMNS:
+        if column not in columns:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} REAL")
+
+
+def _start_checks_compaction(conn):
+    """Set a text timestamp ip_checks table aside for the compact layout
+
+    Runs before the migrations, which expect the compact table. Only the
+    service dictionary is filled here, the rows are moved in batches by
+    Database.compact_legacy_checks while new checks go to the new table.
+    """
+    columns = _table_columns(conn, "ip_checks")
+    if not columns or "timestamp_ms" in columns:
+        return
+
+    logger.info(f"Moving ip_checks to {LEGACY_CHECKS_TABLE} for the compact layout")
+    conn.execute(f"ALTER TABLE ip_checks RENAME TO {LEGACY_CHECKS_TABLE}")
+    _add_phase_columns(conn, LEGACY_CHECKS_TABLE)
+    conn.execute(CHECKS_TABLE.format(schema="main"))
+    conn.execute(
+        f"INSERT OR IGNORE INTO services (url) "
+        f"SELECT DISTINCT service FROM {LEGACY_CHECKS_TABLE}"
+    )
+    # Only the rowid is needed to move the rows, keeping the other indexes
+    # up to date would slow down every batch
+    for index in LEGACY_CHECKS_INDEXES:
+        conn.execute(f"DROP INDEX IF EXISTS {index}")
+    # New checks are numbered after the legacy ones, which keep their ids
+    conn.execute("DELETE FROM sqlite_sequence WHERE name = 'ip_checks'")
+    conn.execute(
+        f"""
+        INSERT INTO sqlite_sequence (name, seq)
+        SELECT 'ip_checks', MAX(id) FROM {LEGACY_CHECKS_TABLE} HAVING MAX(id) IS NOT NULL
+        """
+    )
+
+
+def _move_legacy_checks(conn, batch_size: int) -> int:
+    """Move the newest batch_size legacy checks to ip_checks, returns how many"""
+    row = conn.execute(
+        f"SELECT id FROM {LEGACY_CHECKS_TABLE} ORDER BY id DESC LIMIT 1 OFFSET ?",
+        (batch_size - 1,),
+    ).fetchone()
+    first_id = row[0] if row else 0
+    undated = conn.execute(
+        f"SELECT COUNT(*) FROM {LEGACY_CHECKS_TABLE} WHERE id >= ? AND timestamp IS NULL",
+        (first_id,),
+    ).fetchone()[0]
+    if undated:
+        logger.warning(
+            f"{undated} legacy checks have no timestamp, they get the one of "
+            "the check before them"
+        )
+    columns = ("response_time_ms", "success", "error_message", *PHASE_COLUMNS)
+    conn.execute(
+        f"""
+        INSERT INTO ip_checks
+        (id, timestamp_ms, target, service_id, ip, {", ".join(columns)})
+        SELECT id, timestamp_ms, target, service_id, pack_ip(ip), {", ".join(columns)}
+        FROM {LEGACY_CHECKS_SOURCE} c
+        WHERE id >= ?
+        """,
+        (first_id,),
+    )
+    return conn.execute(
+        f"DELETE FROM {LEGACY_CHECKS_TABLE} WHERE id >= ?", (first_id,)
+    ).rowcount
+
+
+def _cluster_aggregates(conn):
+    """Recreate ip_stats and check_rollups without a rowid"""
+    clustered = (("ip_stats", IP_STATS_TABLE), ("check_rollups", CHECK_ROLLUPS_TABLE))
+    for table, schema in clustered:
+        row = conn.execute(
+            "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)
+        ).fetchone()
+        if "WITHOUT ROWID" in row[0].upper():
+            continue
+        columns = ", ".join(_table_columns(conn, table))
+        conn.execute(f"ALTER TABLE {table} RENAME TO {table}_rowid")
+        conn.execute(schema)
+        conn.execute(
+            f"INSERT INTO {table} ({columns}) SELECT {columns} FROM {table}_rowid"
+        )
+        conn.execute(f"DROP TABLE {table}_rowid")
+
+
+def _add_target_columns(conn):
+    """Scope checks and their aggregates to a target
+
+    Runs before the migrations, which already expect the target columns.
+    Existing history is assigned to the default target.
+    """
+    for table in ("ip_checks", "ip_changes"):
+        if "target" not in _table_columns(conn, table):
+            logger.info(f"Adding target column to {table}")
+            conn.execute(
+                f"ALTER TABLE {table} ADD COLUMN target TEXT NOT NULL "
+                f"DEFAULT '{DEFAULT_TARGET}'"
+            )
+
+    # The primary key changes, so these tables are recreated
+    recreated = (("ip_stats", IP_STATS_TABLE), ("check_rollups", CHECK_ROLLUPS_TABLE))
+    for table, schema in recreated:
+        columns = _table_columns(conn, table)
+        if "target" not in columns:
+            logger.info(f"Adding target column to {table}")
+            conn.execute(f"ALTER TABLE {table} RENAME TO {table}_untargeted")
+            conn.execute(schema)
+            conn.execute(
+                f"INSERT INTO {table} (target, {', '.join(columns)}) "
+                f"SELECT ?, {', '.join(columns)} FROM {table}_untargeted",
+                (DEFAULT_TARGET,),
+            )
+            conn.execute(f"DROP TABLE {table}_untargeted")
+
+
+# Schema migrations, applied in order and tracked through PRAGMA user_version
+MIGRATIONS = [
+    _backfill_ip_changes,
+    _backfill_ip_stats,
+    _rebuild_rollups,
+    _rebuild_service_stats,
+    _add_phase_columns,
+    _cluster_aggregates,
+]
 
 
 class Database:
-    def __init__(self):
-        self.db_path = DB_PATH
+    """SQLite storage for IP checks and their derived aggregates
+
+    Writes go through one long-lived connection guarded by a lock, reads use
+    a small pool of query-only connections handed out per thread. Both run in
+    WAL mode, so the checker and the dashboard do not block each other.
+    """
+
+    def __init__(self, db_path: Path = None):
+        self.db_path = Path(db_path) if db_path else DB_PATH
+        self._write_lock = threading.RLock()
+        self._writer = None
+        self._readers = queue.LifoQueue()
+        self._reader_slots = threading.BoundedSemaphore(DB_READ_POOL_SIZE)
+        self._local = threading.local()
+        self._connections = []
+
+        # Checks waiting for a group commit, visible to readers as an overlay
+        self._buffer_lock = threading.RLock()
+        self._pending_checks = []
+        self._pending_changes = []
+        self._pending_since = None
+
+        # Ids of the services table, by URL
+        self._service_ids = {}
+
+        # Bumped on every write so caches of derived data know when to refresh
+        self._generations = itertools.count(1)
+        self.generation = 0
+        self.modified = datetime.now(timezone.utc)
+
         self.init_db()
 
+    def _connect(self, read_only: bool = False) -> sqlite3.Connection:
+        # URI filenames let readers attach partitions read-only
+        conn = sqlite3.connect(
+            self.db_path.absolute().as_uri(),
+            uri=True,
+            timeout=30,
+            check_same_thread=False,
+            cached_statements=256,
+        )
+        conn.row_factory = sqlite3.Row
+        if not read_only:
+            # Only takes effect on a new database, before WAL mode writes the
+            # header, older ones switch with the vacuum command
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute(f"PRAGMA synchronous = {DB_SYNCHRONOUS}")
+        conn.execute(f"PRAGMA cache_size = -{DB_CACHE_SIZE_KB}")
+        conn.execute(f"PRAGMA mmap_size = {DB_MMAP_SIZE_MB * 1024 * 1024}")
+        conn.execute("PRAGMA temp_store = MEMORY")
+        if read_only:
+            conn.execute("PRAGMA query_only = 1")
+        else:
+            conn.create_function("pack_ip", 1, _pack_ip, deterministic=True)
+        self._connections.append(conn)
+        return conn
+
+    @contextmanager
+    def writer(self):
+        """Transaction on the shared writer connection, committed on exit"""
+        with self._write_lock:
+            if self._writer is None:
+                self._writer = self._connect()
+            try:
+                yield self._writer
+                self._writer.commit()
+            except BaseException:
+                self._writer.rollback()
+                # Services added by the transaction are gone with it
+                self._service_ids.clear()
+                raise
+
+    @contextmanager
+    def reader(self):
+        """Pooled read-only connection, reused for nested calls in a thread"""
+        conn = getattr(self._local, "reader", None)
+        if conn is not None:
+            yield conn
+            return
+
+        with self._reader_slots:
+            try:
+                conn = self._readers.get_nowait()
+            except queue.Empty:
+                conn = self._connect(read_only=True)
+            self._local.reader = conn
+            try:
+                yield conn
+            finally:
+                self._local.reader = None
+                if conn.in_transaction:
+                    conn.rollback()
+                self._readers.put(conn)
+
+    def close(self):
+        self.flush()
+        with self._write_lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+            self._writer = None
+            self._readers = queue.LifoQueue()
+
     def init_db(self):
         self.db_path.parent.mkdir(parents=True, exist_ok=True)
 
-        with sqlite3.connect(self.db_path) as conn:
+        with self.writer() as conn:
+            conn.execute(SERVICES_TABLE.format(schema="main"))
+            conn.execute(CHECKS_TABLE.format(schema="main"))
+
             conn.execute(
-                """
-                CREATE TABLE IF NOT EXISTS ip_checks (
+                f"""
+                CREATE TABLE IF NOT EXISTS ip_changes (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    timestamp DATETIME NOT NULL,
+                    ip_address TEXT NOT NULL,
+                    previous_ip TEXT,
+                    target TEXT NOT NULL DEFAULT '{DEFAULT_TARGET}'
+                )
+            """
+            )
+
+            conn.execute(
+                """
+                CREATE INDEX IF NOT EXISTS idx_ip_changes_timestamp
+                ON ip_changes (timestamp DESC)
+            """
+            )
+
+            conn.execute(IP_STATS_TABLE)
+
+            conn.execute(CHECK_ROLLUPS_TABLE)
+
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS service_stats (
+                    service TEXT PRIMARY KEY,
+                    total_checks INTEGER NOT NULL DEFAULT 0,
+                    successful_checks INTEGER NOT NULL DEFAULT 0,
+                    latency_sum REAL NOT NULL DEFAULT 0,
+                    min_response_time REAL,
+                    max_response_time REAL,
+                    sketch TEXT
+                )
+            """
+            )
+
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS service_stats_hourly (
+                    service TEXT NOT NULL,
+                    hour TEXT NOT NULL,
+                    total_checks INTEGER NOT NULL DEFAULT 0,
+                    successful_checks INTEGER NOT NULL DEFAULT 0,
+                    latency_sum REAL NOT NULL DEFAULT 0,
+                    min_response_time REAL,
+                    max_response_time REAL,
+                    sketch TEXT,
+                    PRIMARY KEY (service, hour)
+                )
+            """
+            )
+
+            # Summaries of the days pruned from ip_checks
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS service_stats_daily (
                     service TEXT NOT NULL,
-                    ip_address TEXT,
-                    response_time_ms REAL,
-                    success BOOLEAN DEFAULT 1,
-                    error_message TEXT
+                    day TEXT NOT NULL,
+                    total_checks INTEGER NOT NULL DEFAULT 0,
+                    successful_checks INTEGER NOT NULL DEFAULT 0,
+                    latency_sum REAL NOT NULL DEFAULT 0,
+                    min_response_time REAL,
+                    max_response_time REAL,
+                    sketch TEXT,
+                    PRIMARY KEY (service, day)
+                )
+            """
+            )
+
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS metadata (
+                    key TEXT PRIMARY KEY,
+                    value
+                )
+            """
+            )
+
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS service_breakers (
+                    service TEXT PRIMARY KEY,
+                    state TEXT NOT NULL,
+                    consecutive_failures INTEGER NOT NULL DEFAULT 0,
+                    cooldown_seconds REAL NOT NULL,
+                    opened_until REAL NOT NULL DEFAULT 0
+                )
+            """
+            )
+
+            conn.execute(
+                f"""
+                CREATE TABLE IF NOT EXISTS events (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    timestamp DATETIME NOT NULL,
+                    target TEXT NOT NULL DEFAULT '{DEFAULT_TARGET}',
+                    event_type TEXT NOT NULL,
+                    details TEXT
                 )
             """
             )
 
             conn.execute(
                 """
-                CREATE INDEX IF NOT EXISTS idx_timestamp 
-                ON ip_checks (timestamp DESC)
+                CREATE INDEX IF NOT EXISTS idx_events_target
+                ON events (target, event_type, timestamp DESC)
             """
             )
 
+            _add_target_columns(conn)
+
+            _start_checks_compaction(conn)
+
+            for name, columns in CHECK_INDEXES.items():
+                conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON ip_checks ({columns})")
+
+            # Covers the latest IP and the change lists of a target
+            conn.execute("DROP INDEX IF EXISTS idx_ip_changes_target")
             conn.execute(
                 """
-                CREATE INDEX IF NOT EXISTS idx_ip_address 
-                ON ip_checks (ip_address)
+                CREATE INDEX IF NOT EXISTS idx_ip_changes_covering
+                ON ip_changes (target, timestamp, id, ip_address, previous_ip)
             """
             )
 
-            conn.commit()
+            self.migrate(conn)
+
             logger.info(f"Database initialized at {self.db_path}")
 
+    def migrate(self, conn):
+        """Apply pending schema migrations"""
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        for number, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+            logger.info(f"Applying database migration {number}: {migration.__name__}")
+            migration(conn)
+            conn.execute(f"PRAGMA user_version = {number}")
+
     def record_check(
         self,
         service: str,
@@ -55,206 +1028,1128 @@ class Database:
         response_time_ms: float = None,
         success: bool = True,
         error_message: str = None,
+        phases: Dict[str, float] = None,
+        target: str = DEFAULT_TARGET,
+    ) -> bool:
+        """Record a check, returns True if it revealed a new IP address
+
+        Checks are queued and written in one transaction once the buffer
+        holds WRITE_BUFFER_SIZE records or is WRITE_BUFFER_SECONDS old.
+        """
+        now = datetime.now(timezone.utc)
+        check = {
+            "id": None,
+            "timestamp": now.strftime("%Y-%m-%d %H:%M:%S"),
+            "timestamp_ms": round(now.timestamp() * 1000),
+            "service": service,
+            "ip_address": ip_address,
+            "response_time_ms": response_time_ms,
+            "success": success,
+            "error_message": error_message,
+            "target": target,
+        }
+        for column in PHASE_COLUMNS:
+            check[column] = phases.get(column) if phases else None
+
+        with self._buffer_lock:
+            changed = False
+            if success and ip_address:
+                previous_ip = self.get_last_ip(target)
+                if ip_address != previous_ip:
+                    changed = True
+                    self._pending_changes.append(
+                        {
+                            "timestamp": check["timestamp"],
+                            "ip_address": ip_address,
+                            "previous_ip": previous_ip,
+                            "target": target,
+                        }
+                    )
+
+            self._pending_checks.append((now, check))
+            self._touch(now)
+            if self._pending_since is None:
+                self._pending_since = time.monotonic()
+
+            if (
+                len(self._pending_checks) >= WRITE_BUFFER_SIZE
+                or time.monotonic() - self._pending_since >= WRITE_BUFFER_SECONDS
+            ):
+                self.flush()
+
+        return changed
+
+    def flush(self):
+        """Write all buffered checks in a single transaction"""
+        with self._buffer_lock:
+            if not self._pending_checks:
+                return
+
+            with self.writer() as conn:
+                conn.executemany(
+                    """
+                    INSERT INTO ip_checks
+                    (timestamp_ms, service_id, ip, response_time_ms, success, error_message,
+                     dns_ms, connect_ms, tls_ms, transfer_ms, target)
+                    VALUES (:timestamp_ms, :service_id, :ip, :response_time_ms, :success,
+                            :error_message, :dns_ms, :connect_ms, :tls_ms, :transfer_ms, :target)
+                    """,
+                    [
+                        {
+                            **check,
+                            "service_id": self._service_id(conn, check["service"]),
+                            "ip": _pack_ip(check["ip_address"]),
+                        }
+                        for _, check in self._pending_checks
+                    ],
+                )
+                for now, check in self._pending_checks:
+                    self._record_derived(conn, now, check)
+
+            if len(self._pending_checks) > 1:
+                logger.debug(f"Flushed {len(self._pending_checks)} buffered checks")
+            self._pending_checks = []
+            self._pending_changes = []
+            self._pending_since = None
+
+    def _service_id(self, conn, url: str) -> int:
+        service_id = self._service_ids.get(url)
+        if service_id is None:
+            conn.execute("INSERT OR IGNORE INTO services (url) VALUES (?)", (url,))
+            service_id = conn.execute(
+                "SELECT id FROM services WHERE url = ?", (url,)
+            ).fetchone()[0]
+            self._service_ids[url] = service_id
+        return service_id
+
+    def _record_derived(self, conn, now: datetime, check: Dict[str, Any]):
+        """Update the tables derived from ip_checks for one new check"""
+        timestamp, ip_address = check["timestamp"], check["ip_address"]
+        success, target = check["success"], check["target"]
+
+        changed, previous_ip = False, None
+        if success and ip_address:
+            self._record_ip_seen(conn, target, timestamp, ip_address)
+            changed, previous_ip = self._record_ip_change(
+                conn, target, timestamp, ip_address
+            )
+
+        self._record_rollups(
+            conn,
+            target,
+            now,
+            success=success,
+            response_time_ms=check["response_time_ms"],
+            changed=changed and previous_ip is not None,
+        )
+        self._record_service_stats(
+            conn, now, check["service"], success, check["response_time_ms"]
+        )
+
+    @staticmethod
+    def _record_rollups(
+        conn,
+        target: str,
+        moment: datetime,
+        success: bool,
+        response_time_ms: float,
+        changed: bool,
     ):
-        with sqlite3.connect(self.db_path) as conn:
+        has_latency = bool(success) and response_time_ms is not None
+        conn.executemany(
+            """
+            INSERT INTO check_rollups
+            (target, period, bucket, checks, failures, changes, latency_sum, latency_count)
+            VALUES (?, ?, ?, 1, ?, ?, ?, ?)
+            ON CONFLICT (target, period, bucket) DO UPDATE SET
+                checks = checks + 1,
+                failures = failures + excluded.failures,
+                changes = changes + excluded.changes,
+                latency_sum = latency_sum + excluded.latency_sum,
+                latency_count = latency_count + excluded.latency_count
+            """,
+            [
+                (
+                    target,
+                    period,
+                    bucket,
+                    0 if success else 1,
+                    1 if changed else 0,
+                    response_time_ms if has_latency else 0,
+                    1 if has_latency else 0,
+                )
+                for period, bucket in _rollup_buckets(moment).items()
+            ],
+        )
+
+    @staticmethod
+    def _record_service_stats(
+        conn, moment: datetime, service: str, success: bool, response_time_ms: float
+    ):
+        hour = _service_hour(moment)
+
+        row = conn.execute(
+            f"SELECT {SERVICE_AGGREGATE_COLUMNS} FROM service_stats WHERE service = ?",
+            (service,),
+        ).fetchone()
+        aggregate = ServiceAggregate(*row) if row else ServiceAggregate()
+        aggregate.add(success, response_time_ms)
+        conn.execute(
+            f"INSERT OR REPLACE INTO service_stats (service, {SERVICE_AGGREGATE_COLUMNS}) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (service, *aggregate.row()),
+        )
+
+        row = conn.execute(
+            f"""
+            SELECT {SERVICE_AGGREGATE_COLUMNS} FROM service_stats_hourly
+            WHERE service = ? AND hour = ?
+            """,
+            (service, hour),
+        ).fetchone()
+        aggregate = ServiceAggregate(*row) if row else ServiceAggregate()
+        aggregate.add(success, response_time_ms)
+        conn.execute(
+            "INSERT OR REPLACE INTO service_stats_hourly "
+            f"(service, hour, {SERVICE_AGGREGATE_COLUMNS}) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (service, hour, *aggregate.row()),
+        )
+
+        cutoff = _service_hour(moment - SERVICE_STATS_RETENTION)
+        conn.execute(
+            "DELETE FROM service_stats_hourly WHERE service = ? AND hour < ?",
+            (service, cutoff),
+        )
+
+    def rebuild_rollups(self):
+        """Recompute the rollup and service statistics tables from raw checks"""
+        with self.writer() as conn:
+            _rebuild_rollups(conn)
+            _rebuild_service_stats(conn)
+            count = conn.execute("SELECT COUNT(*) FROM check_rollups").fetchone()[0]
+            logger.info(f"Rebuilt {count} rollup buckets")
+        self._touch()
+
+    def has_legacy_checks(self) -> bool:
+        """Whether checks of the text timestamp layout remain to be moved"""
+        with self.reader() as conn:
+            return _has_table(conn, LEGACY_CHECKS_TABLE)
+
+    def compact_legacy_checks(
+        self,
+        stop: threading.Event = None,
+        batch_size: int = LEGACY_BATCH_ROWS,
+        batches: int = None,
+    ) -> bool:
+        """Move checks of the text timestamp layout into ip_checks
+
+        Checks move newest first, batch_size rows per transaction, so the
+        latest history is readable right away and the checker keeps writing
+        in between. Moved rows leave the legacy table, an interrupted run
+        continues where it stopped. Returns True once the legacy table is
+        gone, False when stop was set or batches ran first.
+        """
+        stop = stop or threading.Event()
+        with self.reader() as conn:
+            if not _has_table(conn, LEGACY_CHECKS_TABLE):
+                return True
+            remaining = conn.execute(
+                f"SELECT COUNT(*) FROM {LEGACY_CHECKS_TABLE}"
+            ).fetchone()[0]
+
+        logger.info(f"Moving {remaining} checks to the compact layout")
+        moved, started, logged = 0, time.monotonic(), time.monotonic()
+        for _ in itertools.count() if batches is None else range(batches):
+            if stop.is_set():
+                break
+            with self.writer() as conn:
+                count = _move_legacy_checks(conn, batch_size)
+                done = count < batch_size
+                if done:
+                    conn.execute(f"DROP TABLE {LEGACY_CHECKS_TABLE}")
+            moved += count
+            self._touch()
+
+            if done:
+                logger.info(
+                    f"Moved {moved} checks to the compact layout in "
+                    f"{time.monotonic() - started:.0f}s, VACUUM returns the "
+                    "space of the old table to the file system"
+                )
+                return True
+            if time.monotonic() - logged >= 10:
+                logger.info(f"Moved {moved} of {remaining} checks to the compact layout")
+                logged = time.monotonic()
+            stop.wait(MAINTENANCE_PAUSE)
+        return False
+
+    def prune_checks(
+        self,
+        retention_days: int,
+        stop: threading.Event = None,
+        batch_size: int = RETENTION_BATCH_ROWS,
+    ) -> int:
+        """Delete raw checks older than retention_days whole days
+
+        Every day is summarized into service_stats_daily before its checks
+        go, check_rollups, ip_changes and ip_stats already hold the rest, so
+        statistics and charts don't change. Deletes run batch_size rows per
+        transaction. Returns the number of checks deleted.
+        """
+        stop = stop or threading.Event()
+        if self.has_legacy_checks():
+            logger.info("Pruning waits until the checks are moved to the compact layout")
+            return 0
+        now_ms = round(datetime.now(timezone.utc).timestamp() * 1000)
+        cutoff = (now_ms - retention_days * DAY_MS) // DAY_MS * DAY_MS
+
+        # Summarize, then delete what was summarized. Days summarized ahead
+        # of the cutoff for a monthly partition stay until they are archived.
+        self._summarize_until(cutoff, stop)
+        with self.reader() as conn:
+            before = min(_raw_since(conn), cutoff)
+            expired = [
+                path
+                for month, path in self._partitions(conn, until_ms=cutoff)
+                if _month_bounds(month)[1] <= cutoff
+            ]
+        deleted = self._delete_checks(before, stop, batch_size)
+        for path in expired:
+            path.unlink(missing_ok=True)
+            logger.info(f"Deleted {path.name}, past the {retention_days} day retention")
+
+        if deleted:
+            logger.info(f"Pruned {deleted} checks older than {retention_days} days")
+        return deleted
+
+    def archive_checks(
+        self, stop: threading.Event = None, batch_size: int = RETENTION_BATCH_ROWS
+    ) -> int:
+        """Move checks of months before the previous one into monthly files
+
+        The days of a month are summarized as when pruning, its checks are
+        copied batch_size rows per transaction into the month's file, then
+        reads switch over to that file and the checks leave ip_checks. The
+        file isn't written again. An interrupted run continues where it
+        stopped. Returns the number of checks moved.
+        """
+        stop = stop or threading.Event()
+        if self.has_legacy_checks():
+            logger.info("Archiving waits until the checks are moved to the compact layout")
+            return 0
+        # The previous month stays for the latest checks early in a month
+        previous = datetime.now(timezone.utc).replace(day=1) - timedelta(days=1)
+        boundary = _month_bounds(previous.strftime("%Y-%m"))[0]
+
+        while not stop.is_set():
+            with self.reader() as conn:
+                first = conn.execute(
+                    "SELECT MIN(timestamp_ms) FROM ip_checks WHERE timestamp_ms >= ?",
+                    (_archived_before(conn),),
+                ).fetchone()[0]
+            if first is None or first >= boundary:
+                break
+            self._archive_month(_from_epoch_ms(first).strftime("%Y-%m"), stop, batch_size)
+
+        with self.reader() as conn:
+            before = _archived_before(conn)
+        moved = self._delete_checks(before, stop, batch_size)
+        if moved:
+            logger.info(f"Moved {moved} checks to monthly partitions")
+        return moved
+
+    def _archive_month(self, month: str, stop: threading.Event, batch_size: int):
+        """Copy the checks of one month into its partition and read from there
+
+        The writer connection keeps the partition attached in between batches,
+        once all are copied archived_before_ms moves past the month.
+        """
+        start, end = _month_bounds(month)
+        self._summarize_until(end, stop)
+        path = self._partition_path(month)
+        copied = 0
+        with self.writer() as conn:
             conn.execute(
+                f"ATTACH DATABASE ? AS {PARTITION_SCHEMA}", (path.absolute().as_uri(),)
+            )
+        try:
+            with self.writer() as conn:
+                conn.execute(SERVICES_TABLE.format(schema=PARTITION_SCHEMA))
+                conn.execute(CHECKS_TABLE.format(schema=PARTITION_SCHEMA))
+                for name, columns in CHECK_INDEXES.items():
+                    conn.execute(
+                        f"CREATE INDEX IF NOT EXISTS {PARTITION_SCHEMA}.{name} "
+                        f"ON ip_checks ({columns})"
+                    )
+                conn.execute(
+                    f"INSERT OR IGNORE INTO {PARTITION_SCHEMA}.services "
+                    "SELECT * FROM main.services"
+                )
+                # Continue after the last check copied by an interrupted run
+                last = conn.execute(
+                    f"""
+                    SELECT timestamp_ms, id FROM {PARTITION_SCHEMA}.ip_checks
+                    ORDER BY timestamp_ms DESC, id DESC LIMIT 1
+                    """
+                ).fetchone()
+            after = tuple(last) if last else (start, 0)
+
+            while not stop.is_set():
+                with self.writer() as conn:
+                    bound = conn.execute(
+                        """
+                        SELECT timestamp_ms, id FROM main.ip_checks
+                        WHERE (timestamp_ms, id) > (?, ?) AND timestamp_ms < ?
+                        ORDER BY timestamp_ms, id LIMIT 1 OFFSET ?
+                        """,
+                        (*after, end, batch_size - 1),
+                    ).fetchone()
+                    if bound:
+                        condition, bound_params = "(timestamp_ms, id) <= (?, ?)", bound
+                    else:
+                        condition, bound_params = "timestamp_ms < ?", (end,)
+                    copied += conn.execute(
+                        f"""
+                        INSERT INTO {PARTITION_SCHEMA}.ip_checks
+                        SELECT * FROM main.ip_checks
+                        WHERE (timestamp_ms, id) > (?, ?) AND {condition}
+                        ORDER BY timestamp_ms, id
+                        """,
+                        (*after, *bound_params),
+                    ).rowcount
+                if bound is None:
+                    break
+                after = tuple(bound)
+                stop.wait(MAINTENANCE_PAUSE)
+            else:
+                return
+
+            # A transaction of its own, commits across the WAL database and
+            # the partition are not atomic together
+            with self.writer() as conn:
+                _set_metadata(conn, "archived_before_ms", end)
+            logger.info(f"Archived {copied} checks of {month} to {path.name}")
+        finally:
+            with self.writer() as conn:
+                conn.execute(f"DETACH DATABASE {PARTITION_SCHEMA}")
+
+    def _partition_path(self, month: str) -> Path:
+        return self.db_path.with_name(f"{self.db_path.stem}-{month}{self.db_path.suffix}")
+
+    def _partitions(
+        self, conn, since_ms: int = None, until_ms: int = None
+    ) -> List[Tuple[str, Path]]:
+        """Archived (month, file) pairs overlapping since_ms to until_ms, oldest first"""
+        archived_before = _archived_before(conn)
+        if not archived_before:
+            return []
+        stem, suffix = self.db_path.stem, self.db_path.suffix
+        partitions = []
+        for path in sorted(self.db_path.parent.glob(f"{stem}-[0-9]*-[0-9]*{suffix}")):
+            month = path.name[len(stem) + 1 : len(path.name) - len(suffix)]
+            try:
+                start, end = _month_bounds(month)
+            except ValueError:
+                continue
+            if (
+                start < archived_before
+                and (since_ms is None or end > since_ms)
+                and (until_ms is None or start < until_ms)
+            ):
+                partitions.append((month, path))
+        return partitions
+
+    def _check_tables(
+        self,
+        conn,
+        since_ms: int = None,
+        until_ms: int = None,
+        newest_first: bool = False,
+        cursor_id: int = None,
+    ) -> Iterator[Tuple[str, List[str], List[Any], str]]:
+        """ip_checks tables holding checks between since_ms and until_ms, in time order
+
+        Yields each table with the conditions that keep its rows apart from
+        the others and its sort key. Partitions are attached while their rows
+        are read, close the iterator before the connection goes back to the
+        pool.
+
+        Legacy checks not moved yet are older than the moved ones, and are
+        sorted by id as they have no timestamp index. cursor_id is the id of
+        the last row of the previous page, it lets the legacy read seek to it.
+        All tables are then read from one snapshot, so checks moved in
+        between are neither missed nor read twice.
+        """
+        archived_before = _archived_before(conn)
+        main = ("ip_checks", [], [], "c.timestamp_ms {order}, c.id {order}")
+        if archived_before:
+            main = (
+                "ip_checks",
+                ["c.timestamp_ms >= ?"],
+                [archived_before],
+                "c.timestamp_ms {order}, c.id {order}",
+            )
+        legacy = []
+        if _has_table(conn, LEGACY_CHECKS_TABLE):
+            conditions, params = [], []
+            if cursor_id is not None:
+                conditions.append(f"c.id {'<' if newest_first else '>'} ?")
+                params.append(cursor_id)
+            legacy = [(LEGACY_CHECKS_SOURCE, conditions, params, "c.id {order}")]
+        partitions = self._partitions(conn, since_ms, until_ms)
+        # Databases are only archived once their legacy checks are moved,
+        # partitions cannot be attached within a transaction
+        if legacy and not partitions:
+            conn.execute("BEGIN")
+        try:
+            if newest_first:
+                yield main
+                yield from legacy
+                partitions.reverse()
+            for _, path in partitions:
+                with _attached(conn, path):
+                    yield (
+                        f"{PARTITION_SCHEMA}.ip_checks",
+                        [],
+                        [],
+                        "c.timestamp_ms {order}, c.id {order}",
+                    )
+            if not newest_first:
+                yield from legacy
+                yield main
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+
+    def _select_checks(
+        self,
+        conn,
+        conditions: List[str],
+        params: List[Any],
+        limit: int,
+        since_ms: int = None,
+        until_ms: int = None,
+        newest_first: bool = False,
+        cursor_id: int = None,
+    ) -> List[sqlite3.Row]:
+        """Up to limit checks in timestamp order, from all tables holding checks"""
+        rows = []
+        tables = self._check_tables(conn, since_ms, until_ms, newest_first, cursor_id)
+        with closing(tables):
+            for table, table_conditions, table_params, order in tables:
+                rows += conn.execute(
+                    f"""
+                    SELECT {CHECK_COLUMNS}
+                    FROM {table} c JOIN services s ON s.id = c.service_id
+                    {_where(conditions + table_conditions)}
+                    ORDER BY {order.format(order="DESC" if newest_first else "")}
+                    LIMIT ?
+                    """,
+                    (*params, *table_params, limit - len(rows)),
+                ).fetchall()
+                if len(rows) >= limit:
+                    break
+        return rows
+
+    def _summarize_until(self, cutoff: int, stop: threading.Event):
+        """Summarize whole days before cutoff, oldest first, moving raw_since_ms"""
+        while not stop.is_set():
+            with self.reader() as conn:
+                first = conn.execute(
+                    "SELECT MIN(timestamp_ms) FROM ip_checks WHERE timestamp_ms >= ?",
+                    (_raw_since(conn),),
+                ).fetchone()[0]
+            if first is None or first >= cutoff:
+                break
+            self._summarize_day(first // DAY_MS * DAY_MS)
+
+    def _delete_checks(self, before: int, stop: threading.Event, batch_size: int) -> int:
+        """Delete the checks before epoch milliseconds before, in batches"""
+        deleted = 0
+        while not stop.is_set():
+            with self.writer() as conn:
+                count = conn.execute(
+                    """
+                    DELETE FROM ip_checks WHERE id IN (
+                        SELECT id FROM ip_checks WHERE timestamp_ms < ?
+                        ORDER BY timestamp_ms LIMIT ?
+                    )
+                    """,
+                    (before, batch_size),
+                ).rowcount
+            deleted += count
+            if count < batch_size:
+                break
+            stop.wait(MAINTENANCE_PAUSE)
+        if deleted:
+            self._touch()
+        return deleted
+
+    def _summarize_day(self, day_start: int):
+        """Store per-service totals of one day and mark it as pruned"""
+        aggregates = {}
+        with self.reader() as conn:
+            cursor = conn.execute(
                 """
-                INSERT INTO ip_checks 
-                (service, ip_address, response_time_ms, success, error_message)
-                VALUES (?, ?, ?, ?, ?)
+                SELECT s.url, c.success, c.response_time_ms
+                FROM ip_checks c JOIN services s ON s.id = c.service_id
+                WHERE c.timestamp_ms >= ? AND c.timestamp_ms < ?
                 """,
-                (service, ip_address, response_time_ms, success, error_message),
+                (day_start, day_start + DAY_MS),
+            )
+            for service, success, response_time_ms in cursor:
+                aggregates.setdefault(service, ServiceAggregate()).add(
+                    success, response_time_ms
+                )
+
+        day = _rollup_buckets(_from_epoch_ms(day_start))["day"]
+        with self.writer() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO service_stats_daily "
+                f"(service, day, {SERVICE_AGGREGATE_COLUMNS}) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (service, day, *aggregate.row())
+                    for service, aggregate in aggregates.items()
+                ],
+            )
+            _set_metadata(conn, "raw_since_ms", day_start + DAY_MS)
+
+    def incremental_vacuum(
+        self, stop: threading.Event = None, pages: int = VACUUM_STEP_PAGES
+    ) -> int:
+        """Return free pages to the file system, pages at a time
+
+        Needs incremental auto-vacuum, which new databases have and older
+        ones get from vacuum(). Returns the number of pages freed.
+        """
+        stop = stop or threading.Event()
+        with self.reader() as conn:
+            if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+                free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+                if free:
+                    logger.info(
+                        f"{free} free pages stay in the file, run the vacuum "
+                        "command once to return them over time"
+                    )
+                return 0
+
+        freed = 0
+        while not stop.is_set():
+            with self.writer() as conn:
+                free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+                if not free:
+                    break
+                # Run as a script, a single step only frees one page
+                conn.executescript(f"PRAGMA incremental_vacuum({pages})")
+            freed += min(free, pages)
+            stop.wait(MAINTENANCE_PAUSE)
+        if freed:
+            logger.debug(f"Returned {freed} free pages to the file system")
+        return freed
+
+    def vacuum(self):
+        """Rebuild the database file and switch it to incremental auto-vacuum
+
+        Blocks writers until done, for the vacuum command while the service
+        is stopped or idle.
+        """
+        self.flush()
+        with self.writer() as conn:
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            conn.execute("VACUUM")
+        logger.info(f"Vacuumed {self.db_path}")
+
+    def _touch(self, moment: datetime = None):
+        """Start a new data generation"""
+        self.generation = next(self._generations)
+        self.modified = moment or datetime.now(timezone.utc)
+
+    @staticmethod
+    def _record_ip_seen(conn, target: str, timestamp: str, ip_address: str):
+        conn.execute(
+            """
+            INSERT INTO ip_stats (target, ip_address, frequency, first_seen, last_seen)
+            VALUES (?, ?, 1, ?, ?)
+            ON CONFLICT (target, ip_address) DO UPDATE SET
+                frequency = frequency + 1,
+                first_seen = MIN(first_seen, excluded.first_seen),
+                last_seen = MAX(last_seen, excluded.last_seen)
+            """,
+            (target, ip_address, timestamp, timestamp),
+        )
+
+    def _record_ip_change(self, conn, target: str, timestamp: str, ip_address: str):
+        previous_ip = self._last_ip(conn, target)
+        if ip_address == previous_ip:
+            return False, previous_ip
+
+        conn.execute(
+            """
+            INSERT INTO ip_changes (target, timestamp, ip_address, previous_ip)
+            VALUES (?, ?, ?, ?)
+            """,
+            (target, timestamp, ip_address, previous_ip),
+        )
+        return True, previous_ip
+
+    @staticmethod
+    def _last_ip(conn, target: str):
+        row = conn.execute(
+            """
+            SELECT ip_address FROM ip_changes
+            WHERE target = ?
+            ORDER BY timestamp DESC, id DESC
+            LIMIT 1
+            """,
+            (target,),
+        ).fetchone()
+        return row[0] if row else None
+
+    def _pending_target_changes(self, target: str) -> List[Dict[str, Any]]:
+        return [change for change in self._pending_changes if change["target"] == target]
+
+    def get_last_ip(self, target: str = DEFAULT_TARGET):
+        """Get the most recently detected IP address of a target"""
+        with self._buffer_lock:
+            pending = self._pending_target_changes(target)
+            if pending:
+                return pending[-1]["ip_address"]
+        with self.reader() as conn:
+            return self._last_ip(conn, target)
+
+    def get_targets(self) -> List[str]:
+        """Names of the targets that have recorded checks"""
+        with self._buffer_lock, self.reader() as conn:
+            targets = {check["target"] for _, check in self._pending_checks}
+            cursor = conn.execute("SELECT DISTINCT target FROM check_rollups")
+            targets.update(row[0] for row in cursor)
+            return sorted(targets)
+
+    def get_recent_checks(
+        self, limit: int = 100, target: str = DEFAULT_TARGET
+    ) -> List[Dict[str, Any]]:
+        # Hold the buffer lock so a concurrent flush cannot duplicate rows
+        with self._buffer_lock, self.reader() as conn:
+            pending = [
+                dict(check)
+                for _, check in reversed(self._pending_checks)
+                if check["target"] == target
+            ]
+            rows = self._select_checks(
+                conn, ["c.target = ?"], [target], limit, newest_first=True
             )
-            conn.commit()
+            return (pending + [dict(row) for row in rows])[:limit]
 
-    def get_recent_checks(self, limit: int = 100) -> List[Dict[str, Any]]:
-        with sqlite3.connect(self.db_path) as conn:
-            conn.row_factory = sqlite3.Row
+    def get_service_checks(self, service: str, limit: int = 50) -> List[Dict[str, Any]]:
+        """Get the latest checks of one service, newest first"""
+        with self.reader() as conn:
             cursor = conn.execute(
-                """
-                SELECT * FROM ip_checks 
-                ORDER BY timestamp DESC 
+                f"""
+                SELECT
+                    {_timestamp_sql("timestamp_ms")} AS timestamp,
+                    success,
+                    response_time_ms
+                FROM ip_checks
+                WHERE service_id = (SELECT id FROM services WHERE url = ?)
+                ORDER BY timestamp_ms DESC
                 LIMIT ?
                 """,
-                (limit,),
+                (service, limit),
             )
             return [dict(row) for row in cursor.fetchall()]
 
-    def get_ip_changes(self) -> List[Dict[str, Any]]:
-        with sqlite3.connect(self.db_path) as conn:
-            conn.row_factory = sqlite3.Row
-            cursor = conn.execute(
-                """
-                WITH ip_changes AS (
-                    SELECT 
-                        timestamp,
-                        ip_address,
-                        LAG(ip_address) OVER (ORDER BY timestamp) as previous_ip
-                    FROM ip_checks
-                    WHERE success = 1 AND ip_address IS NOT NULL
+    def get_checks_page(
+        self,
+        target: str = None,
+        service: str = None,
+        since: str = None,
+        until: str = None,
+        before: Tuple[int, int] = None,
+        limit: int = 100,
+    ) -> List[Dict[str, Any]]:
+        """Get one page of checks, newest first
+
+        Pages continue from the (timestamp_ms, id) of the previous page's
+        last row instead of an OFFSET, so deep pages cost the same as the
+        first one. Archived months are read from their partitions. Buffered
+        checks show up once they are flushed.
+        """
+        conditions, params = _check_page_conditions(
+            target, service, since, until, before=before
+        )
+        until_ms = _epoch_ms(until) if until is not None else None
+        if before is not None:
+            until_ms = before[0] + 1
+        with self.reader() as conn:
+            rows = self._select_checks(
+                conn,
+                conditions,
+                params,
+                limit,
+                since_ms=_epoch_ms(since) if since is not None else None,
+                until_ms=until_ms,
+                newest_first=True,
+                cursor_id=before[1] if before is not None else None,
+            )
+            return [dict(row) for row in rows]
+
+    def iter_checks(
+        self,
+        target: str = None,
+        service: str = None,
+        since: str = None,
+        until: str = None,
+        chunk_size: int = 10000,
+    ) -> Iterator[List[sqlite3.Row]]:
+        """Yield checks oldest first, in chunks of at most chunk_size rows
+
+        Columns follow CHECK_EXPORT_COLUMNS. Every chunk is a separate query
+        continuing after the previous one, so memory stays bounded and no read
+        transaction stays open while the caller processes a chunk.
+        """
+        since_ms = _epoch_ms(since) if since is not None else None
+        until_ms = _epoch_ms(until) if until is not None else None
+        after = None
+        while True:
+            conditions, params = _check_page_conditions(
+                target, service, since, until, after=after
+            )
+            with self.reader() as conn:
+                rows = self._select_checks(
+                    conn,
+                    conditions,
+                    params,
+                    chunk_size,
+                    since_ms=after[0] if after else since_ms,
+                    until_ms=until_ms,
+                    cursor_id=after[1] if after else None,
                 )
-                SELECT 
-                    timestamp,
-                    ip_address,
-                    previous_ip
-                FROM ip_changes
-                WHERE ip_address != previous_ip OR previous_ip IS NULL
-                ORDER BY timestamp DESC
+            if rows:
+                yield rows
+            if len(rows) < chunk_size:
+                return
+            after = (rows[-1]["timestamp_ms"], rows[-1]["id"])
+
+    def get_breakers(self) -> List[Dict[str, Any]]:
+        with self.reader() as conn:
+            cursor = conn.execute("SELECT * FROM service_breakers")
+            return [dict(row) for row in cursor.fetchall()]
+
+    def save_breaker(
+        self,
+        service: str,
+        state: str,
+        consecutive_failures: int,
+        cooldown_seconds: float,
+        opened_until: float,
+    ):
+        with self.writer() as conn:
+            conn.execute(
                 """
+                INSERT OR REPLACE INTO service_breakers
+                (service, state, consecutive_failures, cooldown_seconds, opened_until)
+                VALUES (?, ?, ?, ?, ?)
+                """,
+                (service, state, consecutive_failures, cooldown_seconds, opened_until),
             )
-            return [dict(row) for row in cursor.fetchall()]
+        self._touch()
 
-    def get_service_stats(self) -> List[Dict[str, Any]]:
-        with sqlite3.connect(self.db_path) as conn:
-            conn.row_factory = sqlite3.Row
-            cursor = conn.execute(
+    def record_event(
+        self, event_type: str, details: Dict[str, Any], target: str = DEFAULT_TARGET
+    ):
+        """Record a monitoring event, such as services disagreeing on the IP"""
+        timestamp = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+        with self.writer() as conn:
+            conn.execute(
                 """
-                SELECT 
-                    service,
-                    COUNT(*) as total_checks,
-                    SUM(CASE WHEN success = 1 THEN 1 ELSE 0 END) as successful_checks,
-                    AVG(CASE WHEN success = 1 THEN response_time_ms ELSE NULL END) as avg_response_time,
-                    MIN(CASE WHEN success = 1 THEN response_time_ms ELSE NULL END) as min_response_time,
-                    MAX(CASE WHEN success = 1 THEN response_time_ms ELSE NULL END) as max_response_time
-                FROM ip_checks
-                GROUP BY service
-                ORDER BY successful_checks DESC, avg_response_time ASC
+                INSERT INTO events (timestamp, target, event_type, details)
+                VALUES (?, ?, ?, ?)
+                """,
+                (timestamp, target, event_type, json.dumps(details)),
+            )
+        self._touch()
+
+    def get_events(
+        self, event_type: str, limit: int = 20, target: str = DEFAULT_TARGET
+    ) -> List[Dict[str, Any]]:
+        with self.reader() as conn:
+            cursor = conn.execute(
                 """
+                SELECT timestamp, target, event_type, details
+                FROM events
+                WHERE target = ? AND event_type = ?
+                ORDER BY timestamp DESC, id DESC
+                LIMIT ?
+                """,
+                (target, event_type, limit),
             )
-            return [dict(row) for row in cursor.fetchall()]
+            events = [dict(row) for row in cursor.fetchall()]
+        for event in events:
+            event["details"] = json.loads(event["details"])
+        return events
 
-    def get_ip_change_stats(self) -> Dict[str, Any]:
-        """Get statistics about IP changes per day/week/month"""
-        with sqlite3.connect(self.db_path) as conn:
-            conn.row_factory = sqlite3.Row
+    def get_change_times(
+        self, target: str = DEFAULT_TARGET, limit: int = 50
+    ) -> List[str]:
+        """Timestamps of the latest IP changes of a target, oldest first
 
-            # Get daily IP changes for last 30 days
-            daily_cursor = conn.execute(
-                """
-                WITH ip_changes AS (
-                    SELECT 
-                        DATE(timestamp) as date,
-                        ip_address,
-                        ROW_NUMBER() OVER (PARTITION BY DATE(timestamp) ORDER BY timestamp) as rn,
-                        LAG(ip_address) OVER (ORDER BY timestamp) as previous_ip
-                    FROM ip_checks
-                    WHERE success = 1 AND ip_address IS NOT NULL
-                        AND timestamp > datetime('now', '-30 days')
-                )
-                SELECT 
-                    date,
-                    COUNT(CASE WHEN ip_address != previous_ip THEN 1 END) as changes
-                FROM ip_changes
-                WHERE rn = 1 OR ip_address != previous_ip
-                GROUP BY date
-                ORDER BY date DESC
+        The initial detection is left out, it doesn't mark the start of a lease.
+        """
+        with self._buffer_lock, self.reader() as conn:
+            pending = [
+                change["timestamp"]
+                for change in self._pending_target_changes(target)
+                if change["previous_ip"] is not None
+            ]
+            cursor = conn.execute(
                 """
+                SELECT timestamp FROM ip_changes
+                WHERE target = ? AND previous_ip IS NOT NULL
+                ORDER BY timestamp DESC, id DESC
+                LIMIT ?
+                """,
+                (target, limit),
             )
-            daily_changes = [dict(row) for row in daily_cursor.fetchall()]
+            stored = [row[0] for row in cursor.fetchall()]
+            return (stored[::-1] + pending)[-limit:]
 
-            # Get weekly IP changes for last 12 weeks
-            weekly_cursor = conn.execute(
+    def get_ip_changes(
+        self, limit: int = None, target: str = DEFAULT_TARGET
+    ) -> List[Dict[str, Any]]:
+        with self._buffer_lock, self.reader() as conn:
+            pending = [
+                dict(change) for change in reversed(self._pending_target_changes(target))
+            ]
+            cursor = conn.execute(
                 """
-                WITH ip_changes AS (
-                    SELECT 
-                        strftime('%Y-W%W', timestamp) as week,
-                        ip_address,
-                        LAG(ip_address) OVER (ORDER BY timestamp) as previous_ip
-                    FROM ip_checks
-                    WHERE success = 1 AND ip_address IS NOT NULL
-                        AND timestamp > datetime('now', '-84 days')
-                )
                 SELECT 
-                    week,
-                    COUNT(CASE WHEN ip_address != previous_ip THEN 1 END) as changes
+                    timestamp,
+                    ip_address,
+                    previous_ip,
+                    target
                 FROM ip_changes
-                WHERE ip_address != previous_ip OR previous_ip IS NULL
-                GROUP BY week
-                ORDER BY week DESC
-                """
+                WHERE target = ?
+                ORDER BY timestamp DESC, id DESC
+                LIMIT ?
+                """,
+                (target, -1 if limit is None else limit),
             )
-            weekly_changes = [dict(row) for row in weekly_cursor.fetchall()]
+            changes = pending + [dict(row) for row in cursor.fetchall()]
+            return changes if limit is None else changes[:limit]
 
-            # Get monthly IP changes for last 12 months
-            monthly_cursor = conn.execute(
-                """
-                WITH ip_changes AS (
-                    SELECT 
-                        strftime('%Y-%m', timestamp) as month,
-                        ip_address,
-                        LAG(ip_address) OVER (ORDER BY timestamp) as previous_ip
-                    FROM ip_checks
-                    WHERE success = 1 AND ip_address IS NOT NULL
-                        AND timestamp > datetime('now', '-12 months')
-                )
-                SELECT 
-                    month,
-                    COUNT(CASE WHEN ip_address != previous_ip THEN 1 END) as changes
+    def get_ip_changes_page(
+        self,
+        target: str = None,
+        since: str = None,
+        until: str = None,
+        before: Tuple[str, int] = None,
+        limit: int = 100,
+    ) -> List[Dict[str, Any]]:
+        """Get one page of IP changes, newest first, see get_checks_page"""
+        conditions, params = _page_conditions(since, until, before)
+        if target is not None:
+            conditions.append("target = ?")
+            params.append(target)
+        with self.reader() as conn:
+            cursor = conn.execute(
+                f"""
+                SELECT id, timestamp, ip_address, previous_ip, target
                 FROM ip_changes
-                WHERE ip_address != previous_ip OR previous_ip IS NULL
-                GROUP BY month
-                ORDER BY month DESC
-                """
+                {_where(conditions)}
+                ORDER BY timestamp DESC, id DESC
+                LIMIT ?
+                """,
+                (*params, limit),
             )
-            monthly_changes = [dict(row) for row in monthly_cursor.fetchall()]
+            return [dict(row) for row in cursor.fetchall()]
 
-            return {
-                "daily": daily_changes,
-                "weekly": weekly_changes,
-                "monthly": monthly_changes,
-            }
+    def get_ip_change_count(self, target: str = DEFAULT_TARGET) -> int:
+        with self._buffer_lock, self.reader() as conn:
+            pending = len(self._pending_target_changes(target))
+            row = conn.execute(
+                "SELECT COUNT(*) FROM ip_changes WHERE target = ?", (target,)
+            ).fetchone()
+            return pending + row[0]
 
-    def get_ip_stability_stats(self) -> Dict[str, Any]:
-        """Get statistics about IP stability"""
-        with sqlite3.connect(self.db_path) as conn:
-            conn.row_factory = sqlite3.Row
+    def get_service_stats(
+        self,
+        window: str = None,
+        since: datetime = None,
+        until: datetime = None,
+        service: str = None,
+    ) -> List[Dict[str, Any]]:
+        """Get per-service statistics, all time, for a sliding window or a range
 
-            # Average time between IP changes
-            cursor = conn.execute(
-                """
-                WITH ip_changes AS (
+        Reads the pre-aggregated service tables, so the cost does not depend
+        on the size of the check history. Ranges are rounded to whole hours
+        and reach back at most SERVICE_STATS_RETENTION.
+        """
+        if window is not None:
+            since = datetime.now(timezone.utc) - SERVICE_STATS_WINDOWS[window]
+        conditions, params = [], []
+        if service is not None:
+            conditions.append("service = ?")
+            params.append(service)
+
+        with self.reader() as conn:
+            if since is None and until is None:
+                cursor = conn.execute(
+                    f"""
+                    SELECT service, {SERVICE_AGGREGATE_COLUMNS} FROM service_stats
+                    {_where(conditions)}
+                    """,
+                    params,
+                )
+                aggregates = {row[0]: ServiceAggregate(*row[1:]) for row in cursor}
+            else:
+                if since is not None:
+                    conditions.append("hour >= ?")
+                    params.append(_service_hour(since))
+                if until is not None:
+                    conditions.append("hour <= ?")
+                    params.append(_service_hour(until))
+                cursor = conn.execute(
+                    f"""
+                    SELECT service, {SERVICE_AGGREGATE_COLUMNS}
+                    FROM service_stats_hourly
+                    {_where(conditions)}
+                    """,
+                    params,
+                )
+                aggregates = {}
+                for row in cursor:
+                    aggregates.setdefault(row[0], ServiceAggregate()).merge(
+                        ServiceAggregate(*row[1:])
+                    )
+
+        stats = [aggregate.stats(service) for service, aggregate in aggregates.items()]
+        stats.sort(
+            key=lambda stat: (
+                -stat["successful_checks"],
+                stat["avg_response_time"] is not None,
+                stat["avg_response_time"] or 0,
+            )
+        )
+        return stats
+
+    def get_ip_change_stats(self, target: str = DEFAULT_TARGET) -> Dict[str, Any]:
+        """Get statistics about IP changes per day/week/month"""
+        now = datetime.now(timezone.utc)
+        windows = {
+            # Last 30 days, 12 weeks and 12 months
+            "daily": ("day", "date", _rollup_buckets(now - timedelta(days=30))["day"]),
+            "weekly": ("week", "week", _rollup_buckets(now - timedelta(days=84))["week"]),
+            "monthly": ("month", "month", _rollup_buckets(now - timedelta(days=365))["month"]),
+        }
+
+        with self.reader() as conn:
+
+            stats = {}
+            for name, (period, label, since) in windows.items():
+                cursor = conn.execute(
+                    f"""
                     SELECT 
-                        timestamp,
-                        ip_address,
-                        LAG(timestamp) OVER (ORDER BY timestamp) as previous_timestamp
-                    FROM ip_checks
-                    WHERE success = 1 AND ip_address IS NOT NULL
-                        AND ip_address != (
-                            SELECT ip_address 
-                            FROM ip_checks AS ic2 
-                            WHERE ic2.timestamp < ip_checks.timestamp 
-                                AND ic2.success = 1 
-                                AND ic2.ip_address IS NOT NULL
-                            ORDER BY ic2.timestamp DESC 
-                            LIMIT 1
-                        )
+                        bucket as {label},
+                        changes,
+                        checks,
+                        failures,
+                        latency_sum / NULLIF(latency_count, 0) as avg_response_time
+                    FROM check_rollups
+                    WHERE target = ? AND period = ? AND bucket >= ?
+                    ORDER BY bucket DESC
+                    """,
+                    (target, period, since),
                 )
-                SELECT 
-                    AVG(CAST((julianday(timestamp) - julianday(previous_timestamp)) * 24 * 60 AS REAL)) as avg_minutes_between_changes,
-                    COUNT(*) as total_changes,
-                    MIN(CAST((julianday(timestamp) - julianday(previous_timestamp)) * 24 * 60 AS REAL)) as min_minutes_between_changes,
-                    MAX(CAST((julianday(timestamp) - julianday(previous_timestamp)) * 24 * 60 AS REAL)) as max_minutes_between_changes
-                FROM ip_changes
-                WHERE previous_timestamp IS NOT NULL
+                stats[name] = [dict(row) for row in cursor.fetchall()]
+
+            return stats
+
+    def get_ip_stability_stats(self, target: str = DEFAULT_TARGET) -> Dict[str, Any]:
+        """Get statistics about IP stability
+
+        Computed in a single ordered pass over ip_changes, so the cost grows
+        with the number of changes rather than the number of checks.
+        """
+        with self.reader() as conn:
+
+            changes = conn.execute(
                 """
-            )
-            stability = dict(cursor.fetchone() or {})
+                SELECT timestamp, ip_address, previous_ip
+                FROM ip_changes
+                WHERE target = ?
+                ORDER BY timestamp, id
+                """,
+                (target,),
+            ).fetchall()
 
             # Most frequent IPs
             cursor = conn.execute(
                 """
                 SELECT 
                     ip_address,
-                    COUNT(*) as frequency,
-                    MIN(timestamp) as first_seen,
-                    MAX(timestamp) as last_seen
-                FROM ip_checks
-                WHERE success = 1 AND ip_address IS NOT NULL
-                GROUP BY ip_address
+                    frequency,
+                    first_seen,
+                    last_seen
+                FROM ip_stats
+                WHERE target = ?
                 ORDER BY frequency DESC
                 LIMIT 10
-                """
+                """,
+                (target,),
             )
             frequent_ips = [dict(row) for row in cursor.fetchall()]
 
-            return {"stability": stability, "frequent_ips": frequent_ips}
+            last_seen = conn.execute(
+                "SELECT MAX(last_seen) FROM ip_stats WHERE target = ?", (target,)
+            ).fetchone()[0]
+
+        # Time between consecutive changes, ignoring the initial detection
+        gaps = []
+        previous_change = None
+        for change in changes:
+            if change["previous_ip"] is None:
+                continue
+            if previous_change is not None:
+                gaps.append(_minutes_between(previous_change, change["timestamp"]))
+            previous_change = change["timestamp"]
+
+        stability = {
+            "avg_minutes_between_changes": statistics.fmean(gaps) if gaps else None,
+            "total_changes": len(gaps),
+            "min_minutes_between_changes": min(gaps, default=None),
+            "max_minutes_between_changes": max(gaps, default=None),
+        }
+
+        # Each change starts a lease that lasts until the next change, the
+        # current lease runs until the last successful check
+        leases_by_ip = {}
+        for index, change in enumerate(changes):
+            if index + 1 < len(changes):
+                end = changes[index + 1]["timestamp"]
+            else:
+                end = last_seen or change["timestamp"]
+            leases_by_ip.setdefault(change["ip_address"], []).append(
+                max(_minutes_between(change["timestamp"], end), 0)
+            )
+
+        leases = sorted(
+            (
+                {
+                    "ip_address": ip_address,
+                    "lease_count": len(durations),
+                    "median_lease_minutes": statistics.median(durations),
+                    "longest_lease_minutes": max(durations),
+                }
+                for ip_address, durations in leases_by_ip.items()
+            ),
+            key=lambda lease: lease["longest_lease_minutes"],
+            reverse=True,
+        )
+
+        return {
+            "stability": stability,
+            "frequent_ips": frequent_ips,
+            "leases": leases,
+        }
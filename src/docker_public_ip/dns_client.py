@@ -0,0 +1,125 @@
+import random
+import socket
+import struct
+import time
+from typing import List
+
+# Record types that can hold an IPv4 address
+QTYPES = {"A": 1, "TXT": 16}
+
+RCODES = {1: "FORMERR", 2: "SERVFAIL", 3: "NXDOMAIN", 4: "NOTIMP", 5: "REFUSED"}
+
+# Header flags: recursion desired, truncated response
+FLAG_RD = 0x0100
+FLAG_TC = 0x0200
+
+
+class DNSError(Exception):
+    """The resolver answered with an error or a malformed response, or not at all
+
+    elapsed_ms is the time spent on the query when it failed without an answer.
+    """
+
+    def __init__(self, message, elapsed_ms=None):
+        super().__init__(message)
+        self.elapsed_ms = elapsed_ms
+
+
+def build_query(query_id: int, name: str, qtype: str) -> bytes:
+    """Wire format of a single question query"""
+    header = struct.pack("!HHHHHH", query_id, FLAG_RD, 1, 0, 0, 0)
+    labels = name.rstrip(".").split(".")
+    qname = b"".join(bytes([len(label)]) + label.encode("ascii") for label in labels)
+    return header + qname + b"\0" + struct.pack("!HH", QTYPES[qtype], 1)
+
+
+def _skip_name(data: bytes, offset: int) -> int:
+    """Offset right after the (possibly compressed) name at offset"""
+    while True:
+        length = data[offset]
+        if length & 0xC0 == 0xC0:
+            # A compression pointer ends the name
+            return offset + 2
+        if length == 0:
+            return offset + 1
+        offset += length + 1
+
+
+def parse_response(data: bytes, query_id: int, qtype: str) -> List[str]:
+    """Records of the queried type in a response, as text"""
+    try:
+        response_id, flags, questions, answers, _, _ = struct.unpack_from("!HHHHHH", data)
+        if response_id != query_id:
+            raise DNSError("Response does not match the query")
+        if flags & 0x000F:
+            raise DNSError(f"DNS error {RCODES.get(flags & 0x000F, flags & 0x000F)}")
+        if flags & FLAG_TC:
+            raise DNSError("Truncated DNS response")
+
+        offset = 12
+        for _ in range(questions):
+            offset = _skip_name(data, offset) + 4
+
+        records = []
+        for _ in range(answers):
+            offset = _skip_name(data, offset)
+            rtype, _, _, length = struct.unpack_from("!HHIH", data, offset)
+            offset += 10
+            rdata = data[offset : offset + length]
+            offset += length
+            if rtype != QTYPES[qtype]:
+                # CNAMEs and other records leading to the answer
+                continue
+            if qtype == "A":
+                records.append(socket.inet_ntoa(rdata))
+            else:
+                # TXT data is a sequence of length-prefixed strings
+                strings, position = [], 0
+                while position < len(rdata):
+                    size = rdata[position]
+                    strings.append(rdata[position + 1 : position + 1 + size])
+                    position += size + 1
+                records.append(b"".join(strings).decode("ascii", "replace"))
+        return records
+    except (struct.error, IndexError, OSError) as e:
+        raise DNSError(f"Malformed DNS response: {e}") from e
+
+
+def query(
+    address: str,
+    name: str,
+    qtype: str = "A",
+    port: int = 53,
+    timeout: float = 5,
+    source_address: str = None,
+) -> List[str]:
+    """Send one UDP query to a resolver address and return the records"""
+    family = socket.AF_INET6 if ":" in address else socket.AF_INET
+    query_id = random.getrandbits(16)
+    start = time.monotonic()
+    deadline = start + timeout
+    with socket.socket(family, socket.SOCK_DGRAM) as sock:
+        try:
+            if source_address:
+                sock.bind((source_address, 0))
+            sock.connect((address, port))
+            sock.send(build_query(query_id, name, qtype))
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise socket.timeout()
+                sock.settimeout(remaining)
+                data = sock.recv(4096)
+                # Ignore stray datagrams, only the answer to this query counts
+                if len(data) >= 2 and struct.unpack_from("!H", data)[0] == query_id:
+                    return parse_response(data, query_id, qtype)
+        except socket.timeout as e:
+            raise DNSError(
+                f"No answer from {address} within {timeout}s",
+                (time.monotonic() - start) * 1000,
+            ) from e
+        except OSError as e:
+            # A closed port is reported by an ICMP error, refusing the next recv
+            raise DNSError(
+                f"DNS query to {address} failed: {e}", (time.monotonic() - start) * 1000
+            ) from e
@@ -0,0 +1,93 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
+from loguru import logger
+
+from .config import MAX_CONCURRENT_CHECKS
+from .targets import Target
+
+
+class CheckEngine:
+    """Schedules the checks of many targets on one asyncio event loop
+
+    Every target gets a task that wakes up whenever its schedule, fixed or
+    adaptive, asks for the next check. Checks use blocking HTTP requests, so
+    they run in a thread pool and a semaphore keeps at most
+    MAX_CONCURRENT_CHECKS of them in flight across targets.
+    """
+
+    def __init__(
+        self,
+        checker,
+        targets: List[Target],
+        max_concurrent: int = MAX_CONCURRENT_CHECKS,
+    ):
+        self.checker = checker
+        self.targets = targets
+        self.max_concurrent = max_concurrent
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_concurrent, thread_name_prefix="target-check"
+        )
+        self.loop = None
+        self.thread = None
+
+    async def run_check(self, target: Target, scheduled: float):
+        """Run one check of a target, waiting for a free concurrency slot"""
+        async with self.semaphore:
+            lag = self.loop.time() - scheduled
+            if lag > target.interval:
+                logger.warning(f"Check of {target.name} started {lag:.1f}s late")
+            await self.loop.run_in_executor(self.executor, self.checker.check_ip, target)
+
+    async def run_target(self, target: Target, offset: float):
+        next_run = self.loop.time() + offset
+        await asyncio.sleep(offset)
+        while True:
+            try:
+                await self.run_check(target, next_run)
+            except Exception as e:
+                logger.error(f"Check of {target.name} failed: {e}")
+
+            now = self.loop.time()
+            # Runs that were missed are dropped instead of caught up in a burst
+            next_run = max(next_run + self.checker.next_interval(target), now)
+            await asyncio.sleep(next_run - now)
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.semaphore = asyncio.Semaphore(self.max_concurrent)
+        # Spread the first checks over each interval so the targets don't
+        # all hit the providers at the same moment, the first one starts now
+        tasks = [
+            self.loop.create_task(
+                self.run_target(target, target.interval * index / len(self.targets)),
+                name=target.name,
+            )
+            for index, target in enumerate(self.targets)
+        ]
+        try:
+            self.loop.run_forever()
+        finally:
+            for task in tasks:
+                task.cancel()
+            self.loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+            self.loop.close()
+
+    def start(self):
+        logger.info(
+            f"Starting check engine for {len(self.targets)} targets, "
+            f"at most {self.max_concurrent} checks at once"
+        )
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self._run, name="check-engine", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        if self.thread is not None:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join()
+            self.thread = None
+        # Let running checks finish so their results get recorded
+        self.executor.shutdown(wait=True, cancel_futures=True)
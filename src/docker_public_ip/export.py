@@ -0,0 +1,162 @@
+import csv
+import io
+import json
+import zlib
+from typing import Iterable, Iterator, List
+
+from .database import CHECK_EXPORT_COLUMNS, PHASE_COLUMNS, Database
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+# Content type and file extension of every export format
+EXPORT_FORMATS = {
+    "csv": ("application/gzip", ".csv.gz"),
+    "ndjson": ("application/gzip", ".ndjson.gz"),
+    "parquet": ("application/vnd.apache.parquet", ".parquet"),
+    "arrow": ("application/vnd.apache.arrow.stream", ".arrows"),
+}
+# Formats written with pyarrow, installed with the parquet extra
+COLUMNAR_FORMATS = ("parquet", "arrow")
+# Rows read from the database at a time, also the Parquet row group size
+EXPORT_CHUNK_ROWS = 50000
+
+
+class ExportError(Exception):
+    pass
+
+
+def export_checks(
+    db: Database, export_format: str, chunk_size: int = EXPORT_CHUNK_ROWS, **filters
+) -> Iterator[bytes]:
+    """Stream the check history in one of EXPORT_FORMATS, oldest first
+
+    filters are passed to Database.iter_checks. The format is validated
+    before streaming starts, memory use depends on chunk_size only.
+    """
+    if export_format not in EXPORT_FORMATS:
+        raise ExportError(
+            f"Unknown export format {export_format}, use one of {list(EXPORT_FORMATS)}"
+        )
+    if export_format in COLUMNAR_FORMATS and pa is None:
+        raise ExportError(
+            f"The {export_format} format needs pyarrow, install the parquet extra"
+        )
+
+    chunks = db.iter_checks(chunk_size=chunk_size, **filters)
+    if export_format == "csv":
+        return _gzip(_csv_text(chunks))
+    if export_format == "ndjson":
+        return _gzip(_ndjson_text(chunks))
+    return _arrow(chunks, parquet=export_format == "parquet")
+
+
+def _gzip(texts: Iterable[str]) -> Iterator[bytes]:
+    compressor = zlib.compressobj(wbits=zlib.MAX_WBITS | 16)
+    for text in texts:
+        data = compressor.compress(text.encode())
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def _csv_text(chunks: Iterable[List]) -> Iterator[str]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CHECK_EXPORT_COLUMNS)
+    for rows in chunks:
+        writer.writerows(rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    # Header of an empty export
+    yield buffer.getvalue()
+
+
+def _ndjson_text(chunks: Iterable[List]) -> Iterator[str]:
+    for rows in chunks:
+        lines = []
+        for row in rows:
+            record = dict(zip(CHECK_EXPORT_COLUMNS, row))
+            record["success"] = bool(record["success"])
+            lines.append(json.dumps(record))
+        yield "\n".join(lines) + "\n"
+
+
+class _ChunkSink:
+    """Write-only file collecting output until it is taken"""
+
+    closed = False
+
+    def __init__(self):
+        self.parts = []
+        self.position = 0
+
+    def write(self, data) -> int:
+        self.parts.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def flush(self):
+        pass
+
+    def take(self) -> bytes:
+        data = b"".join(self.parts)
+        self.parts = []
+        return data
+
+
+def _arrow_schema():
+    return pa.schema(
+        [
+            ("id", pa.int64()),
+            ("timestamp", pa.timestamp("ms", tz="UTC")),
+            ("target", pa.string()),
+            ("service", pa.string()),
+            ("ip_address", pa.string()),
+            ("response_time_ms", pa.float64()),
+            ("success", pa.bool_()),
+            ("error_message", pa.string()),
+            *((column, pa.float64()) for column in PHASE_COLUMNS),
+        ]
+    )
+
+
+def _record_batch(rows: List, schema) -> "pa.RecordBatch":
+    columns = dict(zip(CHECK_EXPORT_COLUMNS, zip(*rows)))
+    arrays = []
+    for field in schema:
+        if field.name == "timestamp":
+            # Typed from the epoch milliseconds, which it makes redundant
+            epoch_ms = pa.array(columns["timestamp_ms"], pa.int64())
+            arrays.append(epoch_ms.cast(field.type))
+        elif field.name == "success":
+            arrays.append(pa.array(columns[field.name], pa.int8()).cast(field.type))
+        else:
+            arrays.append(pa.array(columns[field.name], field.type))
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def _arrow(chunks: Iterable[List], parquet: bool) -> Iterator[bytes]:
+    schema = _arrow_schema()
+    sink = _ChunkSink()
+    output = pa.PythonFile(sink, mode="w")
+    if parquet:
+        writer = pq.ParquetWriter(output, schema, compression="zstd")
+    else:
+        writer = pa.ipc.new_stream(output, schema)
+    for rows in chunks:
+        batch = _record_batch(rows, schema)
+        if parquet:
+            writer.write_batch(batch, row_group_size=len(rows))
+        else:
+            writer.write_batch(batch)
+        yield sink.take()
+    writer.close()
+    yield sink.take()
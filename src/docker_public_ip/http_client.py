@@ -0,0 +1,155 @@
+import socket
+import threading
+import time
+from typing import Dict, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+from .config import DNS_CACHE_TTL, MAX_CONCURRENT_REQUESTS
+
+PHASES = ("dns_ms", "connect_ms", "tls_ms", "transfer_ms")
+
+# Phase timings of the request running in the current thread
+_timings = threading.local()
+
+
+class DNSCache:
+    """Caches resolved addresses for DNS_CACHE_TTL seconds"""
+
+    def __init__(self, ttl: float = DNS_CACHE_TTL):
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.entries: Dict[Tuple[str, int], Tuple[str, float]] = {}
+
+    def resolve(self, host: str, port: int) -> str:
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get((host, port))
+            if entry and entry[1] > now:
+                return entry[0]
+
+        sockaddr = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)[0][4]
+        address = sockaddr[0]
+        with self.lock:
+            self.entries[(host, port)] = (address, now + self.ttl)
+        return address
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+dns_cache = DNSCache()
+
+
+def _add_timing(phase: str, elapsed: float):
+    timings = getattr(_timings, "current", None)
+    if timings is not None:
+        timings[phase] += elapsed * 1000
+
+
+class TimedHTTPConnection(HTTPConnection):
+    """Connection that resolves through the DNS cache and times each phase"""
+
+    def _new_conn(self):
+        host = self._dns_host
+        start = time.perf_counter()
+        try:
+            self._dns_host = dns_cache.resolve(host, self.port)
+        except OSError:
+            # Let urllib3 resolve and raise its usual error
+            self._dns_host = host
+        resolved = time.perf_counter()
+        try:
+            return super()._new_conn()
+        finally:
+            self._dns_host = host
+            _add_timing("dns_ms", resolved - start)
+            _add_timing("connect_ms", time.perf_counter() - resolved)
+
+
+class TimedHTTPSConnection(TimedHTTPConnection, HTTPSConnection):
+    def connect(self):
+        timings = getattr(_timings, "current", None)
+        before = dict(timings) if timings is not None else None
+        start = time.perf_counter()
+        try:
+            super().connect()
+        finally:
+            if timings is not None:
+                # Whatever connect() spent outside DNS and TCP is the handshake
+                socket_ms = sum(timings[p] - before[p] for p in ("dns_ms", "connect_ms"))
+                elapsed_ms = (time.perf_counter() - start) * 1000
+                timings["tls_ms"] += max(elapsed_ms - socket_ms, 0)
+
+
+class TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = TimedHTTPConnection
+
+
+class TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = TimedHTTPSConnection
+
+
+class TimedHTTPAdapter(HTTPAdapter):
+    """Keep-alive adapter whose connections use the timed connection classes
+
+    Connections are bound to source_address when one is given, so requests
+    leave through a specific interface or tunnel.
+    """
+
+    def __init__(self, *args, source_address: str = None, **kwargs):
+        self.source_address = source_address
+        super().__init__(*args, **kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        if self.source_address:
+            kwargs["source_address"] = (self.source_address, 0)
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": TimedHTTPConnectionPool,
+            "https": TimedHTTPSConnectionPool,
+        }
+
+
+def create_session(
+    pool_size: int = MAX_CONCURRENT_REQUESTS * 2,
+    source_address: str = None,
+    proxy: str = None,
+) -> requests.Session:
+    """Session with pooled keep-alive connections to every host
+
+    Requests sent through a proxy (SOCKS needs the requests[socks] extra)
+    only report their transfer time, the proxy hides the other phases.
+    """
+    session = requests.Session()
+    adapter = TimedHTTPAdapter(
+        pool_connections=32, pool_maxsize=pool_size, source_address=source_address
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    if proxy:
+        session.proxies = {"http": proxy, "https": proxy}
+    return session
+
+
+def timed_get(session: requests.Session, url: str, timeout: float):
+    """GET a URL, returns the response and the time spent in each phase
+
+    Phases of a reused keep-alive connection are zero except the transfer.
+    """
+    timings = {phase: 0.0 for phase in PHASES}
+    _timings.current = timings
+    start = time.perf_counter()
+    try:
+        response = session.get(url, timeout=timeout)
+    finally:
+        _timings.current = None
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    timings["transfer_ms"] = max(
+        elapsed_ms - timings["dns_ms"] - timings["connect_ms"] - timings["tls_ms"], 0
+    )
+    return response, elapsed_ms, timings
@@ -1,104 +1,678 @@
-import random
+import threading
 import time
-from datetime import datetime
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime, timezone
+from functools import lru_cache, partial
+from urllib.parse import parse_qs, urlparse
 
-import requests
 from apscheduler.schedulers.background import BackgroundScheduler
 from loguru import logger
 
-from .config import CHECK_INTERVAL, IP_SERVICES
-from .database import Database
+from .config import (
+    CHECK_INTERVAL,
+    CHECK_MODE,
+    CONSENSUS_PROVIDERS,
+    CONSENSUS_QUORUM,
+    DB_PARTITIONS,
+    HEDGE_DELAY_MS,
+    IP_SERVICES,
+    MAINTENANCE_INTERVAL,
+    MAX_ATTEMPTS,
+    MAX_CHECK_INTERVAL,
+    MAX_CONCURRENT_CHECKS,
+    MAX_CONCURRENT_REQUESTS,
+    MIN_REQUEST_TIMEOUT,
+    RAW_RETENTION_DAYS,
+    RECENT_CHECKS_SIZE,
+    REQUEST_TIMEOUT,
+    SCHEDULE_MODE,
+    TIMEOUT_MULTIPLIER,
+    WRITE_BUFFER_SECONDS,
+    WRITE_BUFFER_SIZE,
+)
+from .broadcast import Broadcaster
+from .circuit_breaker import CircuitBreakers
+from .database import DISAGREEMENT_EVENT, Database
+from .dns_client import QTYPES, DNSError, query
+from .engine import CheckEngine
+from .http_client import PHASES, create_session, dns_cache, timed_get
+from .ranking import ServiceRanker
+from .recent import CheckRecord, RecentChecks
+from .schedule import LEASE_HISTORY, AdaptiveSchedule, FixedSchedule
+from .targets import Target, load_targets
+
+# Hedge delay used until enough latency history has been recorded
+DEFAULT_HEDGE_DELAY_MS = 1000
+
+# Seconds the service statistics used for timeouts are shared between checks
+SERVICE_STATS_TTL = 30
+
+
+class ProviderError(Exception):
+    """A provider answered, but not with an IP address"""
+
+    def __init__(self, message, response_time_ms, phases):
+        super().__init__(message)
+        self.response_time_ms = response_time_ms
+        self.phases = phases
+
+
+class Provider:
+    """A way of asking a service for the public IP
+
+    Subclasses handle one kind of service URL, registered by scheme in
+    PROVIDERS. fetch() returns the raw answer, the response time and the
+    time spent in each phase, or raises ProviderError.
+    """
+
+    def __init__(self, service):
+        self.service = service
+
+    def supports(self, target):
+        """Whether the provider can check the IP of a target"""
+        return True
+
+    def fetch(self, session, target, timeout):
+        raise NotImplementedError
+
+
+class HTTPProvider(Provider):
+    """Service answering a GET request with the IP as plain text"""
+
+    def fetch(self, session, target, timeout):
+        response, response_time_ms, phases = timed_get(session, self.service, timeout)
+        if response.status_code != 200:
+            raise ProviderError(f"HTTP {response.status_code}", response_time_ms, phases)
+        return response.text, response_time_ms, phases
+
+
+class DNSProvider(Provider):
+    """Resolver answering a DNS query with the IP
+
+    Services look like dns://resolver1.opendns.com/myip.opendns.com, add
+    ?type=TXT for resolvers that answer with a TXT record. A single UDP
+    round trip is much cheaper than an HTTPS request.
+    """
+
+    def __init__(self, service):
+        super().__init__(service)
+        url = urlparse(service)
+        self.resolver = url.hostname
+        self.port = url.port or 53
+        self.name = url.path.strip("/")
+        self.qtype = parse_qs(url.query).get("type", ["A"])[0].upper()
+        if self.qtype not in QTYPES:
+            raise ValueError(f"Unsupported DNS record type {self.qtype} in {service}")
+
+    def supports(self, target):
+        # UDP queries can't go through an HTTP or SOCKS proxy
+        return not target.proxy
+
+    def fetch(self, session, target, timeout):
+        phases = {phase: 0.0 for phase in PHASES}
+        start = time.perf_counter()
+        resolved = None
+        error = None
+        try:
+            address = dns_cache.resolve(self.resolver, self.port)
+            resolved = time.perf_counter()
+            records = query(
+                address,
+                self.name,
+                self.qtype,
+                port=self.port,
+                timeout=timeout,
+                source_address=target.source_address,
+            )
+        except (DNSError, OSError) as e:
+            # OSError when the resolver's own name can't be resolved
+            error = e
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        phases["dns_ms"] = ((resolved or start + elapsed_ms / 1000) - start) * 1000
+        phases["transfer_ms"] = elapsed_ms - phases["dns_ms"]
+        if error:
+            # Keep the timings of the failed or timed out query
+            raise ProviderError(str(error), elapsed_ms, phases) from error
+        if not records:
+            raise ProviderError(f"No {self.qtype} record for {self.name}", elapsed_ms, phases)
+        return records[0], elapsed_ms, phases
+
+
+PROVIDERS = {
+    "http": HTTPProvider,
+    "https": HTTPProvider,
+    "dns": DNSProvider,
+}
+
+
+@lru_cache(maxsize=None)
+def provider_for(service):
+    """Provider handling a service URL, based on its scheme"""
+    return PROVIDERS[urlparse(service).scheme](service)
+
+
+def service_timeout(stat):
+    """Request timeout in seconds derived from a service's latency statistics"""
+    if not stat or not stat["p99_response_time"]:
+        return REQUEST_TIMEOUT
+    timeout = stat["p99_response_time"] * TIMEOUT_MULTIPLIER / 1000
+    return min(max(timeout, MIN_REQUEST_TIMEOUT), REQUEST_TIMEOUT)
 
 
 class IPChecker:
-    def __init__(self):
+    """Checks the public IP of every target
+
+    Service rankings, circuit breakers and latency statistics describe the
+    IP services themselves, so they are shared by all targets.
+    """
+
+    def __init__(self, targets=None):
         self.db = Database()
         self.scheduler = BackgroundScheduler()
-        self.last_ip = None
+        self.targets = targets or load_targets()
+        self.engine = CheckEngine(self, self.targets)
+        # Checks of the text timestamp layout move to the compact one in the
+        # background once started, the newest batch right away as it holds
+        # the state restored below. Stopping also interrupts maintenance
+        self.maintenance_stop = threading.Event()
+        self.compaction = None
+        if self.db.has_legacy_checks():
+            self.db.compact_legacy_checks(batches=1)
+        # Restore the state of the previous run
+        self.last_ips = {
+            target.name: self.db.get_last_ip(target.name) for target in self.targets
+        }
+        self.recent = {
+            target.name: RecentChecks.from_rows(
+                self.db.get_recent_checks(limit=RECENT_CHECKS_SIZE, target=target.name)
+            )
+            for target in self.targets
+        }
+        self.schedules = {
+            target.name: self.create_schedule(target) for target in self.targets
+        }
+        self.ranker = ServiceRanker()
+        self.ranker.seed(self.db, IP_SERVICES)
+        self.breakers = CircuitBreakers(self.db)
+        # Live updates for the dashboard
+        self.broadcaster = Broadcaster()
+        self.service_stats = {}
+        self.service_stats_expires = 0
+        self.service_stats_lock = threading.Lock()
+        self.sessions = {
+            target.name: create_session(
+                source_address=target.source_address, proxy=target.proxy
+            )
+            for target in self.targets
+        }
+        # Losing hedged requests keep running in the background until they
+        # finish, leave room for them next to the requests of new checks
+        self.executor = ThreadPoolExecutor(
+            max_workers=MAX_CONCURRENT_CHECKS
+            * max(MAX_CONCURRENT_REQUESTS, CONSENSUS_PROVIDERS)
+            * 2,
+            thread_name_prefix="ip-check",
+        )
+
+    def create_schedule(self, target):
+        if SCHEDULE_MODE != "adaptive":
+            return FixedSchedule(target.interval)
+        change_times = [
+            datetime.fromisoformat(timestamp).replace(tzinfo=timezone.utc).timestamp()
+            for timestamp in self.db.get_change_times(target.name, limit=LEASE_HISTORY)
+        ]
+        # Never slower than the target's fixed interval unless a longer
+        # backoff between lease ends was configured
+        max_interval = (
+            MAX_CHECK_INTERVAL if MAX_CHECK_INTERVAL > CHECK_INTERVAL else target.interval
+        )
+        return AdaptiveSchedule(
+            change_times, max_interval=max_interval, default_interval=target.interval
+        )
+
+    def next_interval(self, target):
+        """Seconds until the next check of a target"""
+        return self.schedules[target.name].next_interval(time.time())
+
+    def check_ip_single(self, service, timeout=REQUEST_TIMEOUT, target=None):
+        """Check IP using a single service
 
-    def check_ip_single(self, service):
-        """Check IP using a single service"""
+        Returns the IP address, the response time, an error message and the
+        time spent in each phase of the request.
+        """
+        target = target or self.targets[0]
         try:
-            start_time = time.time()
-            response = requests.get(service, timeout=10)
-            response_time_ms = (time.time() - start_time) * 1000
-
-            if response.status_code == 200:
-                ip_address = response.text.strip()
-
-                # Basic IP validation
-                parts = ip_address.split(".")
-                if len(parts) == 4 and all(
-                    p.isdigit() and 0 <= int(p) <= 255 for p in parts
-                ):
-                    return ip_address, response_time_ms, None
-                else:
-                    return None, response_time_ms, f"Invalid IP format: {ip_address}"
+            answer, response_time_ms, phases = provider_for(service).fetch(
+                self.sessions[target.name], target, timeout
+            )
+            ip_address = answer.strip()
+
+            # Basic IP validation
+            parts = ip_address.split(".")
+            if len(parts) == 4 and all(p.isdigit() and 0 <= int(p) <= 255 for p in parts):
+                return ip_address, response_time_ms, None, phases
             else:
-                return None, response_time_ms, f"HTTP {response.status_code}"
+                return (
+                    None,
+                    response_time_ms,
+                    f"Invalid IP format: {ip_address}",
+                    phases,
+                )
 
+        except ProviderError as e:
+            return None, e.response_time_ms, str(e), e.phases
         except Exception as e:
-            return None, 0, str(e)
+            return None, 0, str(e), None
 
-    def check_ip(self):
-        """Check IP with retry logic up to 5 times"""
-        services = IP_SERVICES.copy()
-        random.shuffle(services)
+    def record_attempt(
+        self,
+        target,
+        service,
+        ip_address,
+        response_time_ms,
+        error_msg,
+        phases,
+        confirmed=True,
+    ):
+        """Record the outcome of a single service request
 
-        for attempt in range(min(5, len(services))):
-            service = services[attempt]
+        An answer that is not confirmed counts as a success of the service,
+        but is stored as a failed check so it can't register an IP change.
+        """
+        self.ranker.update(service, bool(ip_address), response_time_ms)
+        self.breakers.record(service, bool(ip_address))
+        success = bool(ip_address) and confirmed
+        timestamp = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+        recent = self.recent[target.name]
+        # Before the write starts a new generation, so a page rendered for
+        # it already sees this check in the summary
+        recent.append(
+            CheckRecord(timestamp, service, ip_address, response_time_ms, success)
+        )
+        self.db.record_check(
+            service=service,
+            ip_address=ip_address,
+            response_time_ms=response_time_ms,
+            success=success,
+            error_message=None if success else error_msg,
+            phases=phases,
+            target=target.name,
+        )
+        if self.broadcaster.active:
+            self.broadcaster.publish(
+                "check",
+                target.name,
+                {
+                    "timestamp": timestamp,
+                    "service": service,
+                    "ip_address": ip_address,
+                    "response_time_ms": response_time_ms,
+                    "success": success,
+                    "summary": recent.summary(),
+                    "rankings": self.ranker.rankings(IP_SERVICES),
+                },
+            )
 
-            ip_address, response_time_ms, error_msg = self.check_ip_single(service)
+    def update_ip(self, target, ip_address):
+        last_ip = self.last_ips.get(target.name)
+        schedule = self.schedules[target.name]
+        if ip_address != last_ip:
+            if last_ip is not None:
+                logger.info(f"IP of {target.name} changed from {last_ip} to {ip_address}")
+                schedule.changed(time.time())
+            else:
+                logger.info(f"Initial IP of {target.name} detected: {ip_address}")
+                schedule.stable(time.time())
+            self.last_ips[target.name] = ip_address
+            self.broadcaster.publish(
+                "change",
+                target.name,
+                {
+                    "timestamp": datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S"),
+                    "ip_address": ip_address,
+                    "previous_ip": last_ip,
+                },
+            )
+        else:
+            schedule.stable(time.time())
 
-            if ip_address:
-                # Success - record and check for changes
-                self.db.record_check(
-                    service=service,
-                    ip_address=ip_address,
-                    response_time_ms=response_time_ms,
-                    success=True,
-                )
+    def timeout_for(self, service):
+        return service_timeout(self.service_stats.get(service))
+
+    def refresh_service_stats(self):
+        """Reload the 24h service statistics once they are SERVICE_STATS_TTL old"""
+        with self.service_stats_lock:
+            if time.monotonic() < self.service_stats_expires:
+                return
+            self.service_stats = {
+                stat["service"]: stat for stat in self.db.get_service_stats(window="24h")
+            }
+            self.service_stats_expires = time.monotonic() + SERVICE_STATS_TTL
+
+    def maintain_database(self):
+        """Archive past months, prune raw checks and return free pages"""
+        try:
+            if DB_PARTITIONS == "monthly":
+                self.db.archive_checks(self.maintenance_stop)
+            if RAW_RETENTION_DAYS:
+                self.db.prune_checks(RAW_RETENTION_DAYS, self.maintenance_stop)
+            self.db.incremental_vacuum(self.maintenance_stop)
+        except Exception as e:
+            logger.error(f"Database maintenance failed: {e}")
+
+    def check_ip(self, target: Target = None):
+        target = target or self.targets[0]
+        self.refresh_service_stats()
+        # Ranked services, skipping the ones whose circuit is open
+        services = self.breakers.available(
+            [
+                service
+                for service in self.ranker.order(IP_SERVICES)
+                if provider_for(service).supports(target)
+            ]
+        )
+        if not services:
+            logger.error(f"No IP service can check {target.name}")
+            return
+
+        if CHECK_MODE == "hedged":
+            self.check_ip_hedged(target, services)
+        elif CHECK_MODE == "consensus":
+            self.check_ip_consensus(target, services)
+        else:
+            self.check_ip_sequential(target, services)
+
+    def next_service(self, pending):
+        """Pop the first service of pending its breaker lets a request through"""
+        while pending:
+            service = pending.pop(0)
+            if self.breakers.acquire(service):
+                return service
+            logger.debug(f"Skipping {service}, its trial request is still running")
+        return None
+
+    def check_ip_sequential(self, target, services):
+        """Check IP trying ranked services one after another"""
+        pending = list(services)
+        for attempt in range(min(MAX_ATTEMPTS, len(services))):
+            service = self.next_service(pending)
+            if service is None:
+                logger.error(f"No more IP services to try on this check of {target.name}")
+                return
 
-                if ip_address != self.last_ip:
-                    if self.last_ip is not None:
-                        logger.info(f"IP changed from {self.last_ip} to {ip_address}")
-                    else:
-                        logger.info(f"Initial IP detected: {ip_address}")
-                    self.last_ip = ip_address
+            ip_address, response_time_ms, error_msg, phases = self.check_ip_single(
+                service, self.timeout_for(service), target
+            )
+            self.record_attempt(
+                target, service, ip_address, response_time_ms, error_msg, phases
+            )
 
+            if ip_address:
+                # Success - check for changes
+                self.update_ip(target, ip_address)
                 return  # Success, exit retry loop
             else:
-                # Failed - record error
-                self.db.record_check(
-                    service=service,
-                    response_time_ms=response_time_ms,
-                    success=False,
-                    error_message=error_msg,
-                )
-
-                if attempt < min(4, len(services) - 1):
+                if attempt < min(MAX_ATTEMPTS - 1, len(services) - 1):
                     logger.debug(
                         f"Service {service} failed ({error_msg}), trying next service"
                     )
                 else:
-                    logger.error(f"All {attempt + 1} services failed on this check")
+                    logger.error(
+                        f"All {attempt + 1} services failed on this check of {target.name}"
+                    )
+
+    def hedge_delay(self, service):
+        """Seconds to wait for a service before starting a backup request"""
+        if HEDGE_DELAY_MS > 0:
+            return HEDGE_DELAY_MS / 1000
+        stat = self.service_stats.get(service)
+        if stat and stat["p95_response_time"]:
+            return stat["p95_response_time"] / 1000
+        return DEFAULT_HEDGE_DELAY_MS / 1000
+
+    def submit_attempt(self, target, service):
+        return self.executor.submit(
+            self.check_ip_single,
+            service,
+            self.timeout_for(service),
+            target,
+        )
+
+    def record_late_answer(self, target, service, winning_ip, done):
+        """Record a hedged request that finished after the winner
+
+        An answer with another IP than the winner's is stored unconfirmed,
+        only the winner registers IP changes.
+        """
+        if done.cancelled():
+            self.breakers.release(service)
+            return
+        ip_address, response_time_ms, error_msg, phases = done.result()
+        confirmed = True
+        if ip_address and ip_address != winning_ip:
+            logger.warning(
+                f"Service {service} answered {ip_address} for {target.name} "
+                f"after the check settled on {winning_ip}"
+            )
+            error_msg = f"Answered {ip_address} after the check settled on {winning_ip}"
+            confirmed = False
+        self.record_attempt(
+            target, service, ip_address, response_time_ms, error_msg, phases, confirmed
+        )
+
+    def check_ip_hedged(self, target, services):
+        """Check IP racing services against each other
+
+        The best ranked service is queried first. If it has not answered
+        within its hedge delay another service is started, up to
+        MAX_CONCURRENT_REQUESTS at once, and the first valid IP wins.
+        Failures start the next service right away. Every attempt is
+        recorded, the ones that finish after the winner against its IP.
+        """
+        pending = services[: min(MAX_ATTEMPTS, len(services))]
+        attempts = len(pending)
+        in_flight = {}
+        delay = None
+
+        def launch():
+            nonlocal delay
+            service = self.next_service(pending)
+            if service:
+                in_flight[self.submit_attempt(target, service)] = service
+                delay = self.hedge_delay(service)
+
+        while pending or in_flight:
+            if not in_flight:
+                launch()
+                if not in_flight:
+                    break
+
+            can_hedge = pending and len(in_flight) < MAX_CONCURRENT_REQUESTS
+            done, _ = wait(
+                in_flight, timeout=delay if can_hedge else None, return_when=FIRST_COMPLETED
+            )
+            if not done:
+                logger.debug(f"No answer from {', '.join(in_flight.values())}, hedging")
+                launch()
+                continue
+
+            winner = next((future for future in done if future.result()[0]), None)
+            if winner:
+                service = in_flight.pop(winner)
+                self.record_attempt(target, service, *winner.result())
+                ip_address = winner.result()[0]
+                self.update_ip(target, ip_address)
+                # Requests that already started are recorded once they finish
+                for loser, service in in_flight.items():
+                    loser.cancel()
+                    loser.add_done_callback(
+                        partial(self.record_late_answer, target, service, ip_address)
+                    )
+                return
+
+            for future in done:
+                service = in_flight.pop(future)
+                self.record_attempt(target, service, *future.result())
+                logger.debug(f"Service {service} failed ({future.result()[2]})")
+                if pending and in_flight:
+                    launch()
+
+        logger.error(f"All {attempts} services failed on this check of {target.name}")
+
+    def record_vote(self, target, service, accepted_ip, result):
+        """Record a consensus answer against the IP the quorum agreed on"""
+        ip_address, response_time_ms, error_msg, phases = result
+        confirmed = True
+        if ip_address and accepted_ip is None:
+            error_msg, confirmed = "No quorum", False
+        elif ip_address and ip_address != accepted_ip:
+            # A service reporting another IP than the quorum is wrong
+            error_msg = (
+                f"Disagreed with quorum: answered {ip_address}, "
+                f"quorum on {accepted_ip}"
+            )
+            ip_address = None
+        self.record_attempt(
+            target, service, ip_address, response_time_ms, error_msg, phases, confirmed
+        )
+
+    def record_disagreement(self, target, accepted_ip, answers):
+        self.schedules[target.name].disturbed()
+        logger.warning(
+            f"Services disagree on the IP of {target.name}: "
+            + ", ".join(f"{service} answered {ip}" for service, ip in answers.items())
+        )
+        self.db.record_event(
+            DISAGREEMENT_EVENT,
+            {"accepted_ip": accepted_ip, "quorum": CONSENSUS_QUORUM, "answers": answers},
+            target=target.name,
+        )
+
+    def check_ip_consensus(self, target, services):
+        """Check IP asking several services and requiring them to agree
+
+        CONSENSUS_PROVIDERS services are queried at once and an IP is
+        accepted as soon as CONSENSUS_QUORUM of them report it, so the check
+        takes about as long as the slowest member of the quorum. Failed
+        services are replaced by the next ranked one. Answers that differ
+        are recorded as a disagreement event and never become the current
+        IP. Requests still running when the quorum is reached are recorded
+        once they finish.
+        """
+        pending = services[: max(MAX_ATTEMPTS, CONSENSUS_PROVIDERS)]
+        in_flight = {}
+        answers = {}
+        results = []
+        votes = Counter()
+        accepted_ip = None
+
+        def launch():
+            service = self.next_service(pending)
+            if service:
+                future = self.executor.submit(
+                    self.check_ip_single, service, self.timeout_for(service), target
+                )
+                in_flight[future] = service
+
+        while pending and len(in_flight) < CONSENSUS_PROVIDERS:
+            launch()
+
+        while in_flight and accepted_ip is None:
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                service = in_flight.pop(future)
+                result = future.result()
+                results.append((service, result))
+                ip_address = result[0]
+                if ip_address:
+                    answers[service] = ip_address
+                    votes[ip_address] += 1
+                else:
+                    logger.debug(f"Service {service} failed ({result[2]})")
+                    if pending:
+                        launch()
+
+            if votes and votes.most_common(1)[0][1] >= CONSENSUS_QUORUM:
+                accepted_ip = votes.most_common(1)[0][0]
+            elif not in_flight and pending:
+                # Every answer is in without a quorum, ask one more service
+                launch()
+
+        for service, result in results:
+            self.record_vote(target, service, accepted_ip, result)
+
+        def record_late(done, service):
+            if done.cancelled():
+                self.breakers.release(service)
+                return
+            result = done.result()
+            self.record_vote(target, service, accepted_ip, result)
+            if result[0] and result[0] != accepted_ip:
+                self.record_disagreement(target, accepted_ip, {service: result[0]})
+
+        for future, service in in_flight.items():
+            future.cancel()
+            future.add_done_callback(partial(record_late, service=service))
+
+        if len(set(answers.values())) > 1:
+            self.record_disagreement(target, accepted_ip, answers)
+
+        if accepted_ip:
+            self.update_ip(target, accepted_ip)
+        else:
+            logger.error(
+                f"No {CONSENSUS_QUORUM} services agreed on the IP of {target.name} "
+                f"({len(results)} answered)"
+            )
 
     def start(self):
-        logger.info(f"Starting IP checker with {CHECK_INTERVAL}s interval")
+        logger.info(f"Starting IP checker for {len(self.targets)} targets")
+
+        # Every target is checked right away, then on its own interval
+        self.engine.start()
 
-        # Run first check immediately
-        self.check_ip()
+        # Make sure buffered checks reach the database during quiet periods
+        if WRITE_BUFFER_SIZE > 1:
+            self.scheduler.add_job(
+                self.db.flush,
+                "interval",
+                seconds=WRITE_BUFFER_SECONDS,
+                id="db_flush",
+                replace_existing=True,
+            )
 
-        # Schedule periodic checks
+        # Small batches on a schedule, checks keep being recorded in between
         self.scheduler.add_job(
-            self.check_ip,
+            self.maintain_database,
             "interval",
-            seconds=CHECK_INTERVAL,
-            id="ip_check",
+            seconds=MAINTENANCE_INTERVAL,
+            id="db_maintenance",
             replace_existing=True,
+            next_run_time=datetime.now(),
         )
+
         self.scheduler.start()
 
+        if self.db.has_legacy_checks():
+            self.compaction = threading.Thread(
+                target=self.db.compact_legacy_checks,
+                args=(self.maintenance_stop,),
+                name="compact-checks",
+                daemon=True,
+            )
+            self.compaction.start()
+
     def stop(self):
         logger.info("Stopping IP checker")
+        self.engine.stop()
+        self.maintenance_stop.set()
+        if self.compaction is not None:
+            self.compaction.join()
+        self.broadcaster.close()
         self.scheduler.shutdown(wait=True)
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        for session in self.sessions.values():
+            session.close()
+        # Closing flushes any buffered checks
+        self.db.close()
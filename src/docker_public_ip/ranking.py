@@ -0,0 +1,102 @@
+import random
+import threading
+from typing import Any, Dict, List
+
+from loguru import logger
+
+from .config import EXPLORE_RATE, RANKING_ALPHA
+
+# Floor for the success rate so a failing service gets a large, finite score
+MIN_SUCCESS_RATE = 0.05
+
+
+class ServiceScore:
+    __slots__ = ("latency_ms", "success_rate", "samples")
+
+    def __init__(self):
+        self.latency_ms = None
+        self.success_rate = 1.0
+        self.samples = 0
+
+    def update(self, success: bool, response_time_ms: float, alpha: float):
+        self.success_rate += alpha * ((1.0 if success else 0.0) - self.success_rate)
+        if success and response_time_ms:
+            if self.latency_ms is None:
+                self.latency_ms = response_time_ms
+            else:
+                self.latency_ms += alpha * (response_time_ms - self.latency_ms)
+        self.samples += 1
+
+    @property
+    def expected_ms(self):
+        """Expected time to get a valid answer, retries included"""
+        if self.latency_ms is None:
+            return None
+        return self.latency_ms / max(self.success_rate, MIN_SUCCESS_RATE)
+
+
+class ServiceRanker:
+    """Orders IP services by an EWMA of their latency and success rate
+
+    Services are usually tried best first, but with probability EXPLORE_RATE
+    another service is moved to the front so every score keeps being
+    refreshed. Services without history are tried before the ranked ones.
+    """
+
+    def __init__(self, alpha: float = RANKING_ALPHA, explore_rate: float = EXPLORE_RATE):
+        self.alpha = alpha
+        self.explore_rate = explore_rate
+        self.scores: Dict[str, ServiceScore] = {}
+        self.lock = threading.Lock()
+
+    def seed(self, db, services: List[str], samples: int = 50):
+        """Replay the latest recorded checks of each service"""
+        for service in services:
+            for check in reversed(db.get_service_checks(service, limit=samples)):
+                self.update(service, check["success"], check["response_time_ms"])
+        logger.info(f"Seeded service ranking for {len(services)} services")
+
+    def update(self, service: str, success: bool, response_time_ms: float):
+        with self.lock:
+            score = self.scores.setdefault(service, ServiceScore())
+            score.update(bool(success), response_time_ms, self.alpha)
+
+    def _sort_key(self, service: str):
+        score = self.scores.get(service)
+        if score is None or score.samples == 0:
+            return (0, 0)
+        expected = score.expected_ms
+        # Services that never answered go last
+        return (1, expected if expected is not None else float("inf"))
+
+    def order(self, services: List[str]) -> List[str]:
+        """Services in the order they should be tried"""
+        services = list(services)
+        random.shuffle(services)
+        with self.lock:
+            services.sort(key=self._sort_key)
+
+        if len(services) > 1 and random.random() < self.explore_rate:
+            explored = services.pop(random.randrange(1, len(services)))
+            services.insert(0, explored)
+        return services
+
+    def rankings(self, services: List[str] = None) -> List[Dict[str, Any]]:
+        """Current scores, best first"""
+        with self.lock:
+            names = list(services) if services is not None else list(self.scores)
+            names.sort(key=self._sort_key)
+            result = []
+            for rank, service in enumerate(names, start=1):
+                score = self.scores.get(service) or ServiceScore()
+                result.append(
+                    {
+                        "rank": rank,
+                        "service": service,
+                        "expected_ms": score.expected_ms,
+                        "latency_ms": score.latency_ms,
+                        "success_rate": score.success_rate,
+                        "samples": score.samples,
+                    }
+                )
+            return result
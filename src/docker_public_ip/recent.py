@@ -0,0 +1,89 @@
+import threading
+from typing import Any, Dict, Iterable, List
+
+from .config import RECENT_CHECKS_SIZE
+
+
+class CheckRecord:
+    """A check as kept in memory"""
+
+    __slots__ = ("timestamp", "service", "ip_address", "response_time_ms", "success")
+
+    def __init__(
+        self,
+        timestamp: str,
+        service: str,
+        ip_address: str = None,
+        response_time_ms: float = None,
+        success: bool = True,
+    ):
+        self.timestamp = timestamp
+        self.service = service
+        self.ip_address = ip_address
+        self.response_time_ms = response_time_ms
+        self.success = bool(success)
+
+
+class RecentChecks:
+    """Ring buffer of the latest checks of one target
+
+    Keeps running counters so the dashboard summary doesn't scan the buffer,
+    and remembers the latest successful check even once it has been
+    overwritten by failures.
+    """
+
+    def __init__(self, size: int = RECENT_CHECKS_SIZE):
+        self.lock = threading.Lock()
+        self.records: List[CheckRecord] = [None] * size
+        self.next = 0
+        self.count = 0
+        self.successes = 0
+        self.last_success = None
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Dict[str, Any]], size: int = RECENT_CHECKS_SIZE):
+        """Buffer filled from ip_checks rows, given newest first"""
+        recent = cls(size)
+        for row in reversed(list(rows)):
+            recent.append(
+                CheckRecord(
+                    row["timestamp"],
+                    row["service"],
+                    row["ip_address"],
+                    row["response_time_ms"],
+                    row["success"],
+                )
+            )
+        return recent
+
+    def append(self, record: CheckRecord):
+        with self.lock:
+            replaced = self.records[self.next]
+            if replaced is not None and replaced.success:
+                self.successes -= 1
+            self.records[self.next] = record
+            self.next = (self.next + 1) % len(self.records)
+            self.count = min(self.count + 1, len(self.records))
+            if record.success:
+                self.successes += 1
+                if record.ip_address:
+                    self.last_success = record
+
+    def latest(self) -> List[CheckRecord]:
+        """Buffered checks, newest first"""
+        with self.lock:
+            size = len(self.records)
+            return [self.records[(self.next - 1 - i) % size] for i in range(self.count)]
+
+    def summary(self) -> Dict[str, Any]:
+        """Current IP, time of the last successful check and window statistics"""
+        with self.lock:
+            last_success = self.last_success
+            return {
+                "current_ip": last_success.ip_address if last_success else None,
+                "last_check": last_success.timestamp if last_success else "Never",
+                "total_checks": self.count,
+                "success_rate": (
+                    round(self.successes / self.count * 100, 1) if self.count > 0 else 0
+                ),
+            }
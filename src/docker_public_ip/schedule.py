@@ -0,0 +1,137 @@
+import math
+import statistics
+from typing import List
+
+from .config import CHECK_INTERVAL, MAX_CHECK_INTERVAL, MIN_CHECK_INTERVAL
+
+# Growth of the interval after each check that saw the same IP
+BACKOFF_FACTOR = 2
+# Outside the expected change windows, a change should go unnoticed for at
+# most this share of a lease
+LEASE_FRACTION = 0.02
+# Leases are regular when their median deviation is below this share of the
+# median lease, and at least REGULAR_LEASE_SHARE of them end in the window
+REGULAR_LEASE_SPREAD = 0.05
+REGULAR_LEASE_SHARE = 0.8
+# Number of past changes the bounds are derived from
+LEASE_HISTORY = 50
+
+
+class FixedSchedule:
+    """Checks a target every interval seconds"""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+
+    def changed(self, now: float):
+        pass
+
+    def stable(self, now: float):
+        pass
+
+    def disturbed(self):
+        pass
+
+    def next_interval(self, now: float) -> float:
+        return self.interval
+
+
+class AdaptiveSchedule:
+    """Check interval of one target that adapts to its IP change history
+
+    The interval drops to the minimum right after a change or a disagreement
+    between services, then grows by BACKOFF_FACTOR after every check that
+    saw the same IP, up to default_interval. When past leases had a regular
+    length, checks run at the minimum interval around the times the current
+    lease is expected to end, which repeat every lease length as a renewal
+    may keep the same IP, and back off up to max_interval in between. A
+    max_interval above default_interval saves checks but delays changes
+    outside the windows, so it defaults to MAX_CHECK_INTERVAL, which is
+    CHECK_INTERVAL unless configured. Irregular changes can't be anticipated,
+    so backing off further would only delay their detection.
+
+    Times are epoch seconds.
+    """
+
+    def __init__(
+        self,
+        change_times: List[float] = (),
+        min_interval: float = MIN_CHECK_INTERVAL,
+        max_interval: float = MAX_CHECK_INTERVAL,
+        default_interval: float = CHECK_INTERVAL,
+    ):
+        self.min_interval = min_interval
+        self.max_interval_limit = max_interval
+        self.default_interval = default_interval
+        self.change_times = list(change_times)
+        self.interval = min_interval
+        self.last_check = None
+        # How far the last change time may be off, it happened between checks
+        self.uncertainty = 0
+        self.update_bounds()
+
+    @property
+    def last_change(self):
+        return self.change_times[-1] if self.change_times else None
+
+    def update_bounds(self):
+        """Derive the maximum interval and expected lease from past leases"""
+        leases = [
+            end - start for start, end in zip(self.change_times, self.change_times[1:])
+        ]
+        self.max_interval = max(
+            self.min_interval, min(self.default_interval, self.max_interval_limit)
+        )
+        self.lease = None
+        self.window = 0
+        if len(leases) < 3:
+            return
+
+        # Median and median deviation ignore the odd quick reconnect
+        median = statistics.median(leases)
+        spread = statistics.median(abs(lease - median) for lease in leases)
+        window = max(3 * spread, 2 * self.min_interval)
+        regular = sum(1 for lease in leases if abs(lease - median) <= window)
+        if (
+            spread <= median * REGULAR_LEASE_SPREAD
+            and regular >= len(leases) * REGULAR_LEASE_SHARE
+        ):
+            self.lease = median
+            self.window = window
+            self.max_interval = min(
+                self.max_interval_limit,
+                max(self.max_interval, median * LEASE_FRACTION),
+            )
+
+    def changed(self, now: float):
+        # The change happened some time since the previous check
+        since = self.last_check if self.last_check is not None else now
+        self.uncertainty = (now - since) / 2
+        self.change_times = (self.change_times + [now - self.uncertainty])[
+            -LEASE_HISTORY:
+        ]
+        self.update_bounds()
+        self.interval = self.min_interval
+        self.last_check = now
+
+    def stable(self, now: float):
+        self.interval = min(self.interval * BACKOFF_FACTOR, self.max_interval)
+        self.last_check = now
+
+    def disturbed(self):
+        self.interval = self.min_interval
+
+    def next_interval(self, now: float) -> float:
+        if self.lease is None:
+            return self.interval
+
+        # Next expected end of a lease that is not over yet
+        window = self.window + self.uncertainty
+        elapsed = now - self.last_change
+        periods = max(1, math.ceil((elapsed - window) / self.lease))
+        expected = self.last_change + periods * self.lease
+        start = expected - window
+        if now >= start:
+            return self.min_interval
+        # Don't sleep past the start of the expected change window
+        return max(min(self.interval, start - now), self.min_interval)
@@ -0,0 +1,88 @@
+import json
+import math
+from typing import Dict
+
+
+class LatencySketch:
+    """Mergeable quantile sketch for response times (DDSketch style)
+
+    Values are counted in logarithmic bins so any quantile is returned with
+    a bounded relative error, and two sketches merge by adding their bins.
+    """
+
+    def __init__(self, relative_accuracy: float = 0.01, max_bins: int = 512):
+        self.relative_accuracy = relative_accuracy
+        self.max_bins = max_bins
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.bins: Dict[int, int] = {}
+        self.zero_count = 0
+        self.count = 0
+
+    def _index(self, value: float) -> int:
+        return math.ceil(math.log(value) / self._log_gamma)
+
+    def _value(self, index: int) -> float:
+        return 2 * self.gamma**index / (self.gamma + 1)
+
+    def add(self, value: float, count: int = 1):
+        if value <= 0:
+            self.zero_count += count
+        else:
+            index = self._index(value)
+            self.bins[index] = self.bins.get(index, 0) + count
+            if len(self.bins) > self.max_bins:
+                self._collapse()
+        self.count += count
+
+    def merge(self, other: "LatencySketch"):
+        if other.gamma != self.gamma:
+            raise ValueError("Cannot merge sketches with different accuracy")
+        for index, count in other.bins.items():
+            self.bins[index] = self.bins.get(index, 0) + count
+        self.zero_count += other.zero_count
+        self.count += other.count
+        if len(self.bins) > self.max_bins:
+            self._collapse()
+
+    def _collapse(self):
+        # Fold the lowest bins together, keeping accuracy where it matters
+        indexes = sorted(self.bins)
+        excess = indexes[: len(indexes) - self.max_bins + 1]
+        target = excess[-1]
+        self.bins[target] = sum(self.bins.pop(index) for index in excess)
+
+    def quantile(self, q: float):
+        if self.count == 0:
+            return None
+
+        rank = q * (self.count - 1)
+        seen = self.zero_count
+        if rank < seen:
+            return 0.0
+        for index in sorted(self.bins):
+            seen += self.bins[index]
+            if rank < seen:
+                return self._value(index)
+        return self._value(max(self.bins))
+
+    def to_json(self) -> str:
+        return json.dumps(
+            {
+                "accuracy": self.relative_accuracy,
+                "zero": self.zero_count,
+                "bins": self.bins,
+            },
+            separators=(",", ":"),
+        )
+
+    @classmethod
+    def from_json(cls, data: str) -> "LatencySketch":
+        if not data:
+            return cls()
+        state = json.loads(data)
+        sketch = cls(relative_accuracy=state["accuracy"])
+        sketch.bins = {int(index): count for index, count in state["bins"].items()}
+        sketch.zero_count = state["zero"]
+        sketch.count = sketch.zero_count + sum(sketch.bins.values())
+        return sketch
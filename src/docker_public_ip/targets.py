@@ -0,0 +1,69 @@
+from typing import List
+
+from loguru import logger
+
+from .config import CHECK_INTERVAL, DEFAULT_TARGET, TARGETS_FILE
+
+
+class Target:
+    """An egress path whose public IP is monitored
+
+    A target can send its requests through an HTTP or SOCKS proxy, or from
+    a specific local source address (interface or VPN tunnel).
+    """
+
+    def __init__(
+        self,
+        name: str,
+        interval: float = CHECK_INTERVAL,
+        proxy: str = None,
+        source_address: str = None,
+    ):
+        self.name = name
+        self.interval = interval
+        self.proxy = proxy
+        self.source_address = source_address
+
+    def __repr__(self):
+        return f"Target({self.name!r}, interval={self.interval})"
+
+
+def parse_target(line: str) -> Target:
+    """Parse a line like ``office interval=60 proxy=socks5://10.0.0.1:1080``"""
+    name, *options = line.split()
+    settings = {}
+    for option in options:
+        key, _, value = option.partition("=")
+        if key == "interval":
+            settings["interval"] = float(value)
+        elif key == "proxy":
+            settings["proxy"] = value
+        elif key == "source":
+            settings["source_address"] = value
+        else:
+            raise ValueError(f"Unknown target option {key!r}")
+    return Target(name, **settings)
+
+
+def load_targets() -> List[Target]:
+    """Load monitored targets from configuration file"""
+    if TARGETS_FILE.exists():
+        try:
+            targets = []
+            with open(TARGETS_FILE, "r") as f:
+                for line in f:
+                    line = line.strip()
+                    # Skip empty lines and comments
+                    if line and not line.startswith("#"):
+                        targets.append(parse_target(line))
+
+            if targets:
+                logger.info(f"Loaded {len(targets)} targets from {TARGETS_FILE}")
+                return targets
+            else:
+                logger.warning(f"No valid targets found in {TARGETS_FILE}, using default")
+
+        except Exception as e:
+            logger.error(f"Error reading targets file {TARGETS_FILE}: {e}")
+
+    return [Target(DEFAULT_TARGET)]
@@ -1,39 +1,145 @@
-from datetime import datetime
+import base64
+import hashlib
+import json
+import queue
+from datetime import datetime, timezone
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, Tuple, Union
 
-from flask import Flask, render_template
+import plotly
+import waitress
+from flask import Flask, Response, render_template, request, stream_with_context
 from loguru import logger
 
-from .config import WEB_HOST, WEB_PORT
-from .database import Database
+from .cache import GenerationCache
+from .config import (
+    DASHBOARD_CACHE_SIZE,
+    DASHBOARD_CACHE_TTL,
+    DEFAULT_TARGET,
+    IP_SERVICES,
+    RECENT_CHECKS_SIZE,
+    WEB_HOST,
+    WEB_PORT,
+    WEB_SERVER,
+    WEB_THREADS,
+)
+from .circuit_breaker import CLOSED
+from .compression import ENCODINGS, accepted_encoding, compress, compress_response
+from .database import DISAGREEMENT_EVENT, SERVICE_STATS_WINDOWS, Database
+from .export import EXPORT_FORMATS, ExportError, export_checks
+from .ip_checker import service_timeout
+from .ranking import ServiceRanker
+from .recent import RecentChecks
 
+# Plotly bundle shipped with the plotly package, served with the dashboard
+PLOTLY_JS = Path(plotly.__file__).parent / "package_data" / "plotly.min.js"
+# Browsers keep static files for a year, their URLs change with their content
+STATIC_MAX_AGE = 365 * 86400
+# Seconds between comments keeping idle event streams open
+EVENT_KEEPALIVE_SECONDS = 15
+# Rows per page of the JSON API, by default and at most
+API_PAGE_SIZE = 100
+API_MAX_PAGE_SIZE = 1000
+# Range of SQLite integers, cursors outside of it can't point at a row
+SQLITE_MAX_INTEGER = 2**63 - 1
 
-def create_app():
+
+def parse_datetime(value: str) -> datetime:
+    """ISO 8601 time in UTC, naive times are taken as UTC"""
+    moment = datetime.fromisoformat(value)
+    if moment.tzinfo is None:
+        return moment.replace(tzinfo=timezone.utc)
+    return moment.astimezone(timezone.utc)
+
+
+def parse_time(value: str) -> str:
+    """ISO 8601 time as stored in the database"""
+    return parse_datetime(value).strftime("%Y-%m-%d %H:%M:%S")
+
+
+@lru_cache(maxsize=len(ENCODINGS) + 1)
+def plotly_bundle(encoding: str = None) -> bytes:
+    """Plotly bundle, compressed once per content coding"""
+    data = PLOTLY_JS.read_bytes()
+    return compress(data, encoding, static=True) if encoding else data
+
+
+def encode_cursor(row: Dict[str, Any], key: str = "timestamp") -> str:
+    """Opaque cursor pointing after a row, ordered by key and id"""
+    position = json.dumps([row[key], row["id"]])
+    return base64.urlsafe_b64encode(position.encode()).decode()
+
+
+def _sqlite_integer(value) -> bool:
+    return (
+        isinstance(value, int)
+        and not isinstance(value, bool)
+        and -SQLITE_MAX_INTEGER - 1 <= value <= SQLITE_MAX_INTEGER
+    )
+
+
+def decode_cursor(cursor: str, key_type: type = str) -> Tuple[Union[str, int], int]:
+    """Position and id of a cursor made by encode_cursor with a key_type key"""
+    try:
+        position, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if not (
+            _sqlite_integer(position) if key_type is int else isinstance(position, str)
+        ):
+            raise TypeError(position)
+        if not _sqlite_integer(row_id):
+            raise TypeError(row_id)
+        return position, row_id
+    except (ValueError, TypeError) as error:
+        raise ValueError(f"Invalid cursor: {cursor}") from error
+
+
+def create_app(checker=None):
     app = Flask(__name__)
-    db = Database()
+    app.after_request(compress_response)
+    # Share the checker's database so buffered checks show up immediately
+    db = checker.db if checker else Database()
+    if checker:
+        ranker = checker.ranker
+    else:
+        ranker = ServiceRanker()
+        ranker.seed(db, IP_SERVICES)
+    # Rendered pages, refreshed when the database records new data
+    pages = GenerationCache(DASHBOARD_CACHE_SIZE, DASHBOARD_CACHE_TTL)
 
-    @app.route("/")
-    def index():
-        recent_checks = db.get_recent_checks(limit=100)
-        ip_changes = db.get_ip_changes()
-        service_stats = db.get_service_stats()
-        change_stats = db.get_ip_change_stats()
-        stability_stats = db.get_ip_stability_stats()
-
-        # Get current IP
-        current_ip = None
-        last_check = "Never"
-        for check in recent_checks:
-            if check["success"] and check["ip_address"]:
-                current_ip = check["ip_address"]
-                last_check = check["timestamp"]
-                break
-
-        # Calculate basic statistics
-        total_checks = len(recent_checks)
-        successful_checks = sum(1 for c in recent_checks if c["success"])
-        success_rate = (
-            round(successful_checks / total_checks * 100, 1) if total_checks > 0 else 0
-        )
+    def known_targets():
+        targets = set(db.get_targets())
+        if checker:
+            targets.update(target.name for target in checker.targets)
+        return sorted(targets)
+
+    def recent_checks(target):
+        """Latest checks of a target, from the checker's memory when possible"""
+        if checker and target in checker.recent:
+            return checker.recent[target]
+        rows = db.get_recent_checks(limit=RECENT_CHECKS_SIZE, target=target)
+        return RecentChecks.from_rows(rows)
+
+    def render_index(target, service_window):
+        targets = known_targets()
+        ip_changes = db.get_ip_changes(limit=20, target=target)
+        disagreements = db.get_events(DISAGREEMENT_EVENT, limit=20, target=target)
+        service_stats = db.get_service_stats(window=service_window)
+        if checker:
+            breakers = checker.breakers.states()
+        else:
+            breakers = {breaker["service"]: breaker for breaker in db.get_breakers()}
+        for stat in service_stats:
+            breaker = breakers.get(stat["service"])
+            stat["circuit"] = breaker["state"] if breaker else CLOSED
+            stat["timeout"] = (
+                checker.timeout_for(stat["service"]) if checker else service_timeout(stat)
+            )
+        change_stats = db.get_ip_change_stats(target=target)
+        stability_stats = db.get_ip_stability_stats(target=target)
+
+        # Current IP and statistics of the latest checks
+        summary = recent_checks(target).summary()
 
         # Prepare chart data for daily IP changes
         daily_changes_data = [
@@ -70,18 +176,199 @@ def create_app():
 
         return render_template(
             "index.html",
-            current_ip=current_ip,
-            last_check=last_check,
-            total_checks=total_checks,
-            success_rate=success_rate,
-            ip_change_count=len(ip_changes),
-            ip_changes=ip_changes[:20],  # Show last 20 changes
+            target=target,
+            targets=targets,
+            current_ip=summary["current_ip"],
+            last_check=summary["last_check"],
+            total_checks=summary["total_checks"],
+            success_rate=summary["success_rate"],
+            ip_change_count=db.get_ip_change_count(target=target),
+            ip_changes=ip_changes,
+            disagreements=disagreements,
             service_stats=service_stats,
+            service_window=service_window,
+            service_windows=list(SERVICE_STATS_WINDOWS),
             daily_changes_data=daily_changes_data,
             weekly_changes_data=weekly_changes_data,
             monthly_changes_data=monthly_changes_data,
             stability_stats=stability_stats,
+            service_rankings=ranker.rankings(IP_SERVICES),
+            plotly_version=plotly.__version__,
+        )
+
+    @app.route("/")
+    def index():
+        default_target = checker.targets[0].name if checker else DEFAULT_TARGET
+        target = request.args.get("target", default_target)
+        service_window = request.args.get("window")
+        if service_window not in SERVICE_STATS_WINDOWS:
+            service_window = None
+
+        # Read the generation first, a write during rendering makes the page stale
+        generation = db.generation
+        key = (target, service_window)
+        page = pages.get(key, generation)
+        if page is None:
+            body = render_index(target, service_window).encode()
+            # Compressed bodies are added by content coding as they are requested
+            page = ({None: body}, hashlib.md5(body).hexdigest(), db.modified)
+            pages.put(key, generation, page)
+
+        bodies, etag, modified = page
+        encoding = accepted_encoding()
+        if encoding not in bodies:
+            bodies[encoding] = compress(bodies[None], encoding)
+        response = app.make_response(bodies[encoding])
+        response.vary.add("Accept-Encoding")
+        if encoding:
+            response.headers["Content-Encoding"] = encoding
+        # Weak, the tag stands for the page in every content coding
+        response.set_etag(etag, weak=True)
+        response.last_modified = modified
+        response.cache_control.no_cache = True
+        return response.make_conditional(request)
+
+    def page_query(key_type=str):
+        """Time range, cursor and size of the requested page"""
+        args = request.args
+        limit = int(args.get("limit", API_PAGE_SIZE))
+        if not 1 <= limit <= API_MAX_PAGE_SIZE:
+            raise ValueError(f"limit must be between 1 and {API_MAX_PAGE_SIZE}")
+        return {
+            "since": parse_time(args["since"]) if "since" in args else None,
+            "until": parse_time(args["until"]) if "until" in args else None,
+            "before": (
+                decode_cursor(args["cursor"], key_type) if "cursor" in args else None
+            ),
+            "limit": limit,
+        }
+
+    def page_response(rows, limit, key="timestamp"):
+        # One extra row tells whether another page follows
+        return {
+            "items": rows[:limit],
+            "next_cursor": (
+                encode_cursor(rows[limit - 1], key) if len(rows) > limit else None
+            ),
+        }
+
+    @app.route("/events")
+    def events():
+        """Server-sent events with the new checks and IP changes of a target"""
+        # Without a checker in this process there is nothing to push, and
+        # every stream holds a worker thread. 204 tells the browser not to
+        # reconnect, the page falls back to reloading.
+        subscriber = checker.broadcaster.subscribe() if checker else None
+        if subscriber is None:
+            return "", 204
+        target = request.args.get("target", checker.targets[0].name)
+
+        def stream():
+            yield "retry: 5000\n\n"
+            while True:
+                try:
+                    item = subscriber.get(timeout=EVENT_KEEPALIVE_SECONDS)
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+                    continue
+                if item is None:
+                    return
+                event_target, message = item
+                if event_target == target:
+                    yield message
+
+        response = Response(
+            stream(),
+            content_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+        response.call_on_close(lambda: checker.broadcaster.unsubscribe(subscriber))
+        return response
+
+    @app.route("/api/checks")
+    def api_checks():
+        try:
+            query = page_query(key_type=int)
+        except ValueError as error:
+            return {"error": str(error)}, 400
+        limit = query.pop("limit")
+        rows = db.get_checks_page(
+            target=request.args.get("target"),
+            service=request.args.get("service"),
+            limit=limit + 1,
+            **query,
         )
+        for row in rows:
+            row["success"] = bool(row["success"])
+        return page_response(rows, limit, key="timestamp_ms")
+
+    @app.route("/api/checks/export")
+    def api_export_checks():
+        args = request.args
+        export_format = args.get("format", "csv")
+        try:
+            chunks = export_checks(
+                db,
+                export_format,
+                target=args.get("target"),
+                service=args.get("service"),
+                since=parse_time(args["since"]) if "since" in args else None,
+                until=parse_time(args["until"]) if "until" in args else None,
+            )
+        except (ExportError, ValueError) as error:
+            return {"error": str(error)}, 400
+        content_type, extension = EXPORT_FORMATS[export_format]
+        return Response(
+            stream_with_context(chunks),
+            content_type=content_type,
+            headers={
+                "Content-Disposition": f"attachment; filename=ip_checks{extension}"
+            },
+        )
+
+    @app.route("/api/changes")
+    def api_changes():
+        try:
+            query = page_query()
+        except ValueError as error:
+            return {"error": str(error)}, 400
+        limit = query.pop("limit")
+        rows = db.get_ip_changes_page(
+            target=request.args.get("target"), limit=limit + 1, **query
+        )
+        return page_response(rows, limit)
+
+    @app.route("/api/services/stats")
+    def api_service_stats():
+        args = request.args
+        window = args.get("window")
+        if window is not None and window not in SERVICE_STATS_WINDOWS:
+            return {"error": f"window must be one of {list(SERVICE_STATS_WINDOWS)}"}, 400
+        try:
+            since = parse_datetime(args["since"]) if "since" in args else None
+            until = parse_datetime(args["until"]) if "until" in args else None
+        except ValueError as error:
+            return {"error": str(error)}, 400
+        stats = db.get_service_stats(
+            window=window, since=since, until=until, service=args.get("service")
+        )
+        return {"services": stats}
+
+    @app.route("/api/services/ranking")
+    def service_ranking():
+        return {"rankings": ranker.rankings(IP_SERVICES)}
+
+    @app.route("/assets/plotly-<version>.min.js")
+    def plotly_js(version):
+        encoding = accepted_encoding()
+        response = app.response_class(plotly_bundle(encoding), mimetype="text/javascript")
+        if encoding:
+            response.headers["Content-Encoding"] = encoding
+        response.vary.add("Accept-Encoding")
+        response.cache_control.public = True
+        response.cache_control.max_age = STATIC_MAX_AGE
+        response.cache_control.immutable = True
+        return response
 
     @app.route("/health")
     def health():
@@ -90,7 +377,16 @@ def create_app():
     return app
 
 
+def serve(app):
+    if WEB_SERVER == "flask":
+        logger.info(f"Starting development web server on {WEB_HOST}:{WEB_PORT}")
+        app.run(host=WEB_HOST, port=WEB_PORT, debug=False)
+        return
+    logger.info(
+        f"Starting web server on {WEB_HOST}:{WEB_PORT} with {WEB_THREADS} threads"
+    )
+    waitress.serve(app, host=WEB_HOST, port=WEB_PORT, threads=WEB_THREADS)
+
+
 def run_web_server(checker):
-    app = create_app()
-    logger.info(f"Starting web server on {WEB_HOST}:{WEB_PORT}")
-    app.run(host=WEB_HOST, port=WEB_PORT, debug=False)
+    serve(create_app(checker))
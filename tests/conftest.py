@@ -0,0 +1,30 @@
+import pytest
+
+from docker_public_ip import database
+from docker_public_ip.database import Database
+from docker_public_ip.ip_checker import IPChecker
+from docker_public_ip.targets import Target
+
+
+@pytest.fixture
+def db_path(tmp_path, monkeypatch):
+    """Database file used by Database() and the web interface"""
+    path = tmp_path / "ip_history.db"
+    monkeypatch.setattr(database, "DB_PATH", path)
+    return path
+
+
+@pytest.fixture
+def db(db_path):
+    db = Database()
+    yield db
+    db.close()
+
+
+@pytest.fixture
+def checker(db_path):
+    """Checker of a single default target that isn't started"""
+    checker = IPChecker([Target("default")])
+    yield checker
+    checker.executor.shutdown(wait=True)
+    checker.db.close()
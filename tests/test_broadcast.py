@@ -0,0 +1,68 @@
+import json
+
+from docker_public_ip.broadcast import Broadcaster
+from docker_public_ip.web import create_app
+
+
+def test_events_are_formatted_for_every_subscriber():
+    broadcaster = Broadcaster(queue_size=4, max_subscribers=2)
+    first, second = broadcaster.subscribe(), broadcaster.subscribe()
+    broadcaster.publish("change", "home", {"ip_address": "203.0.113.1"})
+    message = 'event: change\ndata: {"ip_address": "203.0.113.1"}\n\n'
+    assert first.get_nowait() == ("home", message)
+    assert second.get_nowait() == ("home", message)
+
+
+def test_subscribers_are_limited():
+    broadcaster = Broadcaster(queue_size=4, max_subscribers=1)
+    subscriber = broadcaster.subscribe()
+    assert broadcaster.subscribe() is None
+    broadcaster.unsubscribe(subscriber)
+    assert not broadcaster.active
+    assert broadcaster.subscribe() is not None
+
+
+def test_subscriber_falling_behind_is_closed():
+    broadcaster = Broadcaster(queue_size=2, max_subscribers=2)
+    slow = broadcaster.subscribe()
+    for number in range(3):
+        broadcaster.publish("check", "home", {"number": number})
+    assert slow.get_nowait() is None
+    assert not broadcaster.active
+
+
+def test_close_ends_every_stream():
+    broadcaster = Broadcaster(queue_size=2, max_subscribers=2)
+    subscriber = broadcaster.subscribe()
+    broadcaster.publish("check", "home", {})
+    broadcaster.close()
+    assert subscriber.get_nowait() is None
+
+
+def test_event_stream_sends_the_events_of_its_target(checker):
+    client = create_app(checker).test_client()
+    response = client.get("/events", query_string={"target": "default"}, buffered=False)
+    assert response.status_code == 200
+    assert response.mimetype == "text/event-stream"
+    chunks = iter(response.response)
+    assert next(chunks) == b"retry: 5000\n\n"
+    checker.broadcaster.publish("change", "office", {"ip_address": "198.51.100.7"})
+    checker.broadcaster.publish("change", "default", {"ip_address": "203.0.113.1"})
+    event, data = next(chunks).decode().strip().splitlines()
+    assert event == "event: change"
+    assert json.loads(data[len("data: ") :]) == {"ip_address": "203.0.113.1"}
+    # Closing the broadcaster ends the stream
+    checker.broadcaster.close()
+    assert list(chunks) == []
+
+def test_event_stream_unsubscribes_when_closed(checker):
+    client = create_app(checker).test_client()
+    response = client.get("/events", buffered=False)
+    assert checker.broadcaster.active
+    response.close()
+    assert not checker.broadcaster.active
+
+
+def test_event_stream_without_a_checker(db_path):
+    response = create_app().test_client().get("/events")
+    assert response.status_code == 204
@@ -0,0 +1,33 @@
+from docker_public_ip import cache
+from docker_public_ip.cache import GenerationCache
+
+
+def test_entry_is_dropped_once_the_generation_moves_on():
+    pages = GenerationCache(max_entries=4, ttl=60)
+    pages.put("index", 1, "page")
+    assert pages.get("index", 1) == "page"
+    assert pages.get("index", 2) is None
+    # Gone for good, even for the generation it was computed at
+    assert pages.get("index", 1) is None
+
+
+def test_entry_expires_after_the_ttl(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(cache.time, "monotonic", lambda: now[0])
+    pages = GenerationCache(max_entries=4, ttl=60)
+    pages.put("index", 1, "page")
+    now[0] += 59
+    assert pages.get("index", 1) == "page"
+    now[0] += 1
+    assert pages.get("index", 1) is None
+
+
+def test_least_recently_used_entry_is_evicted():
+    pages = GenerationCache(max_entries=2, ttl=60)
+    pages.put("a", 1, "page a")
+    pages.put("b", 1, "page b")
+    pages.get("a", 1)
+    pages.put("c", 1, "page c")
+    assert pages.get("b", 1) is None
+    assert pages.get("a", 1) == "page a"
+    assert pages.get("c", 1) == "page c"
@@ -0,0 +1,118 @@
+import pytest
+
+from docker_public_ip import circuit_breaker
+from docker_public_ip.circuit_breaker import (
+    CLOSED,
+    HALF_OPEN,
+    OPEN,
+    CircuitBreaker,
+    CircuitBreakers,
+)
+from docker_public_ip.config import (
+    BREAKER_COOLDOWN_SECONDS,
+    BREAKER_FAILURE_THRESHOLD,
+    BREAKER_MAX_COOLDOWN_SECONDS,
+)
+
+SERVICE = "https://a.example.com"
+
+
+def opened_breaker(now=1000):
+    breaker = CircuitBreaker(SERVICE)
+    for _ in range(BREAKER_FAILURE_THRESHOLD):
+        breaker.record_failure(now)
+    return breaker
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Settable time.time() of the breakers"""
+    now = [1000.0]
+    monkeypatch.setattr(circuit_breaker.time, "time", lambda: now[0])
+    return now
+
+
+def test_opens_after_consecutive_failures():
+    breaker = CircuitBreaker(SERVICE)
+    for _ in range(BREAKER_FAILURE_THRESHOLD - 1):
+        breaker.record_failure(1000)
+    assert breaker.state == CLOSED
+    breaker.record_failure(1000)
+    assert breaker.state == OPEN
+    assert breaker.opened_until == 1000 + BREAKER_COOLDOWN_SECONDS
+    assert not breaker.available(1000 + BREAKER_COOLDOWN_SECONDS - 1)
+
+
+def test_available_does_not_start_the_trial():
+    breaker = opened_breaker()
+    after_cooldown = breaker.opened_until
+    assert breaker.available(after_cooldown)
+    assert breaker.available(after_cooldown)
+    assert breaker.state == OPEN
+    assert not breaker.trial_in_flight
+
+
+def test_half_open_lets_a_single_trial_through():
+    breaker = opened_breaker()
+    after_cooldown = breaker.opened_until
+    assert breaker.acquire(after_cooldown)
+    assert breaker.state == HALF_OPEN
+    assert not breaker.acquire(after_cooldown)
+    assert not breaker.available(after_cooldown)
+
+
+def test_successful_trial_closes_the_breaker():
+    breaker = opened_breaker()
+    breaker.acquire(breaker.opened_until)
+    breaker.record_success()
+    assert breaker.state == CLOSED
+    assert breaker.consecutive_failures == 0
+    assert breaker.cooldown_seconds == BREAKER_COOLDOWN_SECONDS
+    assert breaker.acquire(breaker.opened_until)
+
+
+def test_failed_trial_doubles_the_cooldown_up_to_the_maximum():
+    breaker = opened_breaker()
+    cooldowns = []
+    while breaker.cooldown_seconds < BREAKER_MAX_COOLDOWN_SECONDS:
+        now = breaker.opened_until
+        breaker.acquire(now)
+        breaker.record_failure(now)
+        assert breaker.state == OPEN
+        assert breaker.opened_until == now + breaker.cooldown_seconds
+        cooldowns.append(breaker.cooldown_seconds)
+    assert cooldowns[0] == 2 * BREAKER_COOLDOWN_SECONDS
+    assert cooldowns[-1] == BREAKER_MAX_COOLDOWN_SECONDS
+
+
+def test_released_trial_can_be_acquired_again(db, clock):
+    breakers = CircuitBreakers(db)
+    for _ in range(BREAKER_FAILURE_THRESHOLD):
+        breakers.record(SERVICE, False)
+    clock[0] += BREAKER_COOLDOWN_SECONDS
+    assert breakers.acquire(SERVICE)
+    assert not breakers.acquire(SERVICE)
+    breakers.release(SERVICE)
+    assert breakers.acquire(SERVICE)
+
+
+def test_service_reopening_first_is_used_when_all_are_open(db, clock):
+    breakers = CircuitBreakers(db)
+    services = ["https://a.example.com", "https://b.example.com"]
+    for service in reversed(services):
+        for _ in range(BREAKER_FAILURE_THRESHOLD):
+            breakers.record(service, False)
+        clock[0] += 1
+    assert breakers.available(services) == [services[1]]
+    assert breakers.available(services + ["https://c.example.com"]) == [
+        "https://c.example.com"
+    ]
+
+
+def test_breaker_state_is_persisted(db, clock):
+    breakers = CircuitBreakers(db)
+    for _ in range(BREAKER_FAILURE_THRESHOLD):
+        breakers.record(SERVICE, False)
+    reloaded = CircuitBreakers(db).states()[SERVICE]
+    assert reloaded["state"] == OPEN
+    assert reloaded["opened_until"] == clock[0] + BREAKER_COOLDOWN_SECONDS
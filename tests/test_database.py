@@ -0,0 +1,312 @@
+import gzip
+import json
+import sqlite3
+import threading
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from docker_public_ip.__main__ import main
+from docker_public_ip.database import (
+    DAY_MS,
+    Database,
+    _epoch_ms,
+    _from_epoch_ms,
+    _ip_address_sql,
+    _legacy_ms_sql,
+    _pack_ip,
+)
+
+SERVICES = ["https://a.example.com", "https://b.example.com"]
+LEGACY_ROWS = 50
+
+# ip_checks as created by versions before the compact layout
+LEGACY_SCHEMA = """
+    CREATE TABLE ip_checks (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+        service TEXT NOT NULL,
+        ip_address TEXT,
+        response_time_ms REAL,
+        success BOOLEAN DEFAULT 1,
+        error_message TEXT,
+        target TEXT NOT NULL DEFAULT 'default'
+    );
+    CREATE INDEX idx_timestamp ON ip_checks (timestamp DESC);
+    PRAGMA user_version = 5;
+"""
+
+
+@pytest.mark.parametrize(
+    "ip_address, packed",
+    [
+        ("0.0.0.0", 0),
+        ("203.0.113.7", 3405803783),
+        ("255.255.255.255", 2**32 - 1),
+        ("2001:db8::1", "2001:db8::1"),
+        ("not an ip", "not an ip"),
+        (None, None),
+    ],
+)
+def test_pack_ip_round_trip(ip_address, packed):
+    assert _pack_ip(ip_address) == packed
+    conn = sqlite3.connect(":memory:")
+    unpacked = conn.execute(
+        f"SELECT {_ip_address_sql('ip')} FROM (SELECT ? AS ip)", (packed,)
+    ).fetchone()[0]
+    assert unpacked == ip_address
+
+
+@pytest.mark.parametrize(
+    "timestamp",
+    [
+        "1970-01-01 00:00:00",
+        "2024-02-29 23:59:59",
+        "2024-06-01 12:00:00.123",
+        "2038-01-19 03:14:08",
+    ],
+)
+def test_legacy_timestamp_conversion(timestamp):
+    conn = sqlite3.connect(":memory:")
+    converted = conn.execute(f"SELECT {_legacy_ms_sql('?')}", (timestamp,)).fetchone()[0]
+    assert converted == _epoch_ms(timestamp)
+
+
+@pytest.fixture
+def legacy_db_path(db_path):
+    """Database of an earlier version, a check every minute"""
+    with sqlite3.connect(db_path) as conn:
+        conn.executescript(LEGACY_SCHEMA)
+        conn.executemany(
+            """
+            INSERT INTO ip_checks (timestamp, service, ip_address, response_time_ms, target)
+            VALUES (datetime(1700000000 + ? * 60, 'unixepoch'), ?, ?, 100, 'home')
+            """,
+            [
+                (i, SERVICES[i % 2], f"203.0.113.{i // 10 + 1}")
+                for i in range(LEGACY_ROWS)
+            ],
+        )
+        # A check stored without a time
+        conn.execute("UPDATE ip_checks SET timestamp = NULL WHERE id = 20")
+    return db_path
+
+
+def check_ids(db, target="home"):
+    pages, before = [], None
+    while True:
+        page = db.get_checks_page(target=target, before=before, limit=7)
+        if not page:
+            break
+        pages += [row["id"] for row in page]
+        before = (page[-1]["timestamp_ms"], page[-1]["id"])
+    exported = [row["id"] for chunk in db.iter_checks(chunk_size=7) for row in chunk]
+    recent = [row["id"] for row in db.get_recent_checks(LEGACY_ROWS * 2, target)]
+    return pages, exported, recent
+
+
+@pytest.mark.parametrize("moved_batches", [0, 2, None])
+def test_legacy_checks_are_read_before_and_while_they_move(legacy_db_path, moved_batches):
+    db = Database()
+    try:
+        assert db.has_legacy_checks()
+        if moved_batches is None:
+            assert db.compact_legacy_checks(batch_size=10)
+        elif moved_batches:
+            db.compact_legacy_checks(batch_size=10, batches=moved_batches)
+            assert db.has_legacy_checks()
+
+        db.record_check(SERVICES[0], "203.0.113.9", 90, target="home")
+        ids = list(range(1, LEGACY_ROWS + 2))
+        pages, exported, recent = check_ids(db)
+        assert pages == recent == ids[::-1]
+        assert exported == ids
+    finally:
+        db.close()
+
+
+def test_moved_legacy_check_without_time_takes_the_previous_one(legacy_db_path):
+    db = Database()
+    try:
+        assert db.compact_legacy_checks(batch_size=10)
+        rows = {row["id"]: row for row in db.get_checks_page(target="home", limit=100)}
+    finally:
+        db.close()
+    assert len(rows) == LEGACY_ROWS
+    assert rows[20]["timestamp_ms"] == rows[19]["timestamp_ms"]
+    assert rows[21]["ip_address"] == "203.0.113.3"
+
+
+def test_export_command_includes_legacy_checks(legacy_db_path, tmp_path):
+    output = tmp_path / "checks.ndjson.gz"
+    main(["export", "--format", "ndjson", "--output", str(output)])
+    rows = [json.loads(line) for line in gzip.open(output, "rt")]
+    assert [row["id"] for row in rows] == list(range(1, LEGACY_ROWS + 1))
+    assert rows[0]["timestamp"] == "2023-11-14 22:13:20"
+    assert rows[0]["service"] == SERVICES[0]
+
+
+HISTORY_DAYS = 100
+# Checks per day of the history, alternating between the services
+HISTORY_CHECKS_PER_DAY = 4
+
+
+def now_ms():
+    return round(datetime.now(timezone.utc).timestamp() * 1000)
+
+
+@pytest.fixture
+def history_db(db):
+    """HISTORY_DAYS of checks up to now, the IP changing every ten days"""
+    interval = DAY_MS // HISTORY_CHECKS_PER_DAY
+    start = now_ms() - HISTORY_DAYS * DAY_MS
+    with db.writer() as conn:
+        conn.executemany(
+            "INSERT OR IGNORE INTO services (url) VALUES (?)",
+            [(service,) for service in SERVICES],
+        )
+        ids = dict(conn.execute("SELECT url, id FROM services"))
+        conn.executemany(
+            """
+            INSERT INTO ip_checks
+            (timestamp_ms, service_id, ip, response_time_ms, success, target)
+            VALUES (?, ?, ?, ?, 1, 'home')
+            """,
+            [
+                (
+                    start + i * interval,
+                    ids[SERVICES[i % 2]],
+                    _pack_ip(f"203.0.113.{i // (10 * HISTORY_CHECKS_PER_DAY) + 1}"),
+                    100 + i % 50,
+                )
+                for i in range(HISTORY_DAYS * HISTORY_CHECKS_PER_DAY)
+            ],
+        )
+    db.rebuild_rollups()
+    return db
+
+
+def stored_checks(db):
+    return [row["timestamp_ms"] for chunk in db.iter_checks() for row in chunk]
+
+
+def retention_cutoff(days):
+    return (now_ms() - days * DAY_MS) // DAY_MS * DAY_MS
+
+
+def test_prune_deletes_whole_days_past_the_retention(history_db):
+    before = stored_checks(history_db)
+    deleted = history_db.prune_checks(30)
+    kept = stored_checks(history_db)
+    assert deleted == len(before) - len(kept)
+    cutoff = retention_cutoff(30)
+    assert kept == [timestamp for timestamp in before if timestamp >= cutoff]
+    assert history_db.prune_checks(30) == 0
+
+
+def test_prune_keeps_the_statistics(history_db):
+    stats = history_db.get_service_stats()
+    history_db.prune_checks(30)
+    after = history_db.get_service_stats()
+    assert after == stats
+    assert sum(stat["total_checks"] for stat in after) == (
+        HISTORY_DAYS * HISTORY_CHECKS_PER_DAY
+    )
+
+
+def test_prune_deletes_in_batches_until_stopped(history_db):
+    cutoff = retention_cutoff(30)
+    expired = sum(1 for timestamp in stored_checks(history_db) if timestamp < cutoff)
+    stop = threading.Event()
+    stop.set()
+    assert history_db.prune_checks(30, stop) == 0
+    assert len(stored_checks(history_db)) == HISTORY_DAYS * HISTORY_CHECKS_PER_DAY
+    assert history_db.prune_checks(30, batch_size=100) == expired
+
+
+def test_prune_waits_for_legacy_checks(legacy_db_path):
+    db = Database()
+    try:
+        assert db.prune_checks(1) == 0
+        assert len(stored_checks(db)) == LEGACY_ROWS
+    finally:
+        db.close()
+
+
+def month_start_ms(months_ago):
+    month = datetime.now(timezone.utc).replace(
+        day=1, hour=0, minute=0, second=0, microsecond=0
+    )
+    for _ in range(months_ago):
+        month = (month - timedelta(days=1)).replace(day=1)
+    return round(month.timestamp() * 1000)
+
+
+def main_table_checks(db):
+    with db.reader() as conn:
+        cursor = conn.execute("SELECT MIN(timestamp_ms), COUNT(*) FROM ip_checks")
+        return cursor.fetchone()
+
+
+def partition_files(db_path):
+    return sorted(path.name for path in db_path.parent.glob("ip_history-*.db"))
+
+
+def test_archive_moves_months_before_the_previous_one(history_db, db_path):
+    before = stored_checks(history_db)
+    moved = history_db.archive_checks()
+    boundary = month_start_ms(1)
+    first, count = main_table_checks(history_db)
+    assert first >= boundary
+    assert moved == len(before) - count == sum(1 for t in before if t < boundary)
+    # HISTORY_DAYS reach back into at least two months before the previous one
+    assert len(partition_files(db_path)) >= 2
+    assert stored_checks(history_db) == before
+    assert history_db.archive_checks() == 0
+
+
+def test_archived_checks_are_paged_and_filtered(history_db):
+    pages_before = check_ids(history_db)
+    history_db.archive_checks()
+    assert check_ids(history_db) == pages_before
+    # A range inside an archived month, then across the boundary
+    for since_ms, until_ms in [
+        (month_start_ms(2), month_start_ms(2) + 5 * DAY_MS),
+        (month_start_ms(1) - 3 * DAY_MS, month_start_ms(1) + 3 * DAY_MS),
+    ]:
+        since = _from_epoch_ms(since_ms).strftime("%Y-%m-%d %H:%M:%S")
+        until = _from_epoch_ms(until_ms).strftime("%Y-%m-%d %H:%M:%S")
+        rows = history_db.get_checks_page(
+            target="home", since=since, until=until, limit=1000
+        )
+        expected = [
+            timestamp
+            for timestamp in stored_checks(history_db)
+            if since_ms <= timestamp < until_ms
+        ]
+        assert rows
+        assert sorted(row["timestamp_ms"] for row in rows) == expected
+
+
+def test_archive_keeps_the_statistics(history_db):
+    stats = history_db.get_service_stats()
+    history_db.archive_checks()
+    assert history_db.get_service_stats() == stats
+
+
+def test_archive_stops_between_batches(history_db, db_path):
+    stop = threading.Event()
+    stop.set()
+    assert history_db.archive_checks(stop) == 0
+    assert partition_files(db_path) == []
+    assert main_table_checks(history_db)[1] == HISTORY_DAYS * HISTORY_CHECKS_PER_DAY
+
+
+def test_prune_deletes_expired_partitions(history_db, db_path):
+    history_db.archive_checks()
+    archived = partition_files(db_path)
+    # Only the partitions of months that ended before the cutoff expire
+    retention = (now_ms() - month_start_ms(2)) // DAY_MS
+    history_db.prune_checks(retention)
+    assert partition_files(db_path) == archived[-1:]
+    assert min(stored_checks(history_db)) >= month_start_ms(2)
@@ -0,0 +1,106 @@
+import socket
+import struct
+
+import pytest
+
+from docker_public_ip.dns_client import DNSError, build_query, parse_response, query
+
+QUERY_ID = 0x1234
+
+
+def response(records, rcode=0, flags=0x8180, query_id=QUERY_ID, qtype="A"):
+    """Answer to build_query(QUERY_ID, "myip.example.com", qtype)"""
+    question = build_query(query_id, "myip.example.com", qtype)[12:]
+    header = struct.pack("!HHHHHH", query_id, flags | rcode, 1, len(records), 0, 0)
+    answers = b""
+    for rtype, rdata in records:
+        # The name points back to the question
+        answers += struct.pack("!HHHIH", 0xC00C, rtype, 1, 300, len(rdata)) + rdata
+    return header + question + answers
+
+
+def test_build_query():
+    data = build_query(QUERY_ID, "myip.example.com.", "TXT")
+    assert struct.unpack_from("!HHHHHH", data) == (QUERY_ID, 0x0100, 1, 0, 0, 0)
+    assert data[12:] == b"\x04myip\x07example\x03com\x00\x00\x10\x00\x01"
+
+
+def test_parse_a_record_after_cname():
+    cname = b"\x03foo\xc0\x0c"
+    data = response([(5, cname), (1, bytes([203, 0, 113, 7]))])
+    assert parse_response(data, QUERY_ID, "A") == ["203.0.113.7"]
+
+
+def test_parse_txt_record_joins_strings():
+    data = response([(16, b"\x08203.0.11\x043.42")], qtype="TXT")
+    assert parse_response(data, QUERY_ID, "TXT") == ["203.0.113.42"]
+
+
+def test_parse_no_answer():
+    assert parse_response(response([]), QUERY_ID, "A") == []
+
+
+@pytest.mark.parametrize(
+    "data, message",
+    [
+        (response([], rcode=2), "SERVFAIL"),
+        (response([], rcode=3), "NXDOMAIN"),
+        (response([], flags=0x8380), "Truncated"),
+        (response([], query_id=QUERY_ID + 1), "does not match"),
+        (response([(1, bytes([203, 0, 113, 7]))])[:-6], "Malformed"),
+        (response([(1, b"\xcb\x00")]), "Malformed"),
+        (b"\x12", "Malformed"),
+    ],
+    ids=["servfail", "nxdomain", "tc", "id", "truncated", "short rdata", "header"],
+)
+def test_parse_errors(data, message):
+    with pytest.raises(DNSError, match=message):
+        parse_response(data, QUERY_ID, "A")
+
+
+@pytest.fixture
+def silent_resolver():
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        yield sock.getsockname()[1]
+
+
+def test_query_timeout_raises_dns_error(silent_resolver):
+    with pytest.raises(DNSError, match="No answer") as error:
+        query("127.0.0.1", "myip.example.com", port=silent_resolver, timeout=0.1)
+    assert error.value.elapsed_ms >= 90
+
+
+def test_provider_reports_time_of_timed_out_query(silent_resolver):
+    from docker_public_ip.ip_checker import DNSProvider, ProviderError
+    from docker_public_ip.targets import Target
+
+    provider = DNSProvider(f"dns://127.0.0.1:{silent_resolver}/myip.example.com")
+    with pytest.raises(ProviderError) as error:
+        provider.fetch(None, Target("test"), 0.2)
+    assert error.value.response_time_ms >= 150
+
+
+@pytest.fixture
+def closed_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    return port
+
+
+def test_query_to_closed_port_raises_dns_error(closed_port):
+    with pytest.raises(DNSError, match="failed") as error:
+        query("127.0.0.1", "myip.example.com", port=closed_port, timeout=2)
+    assert 0 <= error.value.elapsed_ms < 2000
+
+
+def test_provider_reports_time_of_refused_query(closed_port):
+    from docker_public_ip.ip_checker import DNSProvider, ProviderError
+    from docker_public_ip.targets import Target
+
+    provider = DNSProvider(f"dns://127.0.0.1:{closed_port}/myip.example.com")
+    with pytest.raises(ProviderError, match="failed") as error:
+        provider.fetch(None, Target("test"), 2)
+    assert error.value.response_time_ms > 0
+    assert error.value.phases["transfer_ms"] > 0
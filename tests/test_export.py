@@ -0,0 +1,101 @@
+import csv
+import gzip
+import io
+import json
+
+import pytest
+
+from docker_public_ip.__main__ import main
+from docker_public_ip.database import CHECK_EXPORT_COLUMNS
+from docker_public_ip.export import ExportError, export_checks
+
+SERVICES = ["https://a.example.com", "https://b.example.com"]
+
+
+def test_export_command_fails_cleanly_when_the_output_cannot_be_written(
+    db_path, tmp_path
+):
+    output = tmp_path / "missing" / "checks.csv.gz"
+    with pytest.raises(SystemExit) as exit_info:
+        main(["export", "--format", "csv", "--output", str(output)])
+    assert exit_info.value.code == 1
+    assert not output.exists()
+
+
+@pytest.fixture
+def exported_db(db):
+    for number in range(7):
+        db.record_check(
+            SERVICES[number % 2],
+            f"203.0.113.{number}" if number != 3 else None,
+            100.0 + number,
+            success=number != 3,
+            error_message="Timed out" if number == 3 else None,
+            phases={"dns_ms": 1.5, "connect_ms": 2.5},
+            target="home" if number < 5 else "office",
+        )
+    db.flush()
+    return db
+
+
+def export_bytes(db, export_format, **filters):
+    return b"".join(export_checks(db, export_format, chunk_size=3, **filters))
+
+
+def test_csv_export(exported_db):
+    text = gzip.decompress(export_bytes(exported_db, "csv")).decode()
+    rows = list(csv.reader(io.StringIO(text)))
+    assert tuple(rows[0]) == CHECK_EXPORT_COLUMNS
+    records = [dict(zip(rows[0], row)) for row in rows[1:]]
+    assert [record["ip_address"] for record in records] == [
+        "203.0.113.0",
+        "203.0.113.1",
+        "203.0.113.2",
+        "",
+        "203.0.113.4",
+        "203.0.113.5",
+        "203.0.113.6",
+    ]
+    assert records[3]["error_message"] == "Timed out"
+    assert records[0]["dns_ms"] == "1.5"
+
+
+def test_empty_csv_export_has_the_header(db):
+    text = gzip.decompress(export_bytes(db, "csv")).decode()
+    assert text.splitlines() == [",".join(CHECK_EXPORT_COLUMNS)]
+
+
+def test_ndjson_export_with_filters(exported_db):
+    text = gzip.decompress(
+        export_bytes(exported_db, "ndjson", target="home", service=SERVICES[0])
+    ).decode()
+    records = [json.loads(line) for line in text.splitlines()]
+    assert [record["ip_address"] for record in records] == [
+        "203.0.113.0",
+        "203.0.113.2",
+        "203.0.113.4",
+    ]
+    assert all(record["success"] is True for record in records)
+    assert set(records[0]) == set(CHECK_EXPORT_COLUMNS)
+
+
+@pytest.mark.parametrize("export_format", ["parquet", "arrow"])
+def test_columnar_export(exported_db, export_format):
+    pa = pytest.importorskip("pyarrow")
+    data = export_bytes(exported_db, export_format)
+    if export_format == "parquet":
+        import pyarrow.parquet as pq
+
+        table = pq.read_table(pa.BufferReader(data))
+    else:
+        table = pa.ipc.open_stream(data).read_all()
+    assert table.num_rows == 7
+    assert table.schema.field("timestamp").type == pa.timestamp("ms", tz="UTC")
+    assert table.column("success").to_pylist()[2:5] == [True, False, True]
+    assert table.column("target").to_pylist().count("office") == 2
+    assert table.column("dns_ms").to_pylist()[0] == 1.5
+
+
+def test_unknown_format_is_rejected_before_streaming(db):
+    with pytest.raises(ExportError, match="Unknown export format"):
+        export_checks(db, "xml")
@@ -0,0 +1,178 @@
+import threading
+import time
+
+import pytest
+
+from docker_public_ip.config import MAX_CONCURRENT_REQUESTS
+from docker_public_ip.database import DISAGREEMENT_EVENT
+
+FAST, SLOW = 0.01, 0.3
+SERVICES = [f"https://{name}.example.com" for name in ("a", "b", "c", "d")]
+
+
+@pytest.fixture
+def checker(checker):
+    checker.hedge_delay = lambda service: 0.05
+    return checker
+
+
+def answer(checker, **answers):
+    """Make service a answer answers["a"], an (ip, seconds) pair, and so on"""
+
+    def check_ip_single(service, timeout, target):
+        ip_address, seconds = answers[service.split("//")[1].split(".")[0]]
+        time.sleep(seconds)
+        error = None if ip_address else "Connection refused"
+        return ip_address, seconds * 1000, error, None
+
+    checker.check_ip_single = check_ip_single
+
+
+def checks(checker):
+    """Recorded checks by service, once the requests still running are done"""
+    checker.executor.shutdown(wait=True)
+    return {
+        check["service"]: check
+        for check in checker.db.get_recent_checks(target="default")
+    }
+
+
+def test_hedged_backup_request_wins_over_a_slow_service(checker):
+    answer(checker, a=("203.0.113.1", SLOW), b=("203.0.113.1", FAST))
+    started = time.monotonic()
+    checker.check_ip_hedged(checker.targets[0], SERVICES[:2])
+    assert time.monotonic() - started < SLOW
+    assert checker.last_ips["default"] == "203.0.113.1"
+    # The slow request is recorded once it finishes
+    recorded = checks(checker)
+    assert recorded[SERVICES[0]]["success"]
+    assert recorded[SERVICES[1]]["success"]
+
+
+def test_hedged_failure_starts_the_next_service_right_away(checker):
+    checker.hedge_delay = lambda service: 10
+    answer(checker, a=(None, FAST), b=("203.0.113.2", FAST))
+    started = time.monotonic()
+    checker.check_ip_hedged(checker.targets[0], SERVICES[:2])
+    assert time.monotonic() - started < 1
+    assert checker.last_ips["default"] == "203.0.113.2"
+    recorded = checks(checker)
+    assert not recorded[SERVICES[0]]["success"]
+    assert recorded[SERVICES[1]]["success"]
+
+
+def test_hedged_late_answer_with_another_ip_is_not_confirmed(checker):
+    answer(checker, a=("203.0.113.9", SLOW), b=("203.0.113.1", FAST))
+    checker.check_ip_hedged(checker.targets[0], SERVICES[:2])
+    recorded = checks(checker)
+    assert checker.last_ips["default"] == "203.0.113.1"
+    assert not recorded[SERVICES[0]]["success"]
+    assert "settled on 203.0.113.1" in recorded[SERVICES[0]]["error_message"]
+    # The service itself answered, its breaker counts a success
+    assert checker.breakers.states()[SERVICES[0]]["consecutive_failures"] == 0
+
+
+def test_hedged_limits_concurrent_requests(checker):
+    lock = threading.Lock()
+    running, peak = [0], [0]
+
+    def check_ip_single(service, timeout, target):
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        time.sleep(0.1)
+        with lock:
+            running[0] -= 1
+        return None, 100, "Timed out", None
+
+    checker.check_ip_single = check_ip_single
+    checker.check_ip_hedged(checker.targets[0], SERVICES)
+    assert peak[0] == MAX_CONCURRENT_REQUESTS
+    assert checker.last_ips["default"] is None
+    assert len(checks(checker)) == len(SERVICES)
+
+
+def disagreements(checker):
+    return checker.db.get_events(DISAGREEMENT_EVENT, target="default")
+
+
+def test_consensus_accepts_the_quorum_ip(checker):
+    answer(
+        checker,
+        a=("203.0.113.1", FAST),
+        b=("203.0.113.1", FAST),
+        c=("203.0.113.1", FAST),
+    )
+    checker.check_ip_consensus(checker.targets[0], SERVICES[:3])
+    assert checker.last_ips["default"] == "203.0.113.1"
+    assert disagreements(checker) == []
+
+
+def test_consensus_records_a_disagreement(checker):
+    # The dissenting answer comes first, the quorum is only reached after it
+    answer(
+        checker,
+        a=("203.0.113.1", 0.05),
+        b=("203.0.113.1", 0.05),
+        c=("198.51.100.7", FAST),
+    )
+    checker.check_ip_consensus(checker.targets[0], SERVICES[:3])
+    assert checker.last_ips["default"] == "203.0.113.1"
+    [event] = disagreements(checker)
+    assert event["details"]["accepted_ip"] == "203.0.113.1"
+    assert event["details"]["answers"] == {
+        SERVICES[0]: "203.0.113.1",
+        SERVICES[1]: "203.0.113.1",
+        SERVICES[2]: "198.51.100.7",
+    }
+    recorded = checks(checker)
+    assert recorded[SERVICES[0]]["success"]
+    assert recorded[SERVICES[2]]["ip_address"] is None
+    assert "quorum on 203.0.113.1" in recorded[SERVICES[2]]["error_message"]
+
+
+def test_consensus_records_a_late_disagreement(checker):
+    answer(
+        checker,
+        a=("203.0.113.1", FAST),
+        b=("203.0.113.1", FAST),
+        c=("198.51.100.7", SLOW),
+    )
+    checker.check_ip_consensus(checker.targets[0], SERVICES[:3])
+    assert checker.last_ips["default"] == "203.0.113.1"
+    recorded = checks(checker)
+    assert "quorum on 203.0.113.1" in recorded[SERVICES[2]]["error_message"]
+    [event] = disagreements(checker)
+    assert event["details"]["answers"] == {SERVICES[2]: "198.51.100.7"}
+
+
+def test_consensus_replaces_failed_services(checker):
+    answer(
+        checker,
+        a=(None, FAST),
+        b=("203.0.113.1", FAST),
+        c=("203.0.113.1", 0.05),
+        d=("203.0.113.1", 0.05),
+    )
+    checker.check_ip_consensus(checker.targets[0], SERVICES)
+    assert checker.last_ips["default"] == "203.0.113.1"
+    assert SERVICES[3] in checks(checker)
+
+
+def test_consensus_without_quorum_keeps_the_ip(checker):
+    checker.last_ips["default"] = "203.0.113.1"
+    answer(
+        checker,
+        a=("198.51.100.7", FAST),
+        b=("192.0.2.4", FAST),
+        c=(None, FAST),
+    )
+    checker.check_ip_consensus(checker.targets[0], SERVICES[:3])
+    assert checker.last_ips["default"] == "203.0.113.1"
+    [event] = disagreements(checker)
+    assert event["details"]["accepted_ip"] is None
+    recorded = checks(checker)
+    assert not recorded[SERVICES[0]]["success"]
+    assert recorded[SERVICES[0]]["error_message"] == "No quorum"
+    # Answering without a quorum still counts as a success of the service
+    assert checker.breakers.states()[SERVICES[0]]["consecutive_failures"] == 0
@@ -0,0 +1,73 @@
+from docker_public_ip.recent import CheckRecord, RecentChecks
+
+SERVICE = "https://service.example.com"
+
+
+def record(second, ip_address="203.0.113.1", success=True):
+    return CheckRecord(
+        f"2024-01-01 12:00:{second:02d}", SERVICE, ip_address, 100.0, success
+    )
+
+
+def test_empty_summary():
+    assert RecentChecks(4).summary() == {
+        "current_ip": None,
+        "last_check": "Never",
+        "total_checks": 0,
+        "success_rate": 0,
+    }
+
+
+def test_keeps_the_latest_checks_newest_first():
+    recent = RecentChecks(3)
+    for second in range(5):
+        recent.append(record(second))
+    assert [check.timestamp[-2:] for check in recent.latest()] == ["04", "03", "02"]
+    assert recent.summary()["total_checks"] == 3
+
+
+def test_success_rate_counts_only_the_buffered_checks():
+    recent = RecentChecks(4)
+    recent.append(record(0, None, success=False))
+    recent.append(record(1, None, success=False))
+    for second in range(2, 6):
+        recent.append(record(second, success=second % 2 == 0))
+    # 2 of the 4 buffered checks succeeded, the overwritten failures don't count
+    assert recent.summary()["success_rate"] == 50.0
+
+
+def test_last_success_survives_being_overwritten():
+    recent = RecentChecks(2)
+    recent.append(record(0, "203.0.113.7"))
+    for second in range(1, 4):
+        recent.append(record(second, None, success=False))
+    summary = recent.summary()
+    assert summary["current_ip"] == "203.0.113.7"
+    assert summary["last_check"] == "2024-01-01 12:00:00"
+    assert summary["success_rate"] == 0
+
+
+def test_unconfirmed_answer_is_not_the_current_ip():
+    recent = RecentChecks(4)
+    recent.append(record(0, "203.0.113.1"))
+    recent.append(record(1, "198.51.100.7", success=False))
+    assert recent.summary()["current_ip"] == "203.0.113.1"
+
+
+def test_from_rows_restores_the_order_of_the_database():
+    rows = [
+        {
+            "timestamp": f"2024-01-01 12:00:{second:02d}",
+            "service": SERVICE,
+            "ip_address": f"203.0.113.{second}",
+            "response_time_ms": 100.0,
+            "success": 1,
+        }
+        for second in (3, 2, 1)
+    ]
+    recent = RecentChecks.from_rows(rows, size=2)
+    assert [check.ip_address for check in recent.latest()] == [
+        "203.0.113.3",
+        "203.0.113.2",
+    ]
+    assert recent.summary()["current_ip"] == "203.0.113.3"
@@ -0,0 +1,127 @@
+import pytest
+
+from docker_public_ip.schedule import AdaptiveSchedule, FixedSchedule
+
+DAY = 86400
+
+
+def schedule(change_times=()):
+    return AdaptiveSchedule(
+        change_times, min_interval=30, max_interval=3600, default_interval=300
+    )
+
+
+def daily_changes(count=10, start=1_700_000_000, jitter=(0, 20, -15, 5, -10)):
+    return [start + i * DAY + jitter[i % len(jitter)] for i in range(count)]
+
+
+def test_fixed_schedule():
+    fixed = FixedSchedule(300)
+    fixed.changed(0)
+    assert fixed.next_interval(0) == 300
+
+
+def test_backs_off_to_the_default_interval_without_history():
+    adaptive = schedule()
+    assert adaptive.lease is None
+    intervals = []
+    for now in range(0, 3000, 100):
+        adaptive.stable(now)
+        intervals.append(adaptive.next_interval(now))
+    assert intervals[:4] == [60, 120, 240, 300]
+    assert max(intervals) == 300
+
+
+def test_change_and_disagreement_reset_the_interval():
+    adaptive = schedule()
+    for now in range(5):
+        adaptive.stable(now)
+    adaptive.changed(100)
+    assert adaptive.next_interval(100) == 30
+    adaptive.stable(130)
+    adaptive.disturbed()
+    assert adaptive.next_interval(130) == 30
+
+
+def test_change_time_is_halfway_since_the_last_check():
+    adaptive = schedule()
+    adaptive.stable(1000)
+    adaptive.changed(1300)
+    assert adaptive.last_change == 1150
+    assert adaptive.uncertainty == 150
+
+
+@pytest.mark.parametrize("count", [1, 2, 3])
+def test_needs_three_leases(count):
+    assert schedule(daily_changes(count)).lease is None
+    assert schedule(daily_changes(4)).lease is not None
+
+
+def test_detects_regular_leases():
+    adaptive = schedule(daily_changes())
+    assert adaptive.lease == pytest.approx(DAY, abs=60)
+    # 2% of a day, between the default and the limit
+    assert adaptive.max_interval == pytest.approx(DAY * 0.02, rel=0.01)
+
+
+def test_quick_reconnect_does_not_hide_regular_leases():
+    changes = daily_changes()
+    changes.insert(5, changes[4] + 600)
+    changes[6:] = [time + 600 for time in changes[6:]]
+    assert schedule(changes).lease == pytest.approx(DAY, abs=60)
+
+
+def test_irregular_leases_are_not_anticipated():
+    start = 1_700_000_000
+    changes = [start + offset * 3600 for offset in (0, 20, 27, 60, 64, 101, 130)]
+    adaptive = schedule(changes)
+    assert adaptive.lease is None
+    assert adaptive.max_interval == 300
+
+
+def test_checks_often_around_the_expected_change():
+    changes = daily_changes()
+    adaptive = schedule(changes)
+    last = adaptive.last_change
+    for now in range(0, 20):
+        adaptive.stable(last + now)
+    # Far from the next expected change the interval backs off, but never
+    # sleeps into the change window
+    early = last + DAY / 2
+    assert adaptive.next_interval(early) == adaptive.max_interval
+    start = last + adaptive.lease - adaptive.window
+    assert adaptive.next_interval(start - 100) == 100
+    assert adaptive.next_interval(start + 1) == 30
+    assert adaptive.next_interval(last + adaptive.lease) == 30
+
+
+def test_expected_change_repeats_when_the_lease_was_renewed():
+    adaptive = schedule(daily_changes())
+    last = adaptive.last_change
+    for now in range(20):
+        adaptive.stable(last + now)
+    # The IP stayed the same at the first expected change
+    assert adaptive.next_interval(last + 1.5 * adaptive.lease) == adaptive.max_interval
+    assert adaptive.next_interval(last + 2 * adaptive.lease) == 30
+
+
+def test_change_outside_the_window_is_detected_within_the_default_interval():
+    changes = daily_changes()
+    adaptive = AdaptiveSchedule(
+        changes, min_interval=30, max_interval=300, default_interval=300
+    )
+    assert adaptive.lease is not None
+    assert adaptive.max_interval == 300
+    # The IP changes halfway through the lease, far from any expected end
+    surprise = adaptive.last_change + DAY / 2
+    now = adaptive.last_change + 1
+    while now < surprise:
+        adaptive.stable(now)
+        now += adaptive.next_interval(now)
+    assert now - surprise <= 300
+
+
+def test_longer_backoff_between_windows_is_opt_in():
+    changes = daily_changes()
+    assert AdaptiveSchedule(changes, default_interval=300).max_interval <= 300
+    assert schedule(changes).max_interval > 300
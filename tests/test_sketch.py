@@ -0,0 +1,73 @@
+import random
+
+import pytest
+
+from docker_public_ip.sketch import LatencySketch
+
+
+def exact(values, q):
+    values = sorted(values)
+    return values[int(q * (len(values) - 1))]
+
+
+@pytest.fixture
+def latencies():
+    rng = random.Random(1)
+    return [rng.lognormvariate(5, 0.8) for _ in range(10000)]
+
+
+def test_empty_sketch_has_no_quantiles():
+    assert LatencySketch().quantile(0.5) is None
+
+
+@pytest.mark.parametrize("q", [0, 0.5, 0.9, 0.99, 1])
+def test_quantiles_within_relative_accuracy(latencies, q):
+    sketch = LatencySketch(relative_accuracy=0.01)
+    for value in latencies:
+        sketch.add(value)
+    assert sketch.quantile(q) == pytest.approx(exact(latencies, q), rel=0.01)
+
+
+def test_zero_values():
+    sketch = LatencySketch()
+    sketch.add(0, count=3)
+    sketch.add(100)
+    assert sketch.count == 4
+    assert sketch.quantile(0.5) == 0
+    assert sketch.quantile(1) == pytest.approx(100, rel=0.01)
+
+
+def test_merge_matches_a_single_sketch(latencies):
+    whole, first, second = LatencySketch(), LatencySketch(), LatencySketch()
+    for index, value in enumerate(latencies):
+        whole.add(value)
+        (first if index % 2 else second).add(value)
+    first.merge(second)
+    assert first.count == whole.count
+    assert first.bins == whole.bins
+
+
+def test_merge_needs_the_same_accuracy():
+    with pytest.raises(ValueError):
+        LatencySketch(0.01).merge(LatencySketch(0.02))
+
+
+def test_collapse_keeps_the_upper_quantiles(latencies):
+    sketch = LatencySketch(max_bins=64)
+    for value in latencies:
+        sketch.add(value)
+    assert len(sketch.bins) <= 64
+    assert sketch.count == len(latencies)
+    assert sketch.quantile(0.99) == pytest.approx(exact(latencies, 0.99), rel=0.01)
+
+
+def test_json_round_trip(latencies):
+    sketch = LatencySketch()
+    for value in latencies[:100]:
+        sketch.add(value)
+    sketch.add(0)
+    restored = LatencySketch.from_json(sketch.to_json())
+    assert restored.bins == sketch.bins
+    assert restored.count == sketch.count
+    assert restored.quantile(0.5) == sketch.quantile(0.5)
+    assert LatencySketch.from_json("").count == 0
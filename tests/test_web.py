@@ -0,0 +1,109 @@
+import base64
+import json
+
+import pytest
+
+from docker_public_ip.web import create_app, decode_cursor, encode_cursor
+
+SERVICE = "https://service.example.com"
+
+
+def cursor(value):
+    return base64.urlsafe_b64encode(json.dumps(value).encode()).decode()
+
+
+@pytest.mark.parametrize(
+    "row, key, key_type",
+    [
+        ({"timestamp_ms": 1700000000123, "id": 42}, "timestamp_ms", int),
+        ({"timestamp": "2024-01-01 12:00:00", "id": 7}, "timestamp", str),
+    ],
+)
+def test_cursor_round_trip(row, key, key_type):
+    assert decode_cursor(encode_cursor(row, key), key_type) == (row[key], row["id"])
+
+
+@pytest.mark.parametrize(
+    "value, key_type",
+    [
+        ("!!!", str),
+        ("abc", str),
+        (base64.urlsafe_b64encode(b"\xff\xfe").decode(), str),
+        (cursor(5), int),
+        (cursor([1, 2, 3]), int),
+        (cursor({"a": 1, "b": 2}), str),
+        (cursor([None, 1]), str),
+        (cursor([1.5, 1]), int),
+        (cursor([True, 1]), int),
+        (cursor(["2024-01-01", 1]), int),
+        (cursor([1700000000000, 1]), str),
+        (cursor([1, "2"]), int),
+        (cursor([2**63, 1]), int),
+        (cursor([1, -(2**63) - 1]), int),
+    ],
+)
+def test_malformed_cursor(value, key_type):
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        decode_cursor(value, key_type)
+
+
+@pytest.fixture
+def client(db):
+    for second in range(5):
+        db.record_check(SERVICE, f"203.0.113.{second % 2 + 1}", 100.0 + second)
+    return create_app().test_client()
+
+
+@pytest.mark.parametrize("path", ["/api/checks", "/api/changes"])
+@pytest.mark.parametrize(
+    "value", [cursor([2**63, 1]), cursor(["2024-01-01", 1.5]), "%%%", cursor([1, 2, 3])]
+)
+def test_api_rejects_malformed_cursor(client, path, value):
+    response = client.get(path, query_string={"cursor": value})
+    assert response.status_code == 400
+    assert "Invalid cursor" in response.get_json()["error"]
+
+
+@pytest.mark.parametrize("path, count", [("/api/checks", 5), ("/api/changes", 5)])
+def test_api_pages_follow_the_cursor(client, path, count):
+    items, query = [], {"limit": 2}
+    while True:
+        page = client.get(path, query_string=query).get_json()
+        items += page["items"]
+        if page["next_cursor"] is None:
+            break
+        query["cursor"] = page["next_cursor"]
+    assert len(items) == count
+    assert len({item["id"] for item in items}) == count
+
+
+@pytest.fixture
+def dashboard(checker):
+    return create_app(checker).test_client()
+
+
+def test_dashboard_is_revalidated_with_its_etag(dashboard):
+    first = dashboard.get("/")
+    assert first.status_code == 200
+    etag, weak = first.get_etag()
+    assert weak
+    response = dashboard.get("/", headers={"If-None-Match": f'W/"{etag}"'})
+    assert response.status_code == 304
+    assert response.data == b""
+
+
+def test_dashboard_etag_changes_with_a_new_check(checker, dashboard):
+    etag, _ = dashboard.get("/").get_etag()
+    checker.record_attempt(
+        checker.targets[0], SERVICE, "203.0.113.1", 100.0, None, None
+    )
+    response = dashboard.get("/", headers={"If-None-Match": f'W/"{etag}"'})
+    assert response.status_code == 200
+    assert response.get_etag()[0] != etag
+
+
+def test_dashboard_etag_is_the_same_in_every_content_coding(dashboard):
+    plain = dashboard.get("/", headers={"Accept-Encoding": "identity"})
+    compressed = dashboard.get("/", headers={"Accept-Encoding": "gzip"})
+    assert compressed.headers["Content-Encoding"] == "gzip"
+    assert plain.get_etag() == compressed.get_etag()